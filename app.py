@@ -1,83 +1,319 @@
+import gc
 import os
 import json
+import time
+import asyncio
 import logging
-import xmltodict
+import secrets
+import xml.etree.ElementTree as ET
+
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request, Response
-from fastapi.responses import FileResponse
-
-from carriers.dhl import test_dhl_api, create_dhl_test_shipment, create_dhl_shipment
-from carriers.gls import create_gls_shipment
-
-from utils.proxy_middelware import ProxiedHeadersMiddleware
+from fastapi.responses import PlainTextResponse
 
-logging.basicConfig(
-    filename='logs/my_app.log',  # Pfad zur Log-Datei
-    filemode='a',  # 'a' für append, 'w' zum Überschreiben
-    format='%(asctime)s - %(levelname)s - %(message)s',  # Formatierung der Log-Nachrichten
-    level=logging.DEBUG  # Minimallevel für die Erfassung von Nachrichten
-)
+# .env vor den eigenen Modulen laden - einzelne Einstellungen (z.B. METRICS_ENABLED) werden beim Import gelesen,
+# alle übrigen beim ersten Zugriff oder im Lifespan
+load_dotenv()
 
+# Die Carrier selbst (carriers.dhl, carriers.gls) lädt die Registry erst bei Bedarf
+from carriers.registry import get_carrier, get_loaded_carrier, preload_carriers, start_carriers, stop_carriers
+from carriers.dhl_auth import resolve_credentials
+from carriers.dhl_products import get_product_codes
 
-load_dotenv()
-app = FastAPI()
+from utils.proxy_middelware import ProxiedHeadersMiddleware
+from utils.metrics import CONTENT_TYPE, REQUEST_DURATION, SHIPMENT_DURATION, observe_stage, render_metrics
+from utils.structured_logging import CorrelationIdMiddleware, lazy_payload, setup_logging
+from utils.label_store import get_label_store, label_response, start_label_sweeper, stop_label_sweeper
+from utils.idempotency import get_idempotency_key, get_idempotency_cache, close_idempotency_cache
+from utils.soap_response import GET_VERSION_RESPONSE, build_create_shipment_response, build_get_manifest_response, \
+    build_shipment_states_response, build_soap_fault, create_error_state, create_shipment_state, \
+    find_shipment_numbers, merge_shipment_results, has_only_created_shipments
+from utils.shipment_index import ShipmentRecord, get_credential_key, get_shipment_index
+from utils.shipment_ledger import STATUS_DELETED, STATUS_MANIFESTED, close_shipment_ledger, get_shipment_ledger
+from utils.upstream_guard import UpstreamUnavailableError, get_upstream_states
+from utils.health import get_health_checker, start_health_checks, stop_health_checks
+from utils.traffic_capture import begin_capture, close_traffic_capture, end_capture, get_traffic_capture
+from utils.soap_request import ShipmentOrder, parse_soap_request
+from utils.soap_validation import SoapValidationError, get_soap_validator, start_soap_validation, stop_soap_validation
+
+# JSON Lines nach LOG_FILE (Standard logs/my_app.log), geschrieben von einem Listener Thread; Level über LOG_LEVEL
+setup_logging()
+
+
+def preload_shared_state():
+    # Von serve.py im Master vor dem fork aufgerufen: die aktivierten Carrier mit Konfiguration, Produkttabellen und
+    # geparstem GLS WSDL werden einmal geladen und von allen Workern geteilt (copy-on-write).
+    preload_carriers()
+    start_soap_validation()
+    # Alles bis hierher überlebt die Worker - aus der GC Verwaltung nehmen, damit die Seiten nicht kopiert werden
+    gc.freeze()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mit STARTUP_WARMUP werden die Carrier hier vorgewärmt - uvicorn nimmt erst danach Requests an
+    await start_carriers()
+    start_soap_validation()
+    get_idempotency_cache()
+    get_shipment_ledger()
+    get_traffic_capture()
+    start_label_sweeper()
+    start_health_checks()
+    yield
+    await stop_health_checks()
+    await stop_label_sweeper()
+    await stop_carriers()
+    stop_soap_validation()
+    close_idempotency_cache()
+    close_shipment_ledger()
+    close_traffic_capture()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(ProxiedHeadersMiddleware)  # type: ignore[arg-type]
+app.add_middleware(CorrelationIdMiddleware)  # type: ignore[arg-type]
 
 
 @app.get("/health")
 async def health_check(request: Request):
     #get base url
     base_url = request.base_url
-    return {"base_url": base_url, "status": "ok"}
+    gls = get_loaded_carrier("GLS")
+    return {"base_url": base_url, "status": "ok", "gls_client": gls.get_gls_client_stats() if gls else None,
+            "upstreams": get_upstream_states()}
+
+_ALIVE = b'{"status":"alive"}'
+
+
+@app.get("/livez")
+async def liveness_probe():
+    # Antwortet, solange der Event Loop läuft - ohne Upstream, ohne Zustand
+    return Response(content=_ALIVE, media_type="application/json")
+
+
+@app.get("/readyz")
+async def readiness_probe():
+    # Liest nur die zwischengespeicherten Prüfungen (utils/health.py), Circuit Breaker und Pools
+    ready, state = get_health_checker().get_readiness()
+    return Response(content=json.dumps(state, separators=(",", ":")), status_code=200 if ready else 503,
+                    media_type="application/json")
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
 
 @app.get("/")
 async def test_api():
-    return await test_dhl_api()
+    # Ergebnis der Hintergrundprüfung der DHL Sandbox - ein eigener Call höchstens einmal je HEALTH_CHECK_INTERVAL
+    check = await get_health_checker().refresh_if_stale("dhl_sandbox")
+    if check is None:
+        raise HTTPException(status_code=404, detail="DHL sandbox check is not configured.")
+    if check.error:
+        raise HTTPException(status_code=500, detail=f"Anfragefehler: {check.error}")
+    if check.status_code == 200:
+        return {"message": "DHL API ist erreichbar.", **(check.data or {})}
+    return {"message": "DHL API ist nicht erreichbar.", "status_code": check.status_code}
 
 
 @app.post("/test/create-shipment")
 async def create_test_shipment(request: Request):
-    return await create_dhl_test_shipment(request)
+    return await (await get_carrier("DHL")).create_dhl_test_shipment(request)
 
 
 @app.get("/label/gls/{filename}")
-async def download_label(filename: str):
-    file_path = os.path.join(os.getenv("GLS_LABELS_FOLDER", 'labels'), filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path, media_type='application/pdf', filename=filename)
+async def download_label(filename: str, request: Request):
+    return await label_response(get_label_store(), filename, request)
 
 
-async def create_shipment(soap_request_data, username, password, sandbox=False, origin_request=None):
-    carrier = get_carrier_code_from_product_code(soap_request_data)
+def get_ledger_for_request(request: Request):
+    # Das Journal enthält Kundendaten: nur mit LEDGER_API_TOKEN (Authorization: Bearer ...), sonst nicht vorhanden
+    token = os.getenv('LEDGER_API_TOKEN')
+    shipment_ledger = get_shipment_ledger()
+    if not token or shipment_ledger is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return shipment_ledger
 
-    if carrier == 'GLS':
-        base_url = None
-        if origin_request:
-            base_url = origin_request.base_url
-        if base_url is None:
-            raise HTTPException(status_code=400, detail="Base URL is required for GLS shipment.")
-        soap_response = await create_gls_shipment(soap_request_data, base_url, sandbox=sandbox)
-    else:
-        soap_response = await create_dhl_shipment(soap_request_data, username, password, sandbox=sandbox)
-    return soap_response
+
+@app.get("/ledger/shipments/{shipment_number}")
+async def get_ledger_shipment(shipment_number: str, request: Request):
+    shipment = await get_ledger_for_request(request).get_async(shipment_number)
+    if shipment is None:
+        raise HTTPException(status_code=404, detail="Shipment not found")
+    return shipment
+
+
+@app.get("/ledger/shipments")
+async def find_ledger_shipments(request: Request, reference: str | None = None, date: str | None = None,
+                                carrier: str | None = None, status: str | None = None, sandbox: bool | None = None,
+                                limit: int = 1000):
+    # Nachdruck über die CustomerReference, Tagesabschluss und Storno über Datum und Status
+    shipment_ledger = get_ledger_for_request(request)
+    try:
+        return await shipment_ledger.find_async(customer_reference=reference, date=date, carrier=carrier,
+                                                status=status, sandbox=sandbox, limit=min(limit, 10000))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
 
 
-def get_carrier_code_from_product_code(xml_data):
-    shipment_order = xml_data.get("ShipmentOrder")
-    if not shipment_order:
+@app.get("/ledger/summary")
+async def get_ledger_summary(request: Request, date: str, sandbox: bool | None = None):
+    shipment_ledger = get_ledger_for_request(request)
+    try:
+        return await shipment_ledger.summary_async(date, sandbox=sandbox)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+
+
+def get_inline_label_users():
+    return {user.strip() for user in os.getenv('INLINE_LABEL_USERS', '').split(',') if user.strip()}
+
+
+def is_inline_label_order(shipment_order: ShipmentOrder, inline_labels=False):
+    # LabelResponseType XML: Label base64-kodiert im CreationState statt als URL
+    return inline_labels or (shipment_order.label_response_type or '').upper() == 'XML'
+
+
+async def create_shipment(soap_request_data, username, password, sandbox=False, origin_request=None,
+                          inline_labels=False):
+    shipment_orders = soap_request_data.orders
+    if not shipment_orders:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: ShipmentOrder missing.")
 
-    shipment = shipment_order.get("Shipment")
-    if not shipment:
-        raise HTTPException(status_code=400, detail="Invalid SOAP request: Shipment missing.")
+    # Aufträge je Carrier (und Label-Modus) bündeln: ein REST Call für alle DHL Aufträge, GLS parallel dazu
+    orders_by_carrier = {}
+    for shipment_order in shipment_orders:
+        carrier = 'GLS' if get_carrier_code_from_product_code(shipment_order) == 'GLS' else 'DHL'
+        inline = is_inline_label_order(shipment_order, inline_labels)
+        orders_by_carrier.setdefault((carrier, inline), []).append(shipment_order)
+
+    carrier_calls = []
+    for (carrier, inline), carrier_orders in orders_by_carrier.items():
+        if carrier == 'GLS':
+            base_url = None
+            if origin_request:
+                base_url = origin_request.base_url
+            if base_url is None:
+                raise HTTPException(status_code=400, detail="Base URL is required for GLS shipment.")
+            carrier_calls.append(create_gls_shipment(carrier_orders, base_url, sandbox=sandbox, inline_labels=inline))
+        else:
+            carrier_calls.append(create_dhl_shipment(carrier_orders, username, password, sandbox=sandbox,
+                                                     inline_labels=inline))
+
+    # Bei nur einem Carrier werden Fehler wie bisher direkt weitergereicht
+    durations = {}
+    results = await asyncio.gather(*(timed_carrier_call(call, durations, index)
+                                     for index, call in enumerate(carrier_calls)),
+                                   return_exceptions=len(carrier_calls) > 1)
+
+    shipment_results = []
+    for index, ((carrier, inline), carrier_orders) in enumerate(orders_by_carrier.items()):
+        result = results[index]
+        if isinstance(result, Exception):
+            # Die Aufträge des anderen Carriers sind bereits angelegt und dürfen nicht verloren gehen
+            error_states = [create_error_state(result, shipment_order.sequence_number)
+                            for shipment_order in carrier_orders]
+            result = (error_states[0]["status_code"], error_states[0]["status_messages"][0], error_states)
+        observe_shipments(carrier, carrier_orders, result[2], durations[index])
+        record_shipments(carrier, carrier_orders, result[2], username, password, sandbox, inline)
+        shipment_results.append(result)
+
+    start = time.perf_counter()
+    sequence_numbers = [shipment_order.sequence_number for shipment_order in shipment_orders]
+    soap_response = build_create_shipment_response(*merge_shipment_results(shipment_results, sequence_numbers))
+    observe_stage("serialize", "", start)
+    return soap_response
+
+
+async def create_gls_shipment(shipment_orders, base_url, sandbox=False, inline_labels=False):
+    gls = await get_carrier("GLS")
+    return await gls.create_gls_shipment(shipment_orders, base_url, sandbox=sandbox, inline_labels=inline_labels)
+
+
+async def create_dhl_shipment(shipment_orders, username, password, sandbox=False, inline_labels=False):
+    dhl = await get_carrier("DHL")
+    return await dhl.create_dhl_shipment(shipment_orders, username, password, sandbox=sandbox,
+                                         inline_labels=inline_labels)
+
+
+async def timed_carrier_call(call, durations, index):
+    start = time.perf_counter()
+    try:
+        return await call
+    finally:
+        durations[index] = time.perf_counter() - start
+
 
-    shipment_details = shipment.get("ShipmentDetails")
+def observe_shipments(carrier, shipment_orders, creation_states, duration):
+    status_codes = {state["sequence_number"]: state["status_code"] for state in creation_states}
+    for shipment_order in shipment_orders:
+        SHIPMENT_DURATION.observe(duration, carrier, get_product_label(carrier, shipment_order),
+                                  status_codes.get(shipment_order.sequence_number, ""))
+
+
+def get_product_label(carrier, shipment_order: ShipmentOrder):
+    # Der Produktcode kommt vom Client - unbekannte Codes als "other", damit sie keine neuen Zeitreihen erzeugen
+    if carrier == 'GLS':
+        return 'GLS'
+    product_code = shipment_order.shipment_details.product_code
+    return product_code if product_code in get_product_codes() else "other"
+
+
+def record_shipments(carrier, shipment_orders, creation_states, username, password, sandbox=False,
+                     inline_labels=False):
+    # Index (getLabelDD ohne Carrier Call, zuständiger Carrier für deleteShipmentDD) und Journal - beides ohne
+    # auf die Platte zu warten
+    shipment_index = get_shipment_index()
+    shipment_ledger = get_shipment_ledger()
+    orders = {shipment_order.sequence_number: shipment_order for shipment_order in shipment_orders}
+    for state in creation_states:
+        if state["status_code"] != "0" or not state["shipment_number"]:
+            continue
+        shipment_index.add(state["shipment_number"], carrier, sandbox, username, password,
+                           label_url=state["label_url"], inline_label=inline_labels)
+        if shipment_ledger is not None:
+            shipment_order = orders.get(state["sequence_number"])
+            details = shipment_order.shipment_details if shipment_order else None
+            shipment_ledger.record_created(state["shipment_number"], carrier, sandbox, username, password,
+                                           customer_reference=details.customer_reference if details else None,
+                                           product_code=details.product_code if details else None,
+                                           label_url=state["label_url"], inline_label=inline_labels)
+
+
+async def lookup_shipments(shipment_numbers, sandbox, username, password):
+    # Das Journal ist maßgeblich: dort stehen auch Sendungen anderer Worker und von vor einem Neustart, und nur
+    # dort sieht ein Worker die Stornos der anderen. Der Index im Speicher deckt Sendungen dieses Workers ab, deren
+    # Eintrag noch nicht geschrieben ist. Stornierte Sendungen gelten als unbekannt, die Antwort dazu kommt vom
+    # Carrier. Beides nur mit den Zugangsdaten, mit denen die Sendung angelegt wurde - sonst entscheidet der Carrier.
+    shipment_index = get_shipment_index()
+    records = {shipment_number: shipment_index.get(shipment_number, sandbox, username, password)
+               for shipment_number in shipment_numbers}
+    shipment_ledger = get_shipment_ledger()
+    if shipment_ledger is not None:
+        credentials = get_credential_key(username, password)
+        for row in await shipment_ledger.get_many_async(shipment_numbers, sandbox=sandbox, username=username,
+                                                        password=password):
+            if row["status"] == STATUS_DELETED:
+                records[row["shipment_number"]] = None
+                shipment_index.discard(row["shipment_number"])
+            else:
+                records[row["shipment_number"]] = ShipmentRecord(
+                    row["shipment_number"], row["carrier"], bool(row["sandbox"]), row["account"], credentials,
+                    row["label_url"], bool(row["inline_label"]), row["created_at"])
+    return records
+
+
+def get_carrier_code_from_product_code(shipment_order: ShipmentOrder):
+    shipment_details = shipment_order.shipment_details
     if not shipment_details:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: ShipmentDetails missing.")
 
-    product_code = shipment_details.get('ProductCode')
+    product_code = shipment_details.product_code
     return product_code
 
 
@@ -93,47 +329,268 @@ async def handle_sandbox_soap_request(request: Request):
     return response
 
 
-async def handle_soap_request(request: Request, sandbox=False):
-    soap_request_data = await request.body()
-    soap_request_dict = xmltodict.parse(soap_request_data, encoding="utf-8")
-    logging.debug(f"SOAP Request DATA: {json.dumps(soap_request_dict, indent=2)}")
+@app.post("/production/soap/inline")
+async def handle_production_inline_soap_request(request: Request):
+    response = await handle_soap_request(request, sandbox=False, inline_labels=True)
+    return response
 
-    envelope = soap_request_dict.get("SOAP-ENV:Envelope")
-    if not envelope:
-        raise HTTPException(status_code=400, detail="Invalid SOAP request: Envelope missing.")
 
-    header = envelope.get("SOAP-ENV:Header")
-    if not header:
-        raise HTTPException(status_code=400, detail="Invalid SOAP request: Header missing.")
+@app.post("/sandbox/soap/inline")
+async def handle_sandbox_inline_soap_request(request: Request):
+    response = await handle_soap_request(request, sandbox=True, inline_labels=True)
+    return response
+
 
-    auth = header.get("ns1:Authentification")
-    if not auth:
-        raise HTTPException(status_code=400, detail="Invalid SOAP request: Authentification missing.")
+async def handle_soap_request(request: Request, sandbox=False, inline_labels=False):
+    start = time.perf_counter()
+    status = "500"
+    response_body = None
+    # Mitschnitt für benchmarks/replay.py, nur mit TRAFFIC_CAPTURE_PATH
+    capture = begin_capture(request.url.path, sandbox=sandbox, inline_labels=inline_labels)
+    try:
+        response = await process_soap_request(request, sandbox=sandbox, inline_labels=inline_labels)
+        status, response_body = str(response.status_code), response.body
+        return response
+    except HTTPException as e:
+        status, response_body = str(e.status_code), e.detail
+        raise
+    except UpstreamUnavailableError as e:
+        # Carrier gestört: sofort ein SOAP Fault statt den Client bis zum Timeout warten zu lassen
+        logging.warning("Upstream unavailable: %s", e.detail)
+        status, response_body = "503", build_soap_fault(e.detail)
+        headers = {"Retry-After": str(max(1, round(e.retry_after or 0)))}
+        return Response(content=response_body, status_code=503, media_type="application/xml", headers=headers)
+    except SoapValidationError as e:
+        # Lokal abgelehnt (SOAP_VALIDATION=reject) - der Request hätte beim Carrier nur einen Fehler erzeugt
+        logging.info("SOAP request rejected: %s", e.detail)
+        if e.method in SOAP_METHODS:
+            request.state.soap_method = e.method
+        status, response_body = "400", build_soap_fault(e.detail, fault_code="soapenv:Client")
+        return Response(content=response_body, status_code=400, media_type="application/xml")
+    finally:
+        # Nur unterstützte Methoden als Label, damit beliebige Methodennamen keine neuen Zeitreihen erzeugen
+        REQUEST_DURATION.observe(time.perf_counter() - start, getattr(request.state, "soap_method", "unknown"),
+                                 status)
+        if capture is not None:
+            end_capture(capture, await request.body(), int(status), response_body)
+
+
+async def process_soap_request(request: Request, sandbox=False, inline_labels=False):
+    soap_request_data = await request.body()
+    start = time.perf_counter()
+    validator = get_soap_validator()
+    try:
+        if validator is None:
+            soap_request = parse_soap_request(soap_request_data)
+        else:
+            # Mit SOAP_VALIDATION wird einmal mit lxml geparst, derselbe Baum wird validiert
+            soap_request, document = validator.parse(soap_request_data)
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid SOAP request: {str(e)}")
+    observe_stage("parse", "", start)
+    if validator is not None:
+        start = time.perf_counter()
+        validator.validate(document, soap_request)
+        observe_stage("validate", "", start)
+    logging.debug("SOAP Request DATA: %s", soap_request)
+
+    if not soap_request.has_envelope:
+        raise HTTPException(status_code=400, detail="Invalid SOAP request: Envelope missing.")
 
-    if sandbox:
-        username = os.getenv('GKP_SANDBOX_USER')
-        password = os.getenv('GKP_SANDBOX_PASSWORD')
-    else:
-        username = auth.get("ns1:user")
-        password = auth.get("ns1:signature")
-        if not username and not password:
-            username = os.getenv('GKP_USER')
-            password = os.getenv('GKP_PASSWORD')
-
-    body = envelope.get("SOAP-ENV:Body")
-    if not body:
+    if not soap_request.has_body or not soap_request.method:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Body missing.")
 
-    method_name, method_data = next(iter(body.items()))
-
-    if method_name.endswith("CreateShipmentDDRequest"):
-        logging.debug(f"SOAP Method: {method_name} - Wird verarbeitet.")
-        response_data = await create_shipment(method_data, username, password, sandbox=sandbox, origin_request=request)
-        logging.debug(f"SOAP Response DATA: {response_data}")
-    else:
+    method_name = soap_request.method
+    handler = SOAP_METHODS.get(method_name)
+    if handler is None:
         # Für alle anderen Methoden, die nicht unterstützt werden oder unbekannt sind
         raise HTTPException(status_code=400, detail=f"Unsupported SOAP method: {method_name}")
 
+    request.state.soap_method = method_name
+    if method_name in PUBLIC_SOAP_METHODS:
+        # Laut WSDL ohne SOAP Header (getVersion) - es werden keine Zugangsdaten gebraucht
+        username = password = None
+    else:
+        if not soap_request.has_header:
+            raise HTTPException(status_code=400, detail="Invalid SOAP request: Header missing.")
+
+        if not soap_request.has_auth:
+            raise HTTPException(status_code=400, detail="Invalid SOAP request: Authentification missing.")
+
+        username, password = resolve_credentials(soap_request.user, soap_request.signature, sandbox=sandbox)
+
+        # Clients, die sofort drucken, bekommen das Label direkt in der Antwort - pro Endpoint oder pro Benutzer
+        inline_labels = inline_labels or username in get_inline_label_users()
+
+    logging.debug("SOAP Method: %s - Wird verarbeitet.", method_name)
+    response_data = await handler(request, soap_request, username, password, sandbox=sandbox,
+                                  inline_labels=inline_labels)
+    logging.debug("SOAP Response DATA: %s", lazy_payload(response_data))
+
     headers = {"Content-Type": "application/xml"}
     response = Response(content=response_data, media_type="application/xml", headers=headers)
     return response
+
+
+# SOAP Operation (lokaler Name des Body-Elements) -> Handler. Jeder Handler liefert die fertige SOAP Antwort (bytes).
+SOAP_METHODS = {}
+# Operationen, die ohne Authentification Header auskommen
+PUBLIC_SOAP_METHODS = set()
+
+
+def soap_method(name, requires_auth=True):
+    def register(handler):
+        SOAP_METHODS[name] = handler
+        if not requires_auth:
+            PUBLIC_SOAP_METHODS.add(name)
+        return handler
+    return register
+
+
+def get_shipment_numbers(soap_request):
+    if not soap_request.shipment_numbers:
+        raise HTTPException(status_code=400, detail="Invalid SOAP request: ShipmentNumber missing.")
+    # Doppelte Nummern nur einmal an den Carrier
+    return list(dict.fromkeys(soap_request.shipment_numbers))
+
+
+@soap_method("CreateShipmentDDRequest")
+async def handle_create_shipment(request: Request, soap_request, username, password, sandbox=False,
+                                 inline_labels=False):
+    idempotency_cache = get_idempotency_cache()
+    if idempotency_cache is None:
+        return await create_shipment(soap_request, username, password, sandbox=sandbox, origin_request=request,
+                                     inline_labels=inline_labels)
+    # Wiederholte Requests (Client-Timeouts) dürfen kein zweites Label erzeugen
+    idempotency_key = get_idempotency_key(soap_request, username, password, sandbox=sandbox,
+                                          inline_labels=inline_labels)
+    return await idempotency_cache.run(
+        idempotency_key,
+        lambda: create_shipment(soap_request, username, password, sandbox=sandbox, origin_request=request,
+                                inline_labels=inline_labels),
+        cacheable=has_only_created_shipments,
+        references=find_shipment_numbers,
+    )
+
+
+@soap_method("GetLabelDDRequest")
+async def handle_get_label(request: Request, soap_request, username, password, sandbox=False, inline_labels=False):
+    # Label-URLs frisch angelegter Sendungen kommen aus dem lokalen Index, nur der Rest geht an DHL.
+    # Das Ausgabeformat (URL oder XMLLabel) bestimmt - wie bei Intraship - die ursprüngliche ShipmentOrder.
+    shipment_numbers = get_shipment_numbers(soap_request)
+    records = await lookup_shipments(shipment_numbers, sandbox, username, password)
+    cached_states = []
+    dhl_numbers = {False: [], True: []}
+    for shipment_number in shipment_numbers:
+        record = records[shipment_number]
+        if record is not None and record.label_url:
+            cached_states.append(create_shipment_state("0", ["ok"], shipment_number, label_url=record.label_url))
+        elif record is not None and record.carrier == 'GLS':
+            cached_states.append(create_shipment_state("1000", ["Label is no longer available."], shipment_number))
+        else:
+            inline = inline_labels or (record is not None and record.inline_label)
+            dhl_numbers[inline].append(shipment_number)
+
+    results = [("0", "ok", cached_states)] if cached_states else []
+    dhl = await get_carrier("DHL") if any(dhl_numbers.values()) else None
+    results.extend(await asyncio.gather(*(
+        dhl.get_dhl_documents(numbers, username, password, sandbox=sandbox, inline=inline, document="label")
+        for inline, numbers in dhl_numbers.items() if numbers
+    )))
+    return build_shipment_states_response("GetLabelResponse", *merge_shipment_results(results, shipment_numbers),
+                                          state_tag="LabelData")
+
+
+@soap_method("DeleteShipmentDDRequest")
+async def handle_delete_shipment(request: Request, soap_request, username, password, sandbox=False,
+                                 inline_labels=False):
+    shipment_numbers = get_shipment_numbers(soap_request)
+    records = await lookup_shipments(shipment_numbers, sandbox, username, password)
+    gls_states = []
+    dhl_numbers = []
+    for shipment_number in shipment_numbers:
+        record = records[shipment_number]
+        if record is not None and record.carrier == 'GLS':
+            gls_states.append(create_shipment_state("1000", ["Deletion of GLS shipments is not supported."],
+                                                    shipment_number))
+        else:
+            dhl_numbers.append(shipment_number)
+
+    results = [("1000", gls_states[0]["status_messages"][0], gls_states)] if gls_states else []
+    if dhl_numbers:
+        results.append(await (await get_carrier("DHL")).delete_dhl_shipments(dhl_numbers, username, password, sandbox=sandbox))
+    status_code, status_name, states = merge_shipment_results(results, shipment_numbers)
+    deleted = [state["shipment_number"] for state in states if state["status_code"] == "0"]
+    shipment_index = get_shipment_index()
+    for shipment_number in deleted:
+        shipment_index.discard(shipment_number)
+    shipment_ledger = get_shipment_ledger()
+    if shipment_ledger is not None:
+        await shipment_ledger.record_status_async(deleted, STATUS_DELETED)
+    idempotency_cache = get_idempotency_cache()
+    if idempotency_cache is not None:
+        # Ein erneuter CreateShipmentDDRequest mit denselben Daten muss eine neue Sendung anlegen
+        await idempotency_cache.forget(deleted)
+    return build_shipment_states_response("DeleteShipmentResponse", status_code, status_name, states,
+                                          state_tag="DeletionState", status_tag="Status")
+
+
+@soap_method("DoManifestDDRequest")
+async def handle_do_manifest(request: Request, soap_request, username, password, sandbox=False,
+                             inline_labels=False):
+    shipment_numbers = get_shipment_numbers(soap_request)
+    records = await lookup_shipments(shipment_numbers, sandbox, username, password)
+    # GLS Sendungen werden ohne eigenen Tagesabschluss übergeben
+    gls_states = []
+    dhl_numbers = []
+    for shipment_number in shipment_numbers:
+        record = records[shipment_number]
+        if record is not None and record.carrier == 'GLS':
+            gls_states.append(create_shipment_state("0", ["ok"], shipment_number))
+        else:
+            dhl_numbers.append(shipment_number)
+
+    results = [("0", "ok", gls_states)] if gls_states else []
+    if dhl_numbers:
+        results.append(await (await get_carrier("DHL")).do_dhl_manifest(dhl_numbers, username, password, sandbox=sandbox))
+    status_code, status_name, states = merge_shipment_results(results, shipment_numbers)
+    shipment_ledger = get_shipment_ledger()
+    if shipment_ledger is not None:
+        await shipment_ledger.record_status_async(
+            [state["shipment_number"] for state in states if state["status_code"] == "0"], STATUS_MANIFESTED)
+    return build_shipment_states_response("DoManifestResponse", status_code, status_name, states,
+                                          state_tag="ManifestState", status_tag="Status")
+
+
+@soap_method("GetExportDocDDRequest")
+async def handle_get_export_doc(request: Request, soap_request, username, password, sandbox=False,
+                                inline_labels=False):
+    shipment_numbers = get_shipment_numbers(soap_request)
+    inline = (soap_request.doc_type or 'URL').upper() == 'PDF'
+    dhl = await get_carrier("DHL")
+    status_code, status_name, states = await dhl.get_dhl_documents(shipment_numbers, username, password,
+                                                                   sandbox=sandbox, inline=inline,
+                                                                   document="customsDoc")
+    for state in states:
+        state["label_element"], state["xml_label_element"] = "ExportDocURL", "ExportDocPDFData"
+    return build_shipment_states_response("GetExportDocResponse", status_code, status_name, states,
+                                          state_tag="ExportDocData")
+
+
+@soap_method("GetManifestDDRequest")
+async def handle_get_manifest(request: Request, soap_request, username, password, sandbox=False,
+                              inline_labels=False):
+    manifest_date = soap_request.manifest_date or soap_request.manifest_from_date
+    if not manifest_date:
+        raise HTTPException(status_code=400, detail="Invalid SOAP request: manifestDate missing.")
+    if soap_request.manifest_to_date and soap_request.manifest_to_date != manifest_date:
+        # Die DHL REST API liefert das Protokoll nur je Tag
+        return build_get_manifest_response("1000", "manifestDateRange is only supported for a single day.")
+    dhl = await get_carrier("DHL")
+    return build_get_manifest_response(*await dhl.get_dhl_manifest(manifest_date, username, password,
+                                                                   sandbox=sandbox))
+
+
+@soap_method("Version", requires_auth=False)
+async def handle_get_version(request: Request, soap_request, username, password, sandbox=False, inline_labels=False):
+    return GET_VERSION_RESPONSE
@@ -0,0 +1,177 @@
+"""
+Die SOAP Antwort-Builder des Baseline-Commits (50b72f1), unverändert übernommen: dhl_rest_to_soap_data aus
+carriers/dhl.py und gls_soap_to_soap_data aus carriers/gls.py. Referenz für benchmarks/bench_soap_response.py und
+tests/test_soap_response.py - tests/test_soap_response.py prüft auch, dass die Kopie dem Commit entspricht.
+"""
+import xml.etree.ElementTree as ET
+
+from fastapi import HTTPException
+
+
+def dhl_rest_to_soap_data(response_statuscode, rest_data):
+
+    status = rest_data.get("status")
+    if status and isinstance(status, dict):
+        status_name = status.get("title").lower()
+    else:
+        status_name = rest_data.get("title").lower()
+
+    validation_messages = []
+
+    if response_statuscode == 200:
+        status_code = "0"
+    elif response_statuscode == 401:
+        if 'unauthorized' in status_name:
+            status_code = "1001"
+            status_name = 'login failed'
+            validation_messages.append(rest_data.get('detail'))
+        else:
+            raise HTTPException(status_code=401, detail="Unknown 401 Status Code Issue")
+    else:
+        status_code = "1101"
+        status_name = 'Hard validation error occured.'
+        validation_message = rest_data.get("items")[0].get("validationMessage")
+        if validation_message:
+            validation_message = validation_message.get('validationMessage')
+
+    items = rest_data.get("items")
+    label_url = None
+    shipment_no = None
+
+    if items:
+        shipment_no = items[0].get("shipmentNo")
+        if items[0].get("label"):
+            label_url = rest_data.get("items")[0].get("label").get("url")
+
+        if items[0].get("validationMessages"):
+            for validation_message in items[0].get("validationMessages"):
+                message = validation_message.get("validationMessage")
+                if validation_message.get("validationState") == "Warning":
+                    validation_messages.append(message)
+                else:
+                    validation_messages.insert(0, message)
+
+
+    # Namensräume definieren
+    namespaces = {
+        'soapenv': "http://schemas.xmlsoap.org/soap/envelope/",
+        'cis': "http://dhl.de/webservice/cisbase",
+        'is': "http://de.ws.intraship"
+    }
+    # Alle Namensräume für die Verwendung im Dokument registrieren
+    for ns in namespaces:
+        ET.register_namespace(ns, namespaces[ns])
+
+    # Wurzelelement erstellen
+    envelope = ET.Element(f"{{{namespaces['soapenv']}}}Envelope")
+
+    # Header und Body erstellen
+    header = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Header")
+    body = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Body")
+
+    # CreateShipmentResponse Element
+    create_shipment_response = ET.SubElement(body, f"{{{namespaces['is']}}}CreateShipmentResponse")
+
+    # Version Element
+    version = ET.SubElement(create_shipment_response, f"{{{namespaces['cis']}}}Version")
+    ET.SubElement(version, f"{{{namespaces['cis']}}}majorRelease").text = "1"
+    ET.SubElement(version, f"{{{namespaces['cis']}}}minorRelease").text = "0"
+    ET.SubElement(version, f"{{{namespaces['cis']}}}build").text = "14"
+
+    # Status Element
+    status = ET.SubElement(create_shipment_response, "status")
+    ET.SubElement(status, "StatusCode").text = status_code
+    ET.SubElement(status, "StatusMessage").text = status_name
+
+    # ShipmentNumber Element
+    if items:
+        # CreationState Element
+        creation_state = ET.SubElement(create_shipment_response, "CreationState")
+        ET.SubElement(creation_state, "StatusCode").text = status_code
+        ET.SubElement(creation_state, "StatusMessage").text = status_name
+        if validation_messages:
+            for validation_message in validation_messages:
+                ET.SubElement(creation_state, "StatusMessage").text = validation_message
+
+        ET.SubElement(creation_state, "SequenceNumber").text = "1"
+        shipment_number = ET.SubElement(creation_state, "ShipmentNumber")
+        ET.SubElement(shipment_number, f"{{{namespaces['cis']}}}shipmentNumber").text = shipment_no
+
+        # PieceInformation Element
+        piece_information = ET.SubElement(creation_state, "PieceInformation")
+        piece_number = ET.SubElement(piece_information, "PieceNumber")
+        ET.SubElement(piece_number, f"{{{namespaces['cis']}}}licensePlate").text = shipment_no
+
+        # Labelurl
+        if label_url:
+            ET.SubElement(creation_state, "Labelurl").text = label_url
+
+    # Baum in eine Zeichenfolge umwandeln
+    xml_str = ET.tostring(envelope, encoding="utf-8")
+    return xml_str
+
+
+def gls_soap_to_soap_data(gls_soap_response):
+    print(gls_soap_response)
+
+    status_code = 0
+    status_name = 'ok'
+    shipment_no = gls_soap_response.ParcelData[0].TrackID
+
+    # Namensräume definieren
+    namespaces = {
+        'soapenv': "http://schemas.xmlsoap.org/soap/envelope/",
+        'cis': "http://dhl.de/webservice/cisbase",
+        'is': "http://de.ws.intraship"
+    }
+    # Alle Namensräume für die Verwendung im Dokument registrieren
+    for ns in namespaces:
+        ET.register_namespace(ns, namespaces[ns])
+
+    # Wurzelelement erstellen
+    envelope = ET.Element(f"{{{namespaces['soapenv']}}}Envelope")
+
+    # Header und Body erstellen
+    header = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Header")
+    body = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Body")
+
+    # CreateShipmentResponse Element
+    create_shipment_response = ET.SubElement(body, f"{{{namespaces['is']}}}CreateShipmentResponse")
+
+    # Version Element
+    version = ET.SubElement(create_shipment_response, f"{{{namespaces['cis']}}}Version")
+    ET.SubElement(version, f"{{{namespaces['cis']}}}majorRelease").text = "1"
+    ET.SubElement(version, f"{{{namespaces['cis']}}}minorRelease").text = "0"
+    ET.SubElement(version, f"{{{namespaces['cis']}}}build").text = "14"
+
+    # Status Element
+    status = ET.SubElement(create_shipment_response, "status")
+    ET.SubElement(status, "StatusCode").text = status_code
+    ET.SubElement(status, "StatusMessage").text = status_name
+
+    # ShipmentNumber Element
+    #if items:
+        # CreationState Element
+    creation_state = ET.SubElement(create_shipment_response, "CreationState")
+    ET.SubElement(creation_state, "StatusCode").text = status_code
+    ET.SubElement(creation_state, "StatusMessage").text = status_name
+    #if validation_messages:
+    #    for validation_message in validation_messages:
+    #        ET.SubElement(creation_state, "StatusMessage").text = validation_message
+
+    ET.SubElement(creation_state, "SequenceNumber").text = "1"
+    shipment_number = ET.SubElement(creation_state, "ShipmentNumber")
+    ET.SubElement(shipment_number, f"{{{namespaces['cis']}}}shipmentNumber").text = shipment_no
+
+    # PieceInformation Element
+    piece_information = ET.SubElement(creation_state, "PieceInformation")
+    piece_number = ET.SubElement(piece_information, "PieceNumber")
+    ET.SubElement(piece_number, f"{{{namespaces['cis']}}}licensePlate").text = shipment_no
+
+    # Labelurl
+    if gls_soap_response.LabelURL:
+        ET.SubElement(creation_state, "LabelURL").text = gls_soap_response.LabelURL
+
+    # Baum in eine Zeichenfolge umwandeln
+    xml_str = ET.tostring(envelope, encoding="utf-8")
+    return xml_str
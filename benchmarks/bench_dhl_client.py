@@ -0,0 +1,85 @@
+"""
+Vergleicht die Latenz von DHL REST Calls mit einem neuen httpx.AsyncClient pro Request
+gegenüber dem gemeinsam genutzten Client aus carriers.dhl.
+
+    python -m benchmarks.bench_dhl_client --requests 500 --concurrency 20
+
+Ohne --url wird ein lokaler Mock-Server gestartet. Mit --ssl-certfile/--ssl-keyfile läuft der Mock
+über TLS, womit auch der eingesparte TLS-Handshake sichtbar wird (Zertifikat per SSL_CERT_FILE vertrauen).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from contextlib import nullcontext
+
+import httpx
+
+from benchmarks.mock_dhl import create_mock_dhl_app
+from benchmarks.mock_servers import run_in_thread
+from carriers import dhl
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def call_with_new_client(base_url, payload):
+    async with httpx.AsyncClient() as client:
+        return await client.post(f"{base_url}orders", json=payload)
+
+
+async def call_with_shared_client(base_url, payload):
+    return await dhl.get_dhl_client(sandbox=False).post("orders", json=payload)
+
+
+async def run(mode, base_url, requests, concurrency):
+    payload = dhl.get_dhl_test_rest_object()
+    call = call_with_new_client if mode == "new-client" else call_with_shared_client
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await call(base_url, payload)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    duration = time.perf_counter() - start
+    await dhl.close_dhl_clients()
+    return latencies, duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="Basis-URL eines laufenden DHL-Mocks (Standard: lokaler Mock)")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="Künstliche Latenz des Mocks in Sekunden")
+    parser.add_argument("--ssl-certfile")
+    parser.add_argument("--ssl-keyfile")
+    args = parser.parse_args()
+
+    if args.url:
+        server = nullcontext(args.url)
+    else:
+        ssl_kwargs = {"ssl_certfile": args.ssl_certfile, "ssl_keyfile": args.ssl_keyfile} if args.ssl_certfile else {}
+        server = run_in_thread(create_mock_dhl_app(latency=args.latency), **ssl_kwargs)
+
+    with server as base_url:
+        os.environ["DHL_PRODUCTION_REST_API_URL"] = base_url
+        print(f"{'mode':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for mode in ("new-client", "shared-client"):
+            latencies, duration = asyncio.run(run(mode, base_url, args.requests, args.concurrency))
+            print(f"{mode:<14}{args.requests / duration:>10.1f}{statistics.median(latencies):>10.2f}"
+                  f"{percentile(latencies, 99):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Prüft, dass DHL Requests weiterlaufen, während GLS Calls hängen.
+
+    python -m benchmarks.bench_gls_concurrency --gls-stall 2.0 --gls-requests 8 --dhl-requests 50
+
+Der GLS SOAP Call wird durch einen blockierenden Sleep ersetzt, DHL läuft gegen einen lokalen Mock.
+Das Skript endet mit Exit-Code 1, wenn die DHL p99-Latenz in die Größenordnung des GLS-Stalls gerät.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+
+from benchmarks.mock_dhl import create_mock_dhl_app
+from benchmarks.mock_servers import run_in_thread
+from benchmarks.synthetic_labels import make_gls_label_pdf
+
+SAMPLE_REQUEST = Path(__file__).resolve().parent.parent / "samples" / "soap-request-gls-ok-2.xml"
+
+
+def stall_gls(stall_seconds):
+    from carriers import gls
+
+    label_pdf = make_gls_label_pdf()
+
+    def make_gls_soap_call(gls_client, gls_soap_payload, sandbox=False):
+        time.sleep(stall_seconds)
+        return SimpleNamespace(ParcelData=[SimpleNamespace(TrackID="ZXYMOCK1")], PrintData=[SimpleNamespace(Data=label_pdf)],
+                               LabelURL=None)
+
+    gls.get_gls_soap_client = lambda url: (None, False)
+    gls.soap_to_gls_soap_data = lambda gls_client, xml_data: None
+    gls.make_gls_soap_call = make_gls_soap_call
+
+
+async def run(gls_requests, dhl_requests):
+    import app
+
+    gls_body = SAMPLE_REQUEST.read_bytes()
+    dhl_body = gls_body.replace(b"<ProductCode>GLS</ProductCode>", b"<ProductCode>EPN</ProductCode>")
+
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://proxy.local/") as client:
+        async def post(body):
+            start = time.perf_counter()
+            response = await client.post("production/soap", content=body)
+            response.raise_for_status()
+            return (time.perf_counter() - start) * 1000
+
+        gls_tasks = [asyncio.create_task(post(gls_body)) for _ in range(gls_requests)]
+        await asyncio.sleep(0.05)  # GLS Calls sollen bereits hängen
+        dhl_latencies = [await post(dhl_body) for _ in range(dhl_requests)]
+        gls_latencies = await asyncio.gather(*gls_tasks)
+    return dhl_latencies, gls_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gls-stall", type=float, default=2.0)
+    parser.add_argument("--gls-requests", type=int, default=8)
+    parser.add_argument("--dhl-requests", type=int, default=50)
+    args = parser.parse_args()
+
+    with run_in_thread(create_mock_dhl_app()) as base_url:
+        os.environ.update({
+            "DHL_API_KEY": "mock",
+            "DHL_PRODUCTION_REST_API_URL": base_url,
+            "EKP": "3333333333",
+            "DHL_BILLING_NUMBER_NAT_PREFIX": "0101",
+            "GLS_LABELS_FOLDER": os.environ.get("GLS_LABELS_FOLDER", "/tmp/gls-bench-labels"),
+        })
+        stall_gls(args.gls_stall)
+        dhl_latencies, gls_latencies = asyncio.run(run(args.gls_requests, args.dhl_requests))
+
+    dhl_p99 = max(dhl_latencies) if len(dhl_latencies) < 100 else statistics.quantiles(dhl_latencies, n=100)[98]
+    print(f"GLS: {len(gls_latencies)} requests, median {statistics.median(gls_latencies):.1f} ms")
+    print(f"DHL: {len(dhl_latencies)} requests, median {statistics.median(dhl_latencies):.1f} ms, "
+          f"p99 {dhl_p99:.1f} ms")
+    if dhl_p99 >= args.gls_stall * 1000 / 2:
+        print("FAIL: DHL requests were blocked by stalled GLS calls")
+        sys.exit(1)
+    print("OK: DHL requests kept flowing while GLS calls were stalled")
+
+
+if __name__ == "__main__":
+    main()
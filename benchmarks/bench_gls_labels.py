@@ -0,0 +1,95 @@
+"""
+Durchsatz der GLS Label-Aufbereitung: bisheriger Code (output.save() pro Packstück) gegenüber
+carriers.gls_labels (Prozess-Pool, ein Save pro Sendung).
+
+    python -m benchmarks.bench_gls_labels --shipments 100 --parcels 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import fitz
+
+from benchmarks.synthetic_labels import make_gls_label_pdf
+from carriers import gls_labels
+
+
+def legacy_relayout(print_data, filepath):
+    # Entspricht save_attachment_and_get_url vor der Umstellung
+    output = fitz.open()
+    for pdf_data in print_data:
+        original = fitz.open(stream=pdf_data, filetype="pdf")
+        page = original[0]
+        margin_left = 2.8 * 28.3465
+        margin_top = 2 * 28.3465
+        label_width = 15.0 * 28.3465
+        label_height = 20.8 * 28.3465
+        old_width, old_height = page.rect.width, page.rect.height
+        new_height = old_height + margin_top
+        new_page = output.new_page(height=label_height, width=label_width)
+        new_page.show_pdf_page(fitz.Rect(margin_left, margin_top, old_width + margin_left, new_height), original, 0)
+        output.save(filepath)
+
+
+def run_legacy(shipments, label_dir):
+    start = time.perf_counter()
+    for index, print_data in enumerate(shipments):
+        legacy_relayout(print_data, os.path.join(label_dir, f"legacy_{index}.pdf"))
+    return time.perf_counter() - start
+
+
+def run_single_save(shipments, label_dir):
+    # Gleiche Render-Funktion wie im Pool, aber im aktuellen Prozess - zeigt den Effekt von einem Save pro Sendung
+    template = gls_labels.get_label_template()
+    start = time.perf_counter()
+    for index, print_data in enumerate(shipments):
+        with open(os.path.join(label_dir, f"single_{index}.pdf"), "wb") as f:
+            f.write(gls_labels.relayout_label(print_data, template))
+    return time.perf_counter() - start
+
+
+async def run_engine(shipments, label_dir):
+    gls_labels.start_label_pool()
+    # Pool aufwärmen, damit der Prozessstart nicht mitgemessen wird
+    await gls_labels.render_label(shipments[0])
+
+    async def one(index, print_data):
+        label_pdf = await gls_labels.render_label(print_data)
+        with open(os.path.join(label_dir, f"engine_{index}.pdf"), "wb") as f:
+            f.write(label_pdf)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index, print_data) for index, print_data in enumerate(shipments)))
+    duration = time.perf_counter() - start
+    gls_labels.shutdown_label_pool()
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shipments", type=int, default=100)
+    parser.add_argument("--parcels", type=int, default=5)
+    args = parser.parse_args()
+
+    shipments = [[make_gls_label_pdf(f"ZX{s:04d}{p:02d}") for p in range(args.parcels)]
+                 for s in range(args.shipments)]
+    labels = args.shipments * args.parcels
+
+    with tempfile.TemporaryDirectory() as label_dir:
+        legacy = run_legacy(shipments, label_dir)
+        single_save = run_single_save(shipments, label_dir)
+        engine = asyncio.run(run_engine(shipments, label_dir))
+        with fitz.open(os.path.join(label_dir, "engine_0.pdf")) as doc:
+            assert doc.page_count == args.parcels
+
+    print(f"{args.shipments} shipments x {args.parcels} parcels, {os.cpu_count()} cores")
+    print(f"{'mode':<14}{'seconds':>10}{'labels/s':>12}")
+    print(f"{'legacy':<14}{legacy:>10.2f}{labels / legacy:>12.1f}")
+    print(f"{'single-save':<14}{single_save:>10.2f}{labels / single_save:>12.1f}")
+    print(f"{'process-pool':<14}{engine:>10.2f}{labels / engine:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
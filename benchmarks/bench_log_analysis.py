@@ -0,0 +1,93 @@
+"""
+Benchmark: zeilenweiser Regex-Scan (bisheriges utils/list_all_soap_body_elements_from log.py) gegenüber
+utils.soap_log_analysis auf einem synthetischen Intraship Log.
+
+    python -m benchmarks.bench_log_analysis --exchanges 20000 --workers 4
+"""
+import re
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+from utils.soap_log_analysis import count_operations, iter_soap_exchanges
+
+SAMPLE_REQUEST = Path(__file__).resolve().parent.parent / "samples" / "soap-request-gls-ok-2.xml"
+
+RESPONSE = b"""<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+  <soapenv:Body>
+    <ns2:CreateShipmentResponse xmlns:ns2="http://de.ws.intraship">
+      <status><StatusCode>0</StatusCode><StatusMessage>ok</StatusMessage></status>
+      <CreationState><StatusCode>0</StatusCode><SequenceNumber>1</SequenceNumber>
+        <ShipmentNumber><ns1:shipmentNumber>22222222220104</ns1:shipmentNumber></ShipmentNumber>
+        <Labelurl>https://example.invalid/label.pdf</Labelurl></CreationState>
+    </ns2:CreateShipmentResponse>
+  </soapenv:Body>
+</soapenv:Envelope>
+"""
+
+
+def write_log(path, exchanges):
+    request = SAMPLE_REQUEST.read_bytes()
+    with open(path, "wb") as file:
+        for n in range(exchanges):
+            file.write(b"2024-05-02 10:%02d:%02d,123 INFO REQUEST %d\n" % (n // 60 % 60, n % 60, n))
+            file.write(request)
+            file.write(b"\n2024-05-02 10:%02d:%02d,456 INFO RESPONSE %d\n" % (n // 60 % 60, n % 60, n))
+            file.write(RESPONSE)
+
+
+def count_line_by_line(path):
+    # Das bisherige Verfahren: drei re.search je Zeile, Nachricht per String-Verkettung
+    methods = {}
+    with open(path, "r", encoding="utf-8") as file:
+        excerpt, inside = "", False
+        for line in file:
+            start = re.search(r"<([^:\s>]*:)?Envelope", line)
+            if start and not inside:
+                inside = True
+                line = line[start.start():]
+            if inside:
+                end = re.search(r"</([^:\s>]*:)?Envelope>", line)
+                if end:
+                    excerpt += line[:end.end()]
+                    first = re.search(r"<([^>\s:]+:[^>\s]+)", excerpt)
+                    if first:
+                        methods[first.group(1)] = methods.get(first.group(1), 0) + 1
+                    excerpt, inside = "", False
+                else:
+                    excerpt += line
+    return methods
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{name:<28}{time.perf_counter() - start:>10.2f} s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--exchanges", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=8, help="MiB")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "intraship.log")
+        write_log(path, args.exchanges)
+        print(f"{Path(path).stat().st_size / 1024 / 1024:.1f} MiB, {args.exchanges} Request/Response Paare")
+        chunk_size = args.chunk_size * 1024 * 1024
+
+        measure("line-by-line regex", lambda: count_line_by_line(path))
+        for workers in (1, args.workers):
+            counts = measure(f"count_operations ({workers} w)", lambda: count_operations(path, workers, chunk_size))
+            assert counts["CreateShipmentDDRequest"] == args.exchanges
+            exchanges = measure(f"exchanges ({workers} w)",
+                                lambda: sum(1 for _ in iter_soap_exchanges(path, workers, chunk_size)))
+            assert exchanges == args.exchanges
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Misst den Overhead des Loggings pro Request: aus, INFO, DEBUG (Queue + Listener Thread)
+und zum Vergleich ein synchroner FileHandler auf DEBUG wie vorher mit logging.basicConfig.
+
+    python -m benchmarks.bench_logging --requests 500 --orders 5
+
+DHL läuft gegen einen lokalen Mock, die Log-Dateien landen in einem temporären Verzeichnis.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.mock_dhl import create_mock_dhl_app
+from benchmarks.mock_servers import run_in_thread
+
+SAMPLE_REQUEST = Path(__file__).resolve().parent.parent / "samples" / "soap-request-gls-ok-2.xml"
+
+
+def build_request(orders):
+    body = SAMPLE_REQUEST.read_bytes().replace(b"<ProductCode>GLS</ProductCode>", b"<ProductCode>EPN</ProductCode>")
+    order = re.search(rb"<ShipmentOrder>.*</ShipmentOrder>", body, re.S).group(0)
+    batch = b"".join(order.replace(b"<SequenceNumber>1</SequenceNumber>", b"<SequenceNumber>%d</SequenceNumber>" % i)
+                     for i in range(1, orders + 1))
+    return body.replace(order, batch)
+
+
+def configure(mode, log_dir):
+    from utils.structured_logging import create_file_handler, setup_logging, stop_logging
+
+    os.environ["LOG_FILE"] = os.path.join(log_dir, f"{mode}.log")
+    if mode == "off":
+        setup_logging(level="CRITICAL", handlers=[])
+    elif mode == "sync-debug":
+        stop_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handler = logging.FileHandler(os.environ["LOG_FILE"])
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+    else:
+        setup_logging(level=mode.upper(), handlers=[create_file_handler()])
+
+
+async def measure(client, body, requests):
+    for _ in range(10):
+        (await client.post("production/soap", content=body)).raise_for_status()
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.post("production/soap", content=body)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+async def run(modes, body, requests, log_dir):
+    import app
+    from utils.structured_logging import stop_logging
+
+    results = {}
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://proxy.local/") as client:
+        for mode in modes:
+            configure(mode, log_dir)
+            results[mode] = await measure(client, body, requests)
+            stop_logging()
+            log_file = os.path.join(log_dir, f"{mode}.log")
+            size = os.path.getsize(log_file) if os.path.exists(log_file) else 0
+            print(f"{mode:>10}: median {statistics.median(results[mode]):6.2f} ms, "
+                  f"p99 {statistics.quantiles(results[mode], n=100)[98]:6.2f} ms, log {size / 1024:8.1f} KiB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5)
+    parser.add_argument("--modes", default="off,info,debug,sync-debug")
+    args = parser.parse_args()
+
+    body = build_request(args.orders)
+    with tempfile.TemporaryDirectory() as log_dir, run_in_thread(create_mock_dhl_app()) as base_url:
+        os.environ.update({
+            "DHL_API_KEY": "mock",
+            "DHL_PRODUCTION_REST_API_URL": base_url,
+            "EKP": "3333333333",
+            "DHL_BILLING_NUMBER_NAT_PREFIX": "0101",
+            "IDEMPOTENCY_ENABLED": "false",
+            "LOG_FILE": os.path.join(log_dir, "import.log"),
+        })
+        results = asyncio.run(run(args.modes.split(","), body, args.requests, log_dir))
+
+    if "off" in results:
+        baseline = statistics.median(results["off"])
+        for mode, latencies in results.items():
+            if mode != "off":
+                print(f"{mode:>10}: {statistics.median(latencies) - baseline:+.2f} ms per request vs. off")
+
+
+if __name__ == "__main__":
+    main()
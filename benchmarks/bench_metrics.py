@@ -0,0 +1,100 @@
+"""
+Overhead der Metriken: Kosten pro observe()/inc(), Dauer eines /metrics Abrufs und
+Request-Latenz mit und ohne Metriken gegen den lokalen DHL Mock.
+
+    python -m benchmarks.bench_metrics --requests 500 --orders 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import timeit
+
+import httpx
+
+from benchmarks.bench_logging import build_request
+from benchmarks.mock_dhl import create_mock_dhl_app
+from benchmarks.mock_servers import run_in_thread
+from utils import metrics
+
+
+def micro(number):
+    histogram = metrics.Histogram("bench_seconds", "bench", ("stage", "carrier"))
+    counter = metrics.Counter("bench_total", "bench", ("carrier", "kind"))
+    observe_ns = timeit.timeit(lambda: histogram.observe(0.0123, "upstream", "DHL"), number=number) / number * 1e9
+    inc_ns = timeit.timeit(lambda: counter.inc("DHL", "timeout"), number=number) / number * 1e9
+    stage_ns = timeit.timeit(lambda: metrics.observe_stage("bench", "", time.perf_counter()),
+                             number=number) / number * 1e9
+    print(f"Histogram.observe: {observe_ns:6.0f} ns")
+    print(f"Counter.inc:       {inc_ns:6.0f} ns")
+    print(f"observe_stage:     {stage_ns:6.0f} ns (inkl. perf_counter)")
+
+    registry = metrics.Registry()
+    wide = registry.register(metrics.Histogram("bench_wide_seconds", "bench", ("carrier", "product", "status")))
+    for carrier in ("DHL", "GLS"):
+        for product in ("EPN", "BPI", "EPI", "KLP", "GLS"):
+            for status in ("0", "1000", "1001", "1101"):
+                wide.observe(0.1, carrier, product, status)
+    render_ms = timeit.timeit(registry.render, number=100) / 100 * 1000
+    print(f"render (40 Serien): {render_ms:.2f} ms pro Abruf")
+
+
+async def measure(client, body, requests):
+    for _ in range(10):
+        (await client.post("production/soap", content=body)).raise_for_status()
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.post("production/soap", content=body)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+async def end_to_end(body, requests, rounds):
+    import app
+
+    results = {"off": [], "on": []}
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://proxy.local/") as client:
+        # Abwechselnd messen, damit Drift (Caches, Mock) beide Varianten gleich trifft
+        for _ in range(rounds):
+            for mode in ("off", "on"):
+                metrics.metrics_enabled = mode == "on"
+                results[mode].extend(await measure(client, body, requests // rounds))
+        scrape = await client.get("metrics")
+        print(f"/metrics: {len(scrape.content) / 1024:.1f} KiB, {scrape.text.count(chr(10))} Zeilen")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    micro(args.number)
+
+    with run_in_thread(create_mock_dhl_app()) as base_url:
+        os.environ.update({
+            "DHL_API_KEY": "mock",
+            "DHL_PRODUCTION_REST_API_URL": base_url,
+            "EKP": "3333333333",
+            "DHL_BILLING_NUMBER_NAT_PREFIX": "0101",
+            "IDEMPOTENCY_ENABLED": "false",
+            "LOG_LEVEL": "WARNING",
+        })
+        results = asyncio.run(end_to_end(build_request(args.orders), args.requests, args.rounds))
+
+    for mode, latencies in results.items():
+        print(f"metrics {mode:>3}: median {statistics.median(latencies):6.2f} ms, "
+              f"p99 {statistics.quantiles(latencies, n=100)[98]:6.2f} ms")
+    overhead = statistics.median(results["on"]) - statistics.median(results["off"])
+    print(f"Overhead: {overhead * 1000:+.0f} µs pro Request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Kosten der Probes: /livez, /readyz und / direkt über die ASGI Schnittstelle (ohne Netzwerk), dazu die Zahl der
+Upstream Requests, die dabei beim DHL Mock ankommen. Zum Vergleich der bisherige Weg von /: ein Live-Request an die
+DHL Sandbox je Aufruf.
+
+    python -m benchmarks.bench_probes --requests 2000 --dhl-latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks.mock_dhl import create_mock_dhl_app
+from benchmarks.mock_gls import create_mock_gls_app
+from benchmarks.mock_servers import run_in_thread
+
+
+class CountingApp:
+    # Zählt die beim Mock ankommenden Requests
+    def __init__(self, app):
+        self.app = app
+        self.requests = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.requests += 1
+        await self.app(scope, receive, send)
+
+
+async def call(app, path):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+             "headers": [(b"host", b"127.0.0.1:8000")], "client": ("127.0.0.1", 50000),
+             "server": ("127.0.0.1", 8000)}
+    status = None
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(app, path, requests):
+    start = time.perf_counter()
+    statuses = set()
+    for _ in range(requests):
+        statuses.add(await call(app, path))
+    return (time.perf_counter() - start) / requests * 1e6, statuses
+
+
+async def measure_live(dhl_url, requests):
+    # Bisheriges /: jeder Aufruf ein GET an die DHL Sandbox
+    async with httpx.AsyncClient(base_url=dhl_url) as client:
+        start = time.perf_counter()
+        for _ in range(requests):
+            (await client.get("", headers={"accept": "application/json", "dhl-api-key": "mock"})).raise_for_status()
+        return (time.perf_counter() - start) / requests * 1e6
+
+
+async def main_async(requests, dhl, live_requests):
+    import app
+    from utils.health import get_health_checker
+
+    checker = get_health_checker()
+    await checker.refresh()
+    print(f"{'Probe':<22}{'us/request':>12}{'Upstream Requests':>20}  Status")
+    before = dhl.requests
+    live = await measure_live(os.environ["DHL_SANDBOX_REST_API_URL"], live_requests)
+    print(f"{'/ bisher (live)':<22}{live:>12.1f}{dhl.requests - before:>20}  ({live_requests} Requests)")
+    for path in ("/livez", "/readyz", "/"):
+        await call(app.app, path)
+        before = dhl.requests
+        duration, statuses = await measure(app.app, path, requests)
+        print(f"{path:<22}{duration:>12.1f}{dhl.requests - before:>20}  {sorted(statuses)}")
+    await checker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--live-requests", type=int, default=50, help="Requests für den bisherigen Weg")
+    parser.add_argument("--dhl-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    dhl = CountingApp(create_mock_dhl_app(latency=args.dhl_latency))
+    with run_in_thread(dhl) as dhl_url, run_in_thread(create_mock_gls_app()) as gls_url:
+        os.environ.update({
+            "DHL_API_KEY": "mock",
+            "DHL_PRODUCTION_REST_API_URL": dhl_url,
+            "DHL_SANDBOX_REST_API_URL": dhl_url,
+            "GLS_SOAP_API_URL": gls_url + "ShipmentProcessingService?wsdl",
+            "GLS_AUTH": "bW9jazptb2Nr",
+            "LOG_FILE": os.devnull,
+            "TRAFFIC_CAPTURE_PATH": "",
+        })
+        asyncio.run(main_async(args.requests, dhl, args.live_requests))
+
+
+if __name__ == "__main__":
+    main()
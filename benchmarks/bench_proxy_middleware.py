@@ -0,0 +1,140 @@
+"""
+Overhead von ProxiedHeadersMiddleware: bisherige BaseHTTPMiddleware gegenüber der reinen ASGI Variante aus
+utils/proxy_middelware.py, direkt über die ASGI Schnittstelle (ohne Netzwerk). Dazu ein gestreamter Label-Download
+mit langsamem Store: wann kommt der erste Block beim Client an, und wie viele Blöcke werden einzeln durchgereicht.
+
+    python -m benchmarks.bench_proxy_middleware --requests 5000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from utils.label_store import CHUNK_SIZE, MemoryLabelStore, label_response
+from utils.proxy_middelware import ProxiedHeadersMiddleware
+
+FORWARDED_HEADERS = [
+    (b"host", b"127.0.0.1:8000"),
+    (b"x-forwarded-for", b"203.0.113.7"),
+    (b"x-forwarded-proto", b"https"),
+    (b"x-forwarded-host", b"proxy.example.com"),
+    (b"user-agent", b"bench"),
+    (b"accept", b"*/*"),
+]
+
+
+class BaseHttpProxiedHeadersMiddleware(BaseHTTPMiddleware):
+    # Die bisherige Implementierung, zum Vergleich
+    async def dispatch(self, request: Request, call_next):
+        headers = list(request.scope.get("headers", []))
+        headers_dict = {k.lower(): v for k, v in headers}
+        if b"x-forwarded-host" in headers_dict:
+            new_host = headers_dict[b"x-forwarded-host"]
+            request.scope["headers"] = [(k, new_host) if k == b"host" else (k, v) for k, v in headers]
+        if b"x-forwarded-proto" in headers_dict:
+            request.scope["scheme"] = headers_dict[b"x-forwarded-proto"].decode()
+        return await call_next(request)
+
+
+class SlowLabelStore(MemoryLabelStore):
+    # Simuliert Platte/Objektspeicher: jeder Block braucht etwas Zeit
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    async def read_range(self, filename, start, end):
+        async for chunk in super().read_range(filename, start, end):
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+
+def create_app(middleware, store):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping(request: Request):
+        return {"base_url": str(request.base_url)}
+
+    @app.get("/label/gls/{filename}")
+    async def download_label(filename: str, request: Request):
+        return await label_response(store, filename, request)
+
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+
+async def call(app, path, events=None):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+             "headers": list(FORWARDED_HEADERS), "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000)}
+    body = []
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+            if events is not None and message.get("body"):
+                events.append(time.perf_counter())
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def measure_overhead(app, requests):
+    await call(app, "/ping")
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call(app, "/ping")
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def measure_stream(app, size):
+    await call(app, "/label/gls/label_00000000-0000-0000-0000-000000000000.pdf")
+    events = []
+    start = time.perf_counter()
+    body = await call(app, "/label/gls/label_00000000-0000-0000-0000-000000000000.pdf", events)
+    assert len(body) == size
+    return (events[0] - start) * 1000, (events[-1] - start) * 1000, len(events)
+
+
+async def main_async(requests, label_kib, chunk_delay):
+    store = SlowLabelStore(chunk_delay)
+    label = b"%PDF" + b"0" * (label_kib * 1024 - 4)
+    await store.put("label_00000000-0000-0000-0000-000000000000.pdf", label)
+    variants = {
+        "ohne Middleware": None,
+        "BaseHTTPMiddleware": BaseHttpProxiedHeadersMiddleware,
+        "reines ASGI": ProxiedHeadersMiddleware,
+    }
+    print(f"{requests} Requests je Variante, Label {label_kib} KiB in Blöcken von {CHUNK_SIZE // 1024} KiB, "
+          f"{chunk_delay * 1000:.0f} ms je Block")
+    print(f"{'Variante':<20}{'us/request':>12}{'erster Block ms':>17}{'letzter Block ms':>18}{'Blöcke':>8}  base_url")
+    for name, middleware in variants.items():
+        app = create_app(middleware, store)
+        overhead = await measure_overhead(app, requests)
+        first, last, chunks = await measure_stream(app, len(label))
+        base_url = (await call(app, "/ping")).decode()
+        print(f"{name:<20}{overhead:>12.1f}{first:>17.1f}{last:>18.1f}{chunks:>8}  {base_url}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--label-kib", type=int, default=512)
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="Sekunden je Block")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.requests, args.label_kib, args.chunk_delay))
+
+
+if __name__ == "__main__":
+    main()
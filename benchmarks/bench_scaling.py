@@ -0,0 +1,129 @@
+"""
+Skalierung von serve.py über die Anzahl der Worker: für 1..N Worker wird der Proxy gestartet und im geschlossenen
+Modell (feste Zahl gleichzeitiger Clients, jeder sendet sofort den nächsten Request) gemessen. Die Mocks laufen in
+eigenen Prozessen mit geringer Latenz, damit der Proxy selbst - Parsing, Mapping, Label-Relayout - der Engpass ist.
+
+    python -m benchmarks.bench_scaling --max-workers 4 --concurrency 32 --duration 15
+    python -m benchmarks.bench_scaling --workers 1 2 4 8 --products EPN
+
+Ausgegeben werden Durchsatz, p50/p95 und der RSS aller Worker zusammen je Worker-Anzahl. Labels liegen in einem
+gemeinsamen Verzeichnis (LABEL_STORE=local), mit --idempotency teilen sich die Worker den SQLite Cache.
+Mehr Worker als Kerne bringen keinen Durchsatz; Mocks und Lastgenerator brauchen ebenfalls CPU.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from benchmarks.load_test import DEFAULT_SAMPLE, ROOT, build_requests, get_children, get_proxy_env, \
+    get_tree_rss_kib, percentile, wait_until_ready
+from benchmarks.mock_dhl import create_mock_dhl_app
+from benchmarks.mock_gls import create_mock_gls_app
+from benchmarks.mock_servers import get_free_port, run_in_process
+from serve import get_default_workers
+
+
+def start_serve(port, workers, env):
+    command = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_workers(pid, workers, timeout=60):
+    # /health antwortet schon, wenn der erste Worker bereit ist
+    deadline = time.monotonic() + timeout
+    while workers > 1 and len(get_children(pid)) < workers and time.monotonic() < deadline:
+        time.sleep(0.2)
+
+
+def unique_body(body):
+    # Eigene CustomerReference je Request, damit der Idempotenz-Cache nicht antwortet
+    return body.replace(b"<CustomerReference>", b"<CustomerReference>" + uuid.uuid4().hex[:12].encode(), 1)
+
+
+async def drive(url, bodies, concurrency, duration, warmup, timeout, unique):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        requests = itertools.cycle(bodies)
+        start = time.perf_counter()
+        measure_from, stop_at = start + warmup, start + warmup + duration
+
+        async def client_loop():
+            nonlocal errors
+            while True:
+                sent = time.perf_counter()
+                if sent >= stop_at:
+                    return
+                _, body = next(requests)
+                try:
+                    response = await client.post("production/soap", content=unique_body(body) if unique else body,
+                                                 headers={"Content-Type": "text/xml; charset=utf-8"})
+                    ok = response.status_code == 200 and b"<StatusCode>0</StatusCode>" in response.content
+                except httpx.HTTPError:
+                    ok = False
+                done = time.perf_counter()
+                if sent >= measure_from:
+                    latencies.append((done - sent) * 1000)
+                    errors += not ok
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return sorted(latencies), errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=get_default_workers())
+    parser.add_argument("--workers", type=int, nargs="*", help="Worker-Anzahlen (Standard: 1..--max-workers)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Gleichzeitige Clients")
+    parser.add_argument("--duration", type=float, default=15, help="Sekunden Messung je Worker-Anzahl")
+    parser.add_argument("--warmup", type=float, default=3, help="Sekunden Einlaufen (WSDL, Verbindungen)")
+    parser.add_argument("--products", default="EPN,GLS", help="Produktcodes, reihum (EPN, BPI, EPI, KLP, GLS)")
+    parser.add_argument("--samples", nargs="*", default=[str(DEFAULT_SAMPLE)])
+    parser.add_argument("--latency", type=float, default=0.005, help="Latenz der Mocks in Sekunden")
+    parser.add_argument("--idempotency", action="store_true", help="Gemeinsamen SQLite Idempotenz-Cache nutzen")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    worker_counts = args.workers or list(range(1, args.max_workers + 1))
+    bodies = build_requests(args.samples, args.products.split(","), 1)
+    print(f"{os.cpu_count()} CPU(s), {args.concurrency} Clients, {args.duration:g} s je Messung, "
+          f"Produkte {args.products}")
+    print(f"{'Worker':>6}{'req/s':>10}{'Faktor':>8}{'p50 ms':>9}{'p95 ms':>9}{'Fehler':>8}{'RSS MiB':>9}")
+    baseline = None
+    with run_in_process(create_mock_dhl_app, latency=args.latency) as dhl_url, \
+            run_in_process(create_mock_gls_app, latency=args.latency) as gls_url:
+        for workers in worker_counts:
+            with tempfile.TemporaryDirectory() as work_dir:
+                env = get_proxy_env(dhl_url, gls_url, work_dir)
+                env.update({"LABEL_STORE": "local", "GLS_LABELS_FOLDER": os.path.join(work_dir, "labels"),
+                            "TRAFFIC_CAPTURE_PATH": ""})
+                if args.idempotency:
+                    env.update({"IDEMPOTENCY_ENABLED": "true",
+                                "IDEMPOTENCY_DB_PATH": os.path.join(work_dir, "idempotency.sqlite")})
+                port = get_free_port()
+                url = f"http://127.0.0.1:{port}/"
+                process = start_serve(port, workers, env)
+                try:
+                    wait_until_ready(url, process)
+                    wait_for_workers(process.pid, workers)
+                    latencies, errors = asyncio.run(drive(url, bodies, args.concurrency, args.duration,
+                                                          args.warmup, args.timeout, args.idempotency))
+                    rss = get_tree_rss_kib(process.pid) / 1024
+                finally:
+                    process.terminate()
+                    process.wait(timeout=30)
+            throughput = len(latencies) / args.duration
+            baseline = baseline or throughput
+            print(f"{workers:>6}{throughput:>10.1f}{throughput / baseline:>8.2f}{percentile(latencies, 50):>9.1f}"
+                  f"{percentile(latencies, 95):>9.1f}{errors:>8}{rss:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
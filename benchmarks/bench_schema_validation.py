@@ -0,0 +1,170 @@
+"""
+Schema-Validierung (SOAP_VALIDATION): Kosten je Request und eingesparte Upstream Calls.
+
+1. Microbenchmark: parse_soap_request (bisher) gegenüber einem lxml Parse, aus dem derselbe Baum validiert und
+   gelesen wird, für den Sample Request mit --orders ShipmentOrder.
+2. Ein Korpus fehlerhafter Requests (aus dem Sample abgeleitet, DHL Produkt) geht über die ASGI Schnittstelle an die
+   App - einmal mit SOAP_VALIDATION=off, einmal mit reject. Gezählt werden die Requests, die beim DHL Mock ankommen.
+
+    python -m benchmarks.bench_schema_validation --orders 30 --iterations 500 --rounds 20 --dhl-latency 0.05
+
+Der Mock prüft die Requests nicht; die echte DHL API lehnt sie nach dem Round-Trip ab.
+"""
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+import time
+import timeit
+
+from benchmarks.bench_probes import CountingApp
+from benchmarks.load_test import DEFAULT_SAMPLE, build_requests, get_proxy_env
+from benchmarks.mock_dhl import create_mock_dhl_app
+from benchmarks.mock_gls import create_mock_gls_app
+from benchmarks.mock_servers import run_in_thread
+from utils.soap_request import parse_soap_request
+from utils.soap_validation import SoapValidator
+
+
+def remove(pattern):
+    return lambda body: re.sub(pattern, b"", body, count=1, flags=re.S)
+
+
+def replace(old, new):
+    return lambda body: body.replace(old, new, 1)
+
+
+# Name -> Veränderung des gültigen Requests
+MUTATIONS = {
+    "ohne ShipmentDetails": remove(rb"<ShipmentDetails>.*?</ShipmentDetails>"),
+    "ohne Shipper": remove(rb"<Shipper>.*?</Shipper>"),
+    "ohne Receiver Address": lambda body: re.sub(rb"(<Receiver>.*?)<Address>.*?</Address>", rb"\1", body,
+                                                 count=1, flags=re.S),
+    "ohne ProductCode": remove(rb"<ProductCode>[^<]*</ProductCode>"),
+    "WeightInKG kein Dezimalwert": replace(b"<WeightInKG>10.5</WeightInKG>", b"<WeightInKG>zehn</WeightInKG>"),
+    "PLZ vierstellig": replace(b"<ns1:germany>14471</ns1:germany>", b"<ns1:germany>1447</ns1:germany>"),
+    "LabelResponseType PDF": replace(b"<LabelResponseType>URL</LabelResponseType>",
+                                     b"<LabelResponseType>PDF</LabelResponseType>"),
+    "unbekanntes Element": replace(b"<SequenceNumber>1</SequenceNumber>",
+                                   b"<SequenceNumber>1</SequenceNumber><Priority>high</Priority>"),
+    "ohne Version": remove(rb"<ns1:Version>.*?</ns1:Version>"),
+}
+
+
+def build_request(orders):
+    (_, body), = build_requests([str(DEFAULT_SAMPLE)], ["EPN"], orders)
+    return body
+
+
+def measure_parsing(validator, orders, iterations):
+    data = build_request(orders)
+
+    def parse_and_validate(body):
+        soap_request, document = validator.parse(body)
+        validator.validate(document, soap_request)
+
+    candidates = {
+        "parse_soap_request": parse_soap_request,
+        "lxml Parse": validator.parse,
+        "lxml + Validierung": parse_and_validate,
+    }
+    print(f"{len(data)} bytes, {orders} ShipmentOrder")
+    print(f"{'':<20}{'us/request':>12}")
+    for name, func in candidates.items():
+        seconds = min(timeit.repeat(lambda: func(data), number=iterations, repeat=3)) / iterations
+        print(f"{name:<20}{seconds * 1e6:>12.1f}")
+
+
+async def post(app, path, body):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+             "headers": [(b"host", b"127.0.0.1:8000"), (b"content-type", b"text/xml; charset=utf-8"),
+                         (b"content-length", str(len(body)).encode())],
+             "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000)}
+    status = None
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # ServerErrorMiddleware hat die 500 schon gesendet und gibt die Exception weiter (KeyError, ValueError, ...)
+        pass
+    return status
+
+
+async def run_corpus(corpus, dhl, mode, rounds):
+    # Je Modus ein eigener Lifespan, damit das Schema (nicht) kompiliert wird
+    import app
+
+    os.environ["SOAP_VALIDATION"] = mode
+    results = {}
+    async with app.app.router.lifespan_context(app.app):
+        # Einmal vorab, damit Carrier-Start und Verbindungsaufbau nicht in die Messung fallen
+        await post(app.app, "/production/soap", corpus["gültig"])
+        for name, body in corpus.items():
+            before = dhl.requests
+            start = time.perf_counter()
+            statuses = {await post(app.app, "/production/soap", body) for _ in range(rounds)}
+            results[name] = ("/".join(map(str, sorted(statuses))), dhl.requests - before,
+                             (time.perf_counter() - start) / rounds * 1000)
+    return results
+
+
+def report_corpus(off, reject, rounds):
+    print(f"{'Request':<30}{'Status off/reject':>19}{'Upstream off/reject':>21}{'ms off/reject':>17}")
+    for name in off:
+        (status_off, calls_off, ms_off), (status_reject, calls_reject, ms_reject) = off[name], reject[name]
+        print(f"{name:<30}{f'{status_off} / {status_reject}':>19}{f'{calls_off} / {calls_reject}':>21}"
+              f"{f'{ms_off:.1f} / {ms_reject:.1f}':>17}")
+    bad = [name for name in off if name != "gültig"]
+    saved = sum(off[name][1] - reject[name][1] for name in bad)
+    print(f"{len(bad)} fehlerhafte Requests x {rounds}: {saved} Upstream Calls eingespart, "
+          f"{sum(off[name][2] for name in bad) / len(bad):.1f} ms gegenüber "
+          f"{sum(reject[name][2] for name in bad) / len(bad):.1f} ms je Request")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=30)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20, help="Durchläufe des Korpus je Modus")
+    parser.add_argument("--dhl-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    validator = SoapValidator()
+    print(f"Schema kompiliert in {(time.perf_counter() - start) * 1000:.1f} ms")
+    measure_parsing(validator, args.orders, args.iterations)
+    print()
+
+    valid = build_request(1)
+    corpus = {"gültig": valid}
+    for name, mutate in MUTATIONS.items():
+        corpus[name] = mutate(valid)
+        assert corpus[name] != valid, name
+
+    dhl = CountingApp(create_mock_dhl_app(latency=args.dhl_latency))
+    with tempfile.TemporaryDirectory() as work_dir, run_in_thread(dhl) as dhl_url, \
+            run_in_thread(create_mock_gls_app()) as gls_url:
+        os.environ.update(get_proxy_env(dhl_url, gls_url, work_dir))
+        os.environ.update({"LOG_FILE": os.devnull, "TRAFFIC_CAPTURE_PATH": "", "HEALTH_CHECKS_ENABLED": "false"})
+        off = asyncio.run(run_corpus(corpus, dhl, "off", args.rounds))
+        reject = asyncio.run(run_corpus(corpus, dhl, "reject", args.rounds))
+    report_corpus(off, reject, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Microbenchmark: xmltodict.parse (bisheriger Parser) gegenüber utils.soap_request.parse_soap_request
+auf samples/soap-request-gls-ok-2.xml, hochskaliert auf mehrere ShipmentOrder.
+
+    python -m benchmarks.bench_soap_parser --orders 30 --iterations 500
+
+Benötigt xmltodict nur für den Vergleich (pip install xmltodict).
+"""
+import argparse
+import re
+import timeit
+import tracemalloc
+from pathlib import Path
+
+import xmltodict
+
+from utils.soap_request import parse_soap_request
+
+SAMPLE_REQUEST = Path(__file__).resolve().parent.parent / "samples" / "soap-request-gls-ok-2.xml"
+
+
+def build_request(orders):
+    sample = SAMPLE_REQUEST.read_bytes()
+    order = re.search(rb"<ShipmentOrder>.*</ShipmentOrder>", sample, re.S).group(0)
+    batch = b"".join(order.replace(b"<SequenceNumber>1</SequenceNumber>", b"<SequenceNumber>%d</SequenceNumber>" % n)
+                     for n in range(1, orders + 1))
+    return sample.replace(order, batch)
+
+
+def peak_memory(func, data):
+    tracemalloc.start()
+    func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=30)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    data = build_request(args.orders)
+    assert len(parse_soap_request(data).orders) == args.orders
+
+    candidates = {
+        "xmltodict": lambda body: xmltodict.parse(body, encoding="utf-8"),
+        "soap_request": parse_soap_request,
+    }
+    print(f"{len(data)} bytes, {args.orders} ShipmentOrder")
+    print(f"{'parser':<14}{'us/request':>12}{'peak KiB':>10}")
+    for name, func in candidates.items():
+        seconds = min(timeit.repeat(lambda: func(data), number=args.iterations, repeat=3)) / args.iterations
+        print(f"{name:<14}{seconds * 1e6:>12.1f}{peak_memory(func, data) / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
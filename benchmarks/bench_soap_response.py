@@ -0,0 +1,102 @@
+"""
+Vergleicht die vorberechneten Antwort-Templates aus utils.soap_response mit den Buildern des Baseline-Commits
+(benchmarks/baseline_soap_response.py, unverändert): prüft byte-identische Ausgabe für dieselben DHL REST bzw. GLS
+Antworten und misst die Zeit pro Antwort - Baseline: dhl_rest_to_soap_data mit ElementTree, jetzt:
+dhl_rest_to_soap_data plus build_create_shipment_response.
+
+    python -m benchmarks.bench_soap_response --iterations 5000
+
+Die Baseline kennt nur eine Sendung je Antwort; Batches werden daher nur mit den Templates gemessen.
+"""
+import argparse
+import contextlib
+import io
+import timeit
+from types import SimpleNamespace
+
+from benchmarks import baseline_soap_response as baseline
+from carriers.dhl import dhl_rest_to_soap_data
+from carriers.gls import gls_soap_to_soap_data
+from utils.soap_response import build_create_shipment_response
+
+LABEL_URL = "https://api-eu.dhl.com/parcel/de/shipping/v2/labels?token=a&b=<c>"
+
+
+def get_dhl_cases():
+    # Name -> (HTTP Status, DHL REST Antwort)
+    return {
+        "ok": (200, {"status": {"title": "OK"}, "items": [
+            {"shipmentNo": "00340434161094042557", "sstatus": {"title": "OK", "statusCode": 200},
+             "label": {"url": LABEL_URL}}]}),
+        "ok mit Hinweisen": (200, {"status": {"title": "OK"}, "items": [
+            {"shipmentNo": "00340434161094042558", "label": {"url": LABEL_URL},
+             "validationMessages": [
+                 {"validationMessage": "Die Hausnummer fehlt & wurde ergänzt.", "validationState": "Warning"},
+                 {"validationMessage": "Straße > 35 Zeichen", "validationState": "Warning"}]}]}),
+        "Validierungsfehler": (400, {"status": {"title": "Bad Request"}, "items": [
+            {"sstatus": {"title": "Bad Request", "statusCode": 400},
+             "validationMessages": [
+                 {"validationMessage": "Ungültige PLZ", "validationState": "Error"},
+                 {"validationMessage": "Gewicht gerundet", "validationState": "Warning"}]}]}),
+        "login failed": (401, {"title": "Unauthorized", "detail": "Unauthorized for given resource."}),
+    }
+
+
+def get_gls_response():
+    return SimpleNamespace(ParcelData=[SimpleNamespace(TrackID="ZXYMOCK1")],
+                           LabelURL="https://proxy.local/label/gls/label_1.pdf")
+
+
+def build_dhl(status_code, rest_data):
+    return build_create_shipment_response(*dhl_rest_to_soap_data(status_code, rest_data, ["1"]))
+
+
+def build_gls(gls_response):
+    return build_create_shipment_response("0", "ok", [gls_soap_to_soap_data(gls_response, "1")])
+
+
+def build_baseline_gls(gls_response):
+    # Die Baseline gibt die GLS Antwort per print aus - nicht in die Messung schreiben
+    with contextlib.redirect_stdout(io.StringIO()):
+        return baseline.gls_soap_to_soap_data(gls_response)
+
+
+def expected_gls(baseline_response):
+    # Einzige gewollte Abweichung: die Baseline setzte den StatusCode als int 0, ElementTree schrieb <StatusCode />
+    return baseline_response.replace(b"<StatusCode />", b"<StatusCode>0</StatusCode>")
+
+
+def measure(func, iterations):
+    return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    dhl_cases = get_dhl_cases()
+    for name, case in dhl_cases.items():
+        assert build_dhl(*case) == baseline.dhl_rest_to_soap_data(*case), name
+    gls_response = get_gls_response()
+    assert build_gls(gls_response) == expected_gls(build_baseline_gls(gls_response))
+    print("Output is byte-identical to the baseline builders (GLS: StatusCode 0 instead of empty)")
+
+    print(f"{'case':<22}{'baseline us':>13}{'template us':>13}")
+    for name, case in dhl_cases.items():
+        print(f"{name:<22}{measure(lambda: baseline.dhl_rest_to_soap_data(*case), args.iterations):>13.1f}"
+              f"{measure(lambda: build_dhl(*case), args.iterations):>13.1f}")
+    print(f"{'GLS':<22}{measure(lambda: build_baseline_gls(gls_response), args.iterations):>13.1f}"
+          f"{measure(lambda: build_gls(gls_response), args.iterations):>13.1f}")
+
+    status, rest_data = dhl_cases["ok"]
+    batch = {"status": rest_data["status"], "items": rest_data["items"] * 30}
+    sequence_numbers = [str(index) for index in range(1, 31)]
+    template_us = measure(
+        lambda: build_create_shipment_response(*dhl_rest_to_soap_data(status, batch, sequence_numbers)),
+        args.iterations)
+    print(f"{'30 Sendungen':<22}{'-':>13}{template_us:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
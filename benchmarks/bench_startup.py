@@ -0,0 +1,125 @@
+"""
+Kaltstart: Importzeit (python -X importtime) von app und der Carrier-Module, danach Zeit bis /health antwortet und
+Latenz der ersten Requests je Carrier - ohne und mit STARTUP_WARMUP, gegen die lokalen Mocks.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 5 --top 15
+
+Die Importzeit eines Carriers ist inkrementell (nach import app) - genau das zahlt ohne Warm-up der erste Request.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_test import DEFAULT_SAMPLE, ROOT, build_requests, get_proxy_env, start_proxy
+from benchmarks.mock_dhl import create_mock_dhl_app
+from benchmarks.mock_gls import create_mock_gls_app
+from benchmarks.mock_servers import get_free_port, run_in_thread
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def measure_imports(statement, env):
+    # Liefert {Modul: (self µs, kumuliert µs)} für einen frischen Interpreter
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def report_imports(repeat, top, env):
+    print(f"Importzeit (Median aus {repeat}, kumuliert):")
+    targets = {"app": "import app", "carriers.dhl": "import app; import carriers.dhl",
+               "carriers.gls": "import app; import carriers.gls"}
+    heaviest = None
+    for module, statement in targets.items():
+        runs = [measure_imports(statement, env) for _ in range(repeat)]
+        print(f"  {module:<14}{statistics.median(run[module][1] for run in runs) / 1000:>8.1f} ms")
+        if module == "carriers.gls":
+            heaviest = runs[0]
+    if top and heaviest:
+        print(f"Teuerste Module (selbst, import app + carriers.gls):")
+        for name, (self_us, _) in sorted(heaviest.items(), key=lambda item: -item[1][0])[:top]:
+            print(f"  {name:<40}{self_us / 1000:>8.1f} ms")
+
+
+def post(client, body):
+    start = time.perf_counter()
+    response = client.post("production/soap", content=body, headers={"Content-Type": "text/xml; charset=utf-8"})
+    ok = response.status_code == 200 and b"<StatusCode>0</StatusCode>" in response.content
+    return (time.perf_counter() - start) * 1000, ok
+
+
+def measure_first_requests(env, bodies, timeout=60):
+    port = get_free_port()
+    url = f"http://127.0.0.1:{port}/"
+    start = time.perf_counter()
+    process = start_proxy(port, 1, env)
+    try:
+        with httpx.Client(base_url=url, timeout=30) as client:
+            deadline = time.monotonic() + timeout
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Proxy exited with code {process.returncode}")
+                try:
+                    if client.get("health", timeout=1).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("Proxy did not become ready")
+                    time.sleep(0.02)
+            ready = (time.perf_counter() - start) * 1000
+            results = [(f"{product} {label}", *post(client, body))
+                       for product, body in bodies for label in ("1.", "2.")]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return ready, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="So viele teuerste Module ausgeben (0 = keine)")
+    parser.add_argument("--products", default="EPN,GLS")
+    args = parser.parse_args()
+
+    env = dict(os.environ, LOG_FILE=os.devnull)
+    report_imports(args.repeat, args.top, env)
+
+    bodies = build_requests([str(DEFAULT_SAMPLE)], args.products.split(","), 1)
+    variants = {
+        "lazy": {"STARTUP_WARMUP": "false"},
+        "warm-up": {"STARTUP_WARMUP": "true"},
+        "nur DHL": {"STARTUP_WARMUP": "true", "ENABLED_CARRIERS": "DHL"},
+    }
+    print()
+    print(f"{'Variante':<10}{'bereit ms':>11}  " + "".join(f"{f'{product} 1./2. ms':>18}" for product, _ in bodies))
+    with tempfile.TemporaryDirectory() as work_dir, \
+            run_in_thread(create_mock_dhl_app(latency=0.02)) as dhl_url, \
+            run_in_thread(create_mock_gls_app(latency=0.02)) as gls_url:
+        for name, settings in variants.items():
+            proxy_env = get_proxy_env(dhl_url, gls_url, work_dir)
+            proxy_env.update(settings, TRAFFIC_CAPTURE_PATH="")
+            ready, results = measure_first_requests(proxy_env, bodies)
+            cells = []
+            for index in range(0, len(results), 2):
+                (_, first, first_ok), (_, second, second_ok) = results[index:index + 2]
+                cell = f"{first:.0f} / {second:.0f}" if first_ok and second_ok else "Fehler"
+                cells.append(f"{cell:>18}")
+            print(f"{name:<10}{ready:>11.0f}  " + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
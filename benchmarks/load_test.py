@@ -0,0 +1,283 @@
+"""
+Lastgenerator gegen /production/soap mit lokalen Mocks für DHL (REST) und GLS (SOAP) - ohne Netzwerkzugriff.
+
+    python -m benchmarks.load_test --rps 50 --duration 30 --workers 2 --products EPN,GLS
+    python -m benchmarks.load_test --rps 20 --dhl-latency 0.2 --dhl-error-rate 0.05 --dhl-unauthorized-rate 0.01
+    python -m benchmarks.load_test --rps 20 --products EPN --dhl-auth oauth
+    python -m benchmarks.load_test --url http://127.0.0.1:8000/ --rps 10   # bereits laufender Proxy, ohne Mocks
+
+Die Requests werden im offenen Modell mit fester Rate verschickt; die Latenz zählt ab dem geplanten Sendezeitpunkt,
+damit ein überlasteter Proxy nicht durch ausbleibende Requests geschönt wird. Ausgegeben werden Durchsatz,
+p50/p95/p99, Status-Verteilung und der Speicher (RSS) je uvicorn Worker inkl. seiner Hilfsprozesse.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from benchmarks.mock_dhl import create_mock_dhl_app
+from benchmarks.mock_gls import create_mock_gls_app
+from benchmarks.mock_servers import get_free_port, run_in_thread
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SAMPLE = ROOT / "samples" / "soap-request-gls-ok-2.xml"
+_STATUS_CODE_PATTERN = re.compile(rb"<StatusCode>([^<]*)</StatusCode>")
+
+
+def build_requests(sample_paths, products, orders):
+    # Je Sample und Produktcode ein Request mit `orders` ShipmentOrder - reihum verschickt
+    bodies = []
+    for sample_path in sample_paths:
+        sample = Path(sample_path).read_bytes()
+        order = re.search(rb"<ShipmentOrder>.*</ShipmentOrder>", sample, re.S).group(0)
+        for product in products:
+            product_order = re.sub(rb"<ProductCode>[^<]*</ProductCode>",
+                                   b"<ProductCode>" + product.encode() + b"</ProductCode>", order)
+            batch = b"".join(re.sub(rb"<SequenceNumber>[^<]*</SequenceNumber>",
+                                    b"<SequenceNumber>%d</SequenceNumber>" % index, product_order)
+                             for index in range(1, orders + 1))
+            bodies.append((product, sample.replace(order, batch)))
+    return bodies
+
+
+def read_rss_kib(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def read_cmdline(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read()
+    except OSError:
+        return b""
+
+
+def get_children(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Feld 4 ist die Parent-PID; der Prozessname (Feld 2) kann Leerzeichen enthalten
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            children.append(int(entry))
+    return children
+
+
+def get_tree_rss_kib(pid):
+    return read_rss_kib(pid) + sum(get_tree_rss_kib(child) for child in get_children(pid))
+
+
+class MemorySampler:
+    # Tastet regelmäßig den RSS der Worker ab und merkt sich die Spitzenwerte. Mit --workers sind die Worker
+    # Kinder des uvicorn Master-Prozesses, sonst läuft die App direkt im gestarteten Prozess.
+    def __init__(self, pid, multiple_workers, interval=0.5):
+        self.pid = pid
+        self.multiple_workers = multiple_workers
+        self.interval = interval
+        self.peak = {}
+        self.last = {}
+
+    def get_workers(self):
+        if not self.multiple_workers:
+            return [self.pid]
+        # Der resource_tracker von multiprocessing ist ebenfalls ein Kind des Masters, aber kein Worker
+        return [pid for pid in get_children(self.pid) if b"resource_tracker" not in read_cmdline(pid)]
+
+    def sample(self):
+        for pid in self.get_workers():
+            rss, tree_rss = read_rss_kib(pid), get_tree_rss_kib(pid)
+            if not rss:
+                continue
+            self.last[pid] = (rss, tree_rss)
+            peak = self.peak.get(pid, (0, 0))
+            self.peak[pid] = (max(peak[0], rss), max(peak[1], tree_rss))
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+async def drive(url, bodies, rps, duration, timeout, sampler=None):
+    results = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        async def send(product, body, scheduled):
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                response = await client.post("production/soap", content=body,
+                                             headers={"Content-Type": "text/xml; charset=utf-8"})
+                match = _STATUS_CODE_PATTERN.search(response.content)
+                outcome = f"http {response.status_code}" + (f" / soap {match.group(1).decode()}" if match else "")
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            results.append((product, outcome, (time.perf_counter() - scheduled) * 1000))
+
+        sampler_task = asyncio.create_task(sampler.run()) if sampler else None
+        start = time.perf_counter()
+        total = int(rps * duration)
+        requests = itertools.cycle(bodies)
+        tasks = []
+        for index in range(total):
+            product, body = next(requests)
+            tasks.append(asyncio.create_task(send(product, body, start + index / rps)))
+            # Tasks nicht alle vorab anlegen - sonst misst der erste Sleep den Scheduler statt des Proxys
+            if index % 100 == 99:
+                await asyncio.sleep(max(0.0, start + (index - 50) / rps - time.perf_counter()))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        if sampler_task:
+            sampler_task.cancel()
+    return results, elapsed
+
+
+def percentile(values, q):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def report(results, elapsed, rps, sampler=None):
+    latencies = sorted(latency for _, _, latency in results)
+    ok = [latency for _, outcome, latency in results if outcome == "http 200 / soap 0"]
+    print(f"Requests:   {len(results)} in {elapsed:.1f} s (Ziel {rps:g}/s)")
+    print(f"Durchsatz:  {len(results) / elapsed:.1f} req/s gesamt, {len(ok) / elapsed:.1f} req/s erfolgreich")
+    print(f"Latenz:     p50 {percentile(latencies, 50):.1f} ms, p95 {percentile(latencies, 95):.1f} ms, "
+          f"p99 {percentile(latencies, 99):.1f} ms, max {latencies[-1]:.1f} ms")
+    print("Ergebnisse:")
+    for (product, outcome), count in sorted(Counter((product, outcome) for product, outcome, _ in results).items()):
+        print(f"  {product:>4} {outcome:<24} {count}")
+    if sampler and sampler.peak:
+        print("Speicher je Worker (RSS, Spitze / Ende; inkl. Hilfsprozesse wie Label-Pool):")
+        for pid, (peak_rss, peak_tree) in sorted(sampler.peak.items()):
+            last_rss, last_tree = sampler.last[pid]
+            print(f"  pid {pid}: {peak_rss / 1024:.1f} / {last_rss / 1024:.1f} MiB, "
+                  f"mit Hilfsprozessen {peak_tree / 1024:.1f} / {last_tree / 1024:.1f} MiB")
+
+
+def get_proxy_env(dhl_url, gls_url, work_dir, dhl_auth="basic"):
+    # Umgebung des Proxys gegen die lokalen Mocks
+    env = dict(os.environ)
+    env.update({
+        "DHL_API_KEY": "mock",
+        "DHL_PRODUCTION_REST_API_URL": dhl_url,
+        "DHL_SANDBOX_REST_API_URL": dhl_url,
+        "DHL_HTTP2": "false",
+        "DHL_AUTH_MODE": dhl_auth,
+        "DHL_API_SECRET": "mock",
+        "DHL_PRODUCTION_TOKEN_URL": dhl_url + "token",
+        "DHL_SANDBOX_TOKEN_URL": dhl_url + "token",
+        "EKP": "3333333333",
+        "DHL_BILLING_NUMBER_NAT_PREFIX": "0101",
+        "DHL_BILLING_NUMBER_INTL_PREFIX": "5301",
+        "DHL_BILLING_NUMBER_KLP_PREFIX": "6201",
+        "GKP_USER": "mock-user",
+        "GKP_PASSWORD": "mock-password",
+        "GLS_SOAP_API_URL": gls_url + "ShipmentProcessingService?wsdl",
+        "GLS_AUTH": "bW9jazptb2Nr",
+        "GLS_CLIENT_ID": "mock-client",
+        "LABEL_STORE": "memory",
+        "LEDGER_DB_PATH": os.path.join(work_dir, "shipments.sqlite"),
+        # Gleiche Requests würden sonst aus dem Idempotenz-Cache beantwortet
+        "IDEMPOTENCY_ENABLED": "false",
+        "LOG_FILE": os.path.join(work_dir, "proxy.log"),
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+    })
+    return env
+
+
+def start_proxy(port, workers, env):
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning", "--no-proxy-headers"]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+
+def wait_until_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Proxy exited with code {process.returncode}")
+        try:
+            if httpx.get(url + "health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Proxy did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=20, help="Sekunden")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--samples", nargs="*", default=[str(DEFAULT_SAMPLE)])
+    parser.add_argument("--products", default="EPN,GLS", help="Produktcodes, reihum (EPN, BPI, EPI, KLP, GLS)")
+    parser.add_argument("--orders", type=int, default=1, help="ShipmentOrder je Request")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--url", help="Bereits laufender Proxy - es werden keine Mocks gestartet")
+    parser.add_argument("--dhl-latency", type=float, default=0.05)
+    parser.add_argument("--dhl-jitter", type=float, default=0.02)
+    parser.add_argument("--dhl-error-rate", type=float, default=0.0)
+    parser.add_argument("--dhl-unauthorized-rate", type=float, default=0.0)
+    parser.add_argument("--dhl-auth", choices=("basic", "oauth"), default="basic")
+    parser.add_argument("--gls-latency", type=float, default=0.1)
+    parser.add_argument("--gls-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    bodies = build_requests(args.samples, args.products.split(","), args.orders)
+
+    if args.url:
+        results, elapsed = asyncio.run(drive(args.url, bodies, args.rps, args.duration, args.timeout))
+        report(results, elapsed, args.rps)
+        return
+
+    dhl_app = create_mock_dhl_app(latency=args.dhl_latency, jitter=args.dhl_jitter, error_rate=args.dhl_error_rate,
+                                  unauthorized_rate=args.dhl_unauthorized_rate, seed=args.seed)
+    gls_app = create_mock_gls_app(latency=args.gls_latency, error_rate=args.gls_error_rate, seed=args.seed)
+    with tempfile.TemporaryDirectory() as work_dir, \
+            run_in_thread(dhl_app) as dhl_url, run_in_thread(gls_app) as gls_url:
+        env = get_proxy_env(dhl_url, gls_url, work_dir, dhl_auth=args.dhl_auth)
+        port = get_free_port()
+        url = f"http://127.0.0.1:{port}/"
+        process = start_proxy(port, args.workers, env)
+        try:
+            wait_until_ready(url, process)
+            sampler = MemorySampler(process.pid, args.workers > 1)
+            results, elapsed = asyncio.run(drive(url, bodies, args.rps, args.duration, args.timeout, sampler))
+            sampler.sample()
+            report(results, elapsed, args.rps, sampler)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
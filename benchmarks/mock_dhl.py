@@ -0,0 +1,147 @@
+import base64
+import asyncio
+import itertools
+import random
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Zugangsdaten mit diesem Benutzer werden immer mit 401 abgelehnt
+INVALID_USER = "invalid-user"
+
+
+def create_mock_dhl_app(latency=0.0, jitter=0.0, error_rate=0.0, unauthorized_rate=0.0, seed=None, token_ttl=1800):
+    # Mock des DHL Parcel DE Shipping v2 /orders Endpoints und des OAuth2 Token Endpoints (/token, Password Grant).
+    # latency/jitter in Sekunden, error_rate: Anteil 500er, unauthorized_rate: Anteil 401er
+    app = FastAPI()
+    rng = random.Random(seed)
+    shipment_numbers = itertools.count(1)
+    app.state.tokens = set()
+    app.state.token_requests = 0
+    app.state.shipments = set()
+    app.state.manifested = set()
+    app.state.calls = []
+
+    @app.post("/token")
+    async def token(request: Request):
+        form = {key: values[0] for key, values in parse_qs((await request.body()).decode("utf-8")).items()}
+        app.state.token_requests += 1
+        if form.get("grant_type") != "password" or form.get("username") in (None, INVALID_USER):
+            return JSONResponse({"error": "invalid_grant", "error_description": "Invalid username or password"},
+                                status_code=401)
+        access_token = f"mock-{form['username']}-{app.state.token_requests}"
+        app.state.tokens.add(access_token)
+        return {"access_token": access_token, "token_type": "Bearer", "expires_in": token_ttl}
+
+    @app.get("/")
+    async def api_info():
+        return {"amp": {"name": "mock-dhl", "version": "v2.1.8"}}
+
+    @app.post("/orders")
+    async def create_orders(request: Request):
+        payload = await request.json()
+        delay = latency + (rng.uniform(-jitter, jitter) if jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        unauthorized = unauthorized_rate and rng.random() < unauthorized_rate
+        if request_is_unauthorized(request, app.state.tokens) or unauthorized:
+            return JSONResponse({"title": "Unauthorized", "status": 401,
+                                 "detail": "Unauthorized for given resource."}, status_code=401)
+        if error_rate and rng.random() < error_rate:
+            return JSONResponse({"title": "Internal Server Error", "status": 500,
+                                 "detail": "Mock: upstream failure"}, status_code=500)
+
+        include_docs = request.query_params.get("includeDocs", "URL")
+        items = []
+        for shipment in payload.get("shipments", []):
+            shipment_no = f"00340434{next(shipment_numbers):010d}"
+            app.state.shipments.add(shipment_no)
+            if include_docs == "include":
+                label = {"b64": base64.b64encode(f"%PDF-mock {shipment_no}".encode()).decode(), "fileFormat": "PDF"}
+            else:
+                label = {"url": f"https://mock.dhl.local/labels/{shipment_no}.pdf", "fileFormat": "PDF"}
+            items.append({
+                "shipmentNo": shipment_no,
+                "sstatus": {"title": "OK", "statusCode": 200},
+                "label": label,
+            })
+        return {"status": {"title": "OK", "statusCode": 200}, "items": items}
+
+    def shipment_items(numbers, handle):
+        # Ein Item je Nummer; unbekannte Nummern mit 400 wie bei DHL, Gesamtstatus 207 bei gemischtem Ergebnis
+        items = []
+        for shipment_no in numbers:
+            if shipment_no in app.state.shipments:
+                items.append({"shipmentNo": shipment_no, "sstatus": {"title": "OK", "statusCode": 200},
+                              **handle(shipment_no)})
+            else:
+                items.append({"shipmentNo": shipment_no, "sstatus": {"title": "Unknown shipment number.",
+                                                                     "statusCode": 400}})
+        failed = sum(item["sstatus"]["statusCode"] != 200 for item in items)
+        status_code = 200 if not failed else 400 if failed == len(items) else 207
+        title = {200: "OK", 207: "Multi-status", 400: "Bad Request"}[status_code]
+        return JSONResponse({"status": {"title": title, "statusCode": status_code}, "items": items},
+                            status_code=status_code)
+
+    def document(shipment_no, include_docs, kind):
+        if include_docs == "include":
+            return {"b64": base64.b64encode(f"%PDF-mock {kind} {shipment_no}".encode()).decode(), "fileFormat": "PDF"}
+        return {"url": f"https://mock.dhl.local/{kind}/{shipment_no}.pdf", "fileFormat": "PDF"}
+
+    @app.get("/orders")
+    async def get_orders(request: Request):
+        if request_is_unauthorized(request, app.state.tokens):
+            return JSONResponse({"title": "Unauthorized", "status": 401}, status_code=401)
+        numbers = request.query_params.getlist("shipment")
+        app.state.calls.append(("GET /orders", numbers))
+        include_docs = request.query_params.get("includeDocs", "URL")
+        return shipment_items(numbers, lambda shipment_no: {
+            "label": document(shipment_no, include_docs, "labels"),
+            "customsDoc": document(shipment_no, include_docs, "customs"),
+        })
+
+    @app.delete("/orders")
+    async def delete_orders(request: Request):
+        if request_is_unauthorized(request, app.state.tokens):
+            return JSONResponse({"title": "Unauthorized", "status": 401}, status_code=401)
+        numbers = request.query_params.getlist("shipment")
+        app.state.calls.append(("DELETE /orders", numbers))
+        response = shipment_items(numbers, lambda shipment_no: {})
+        app.state.shipments.difference_update(numbers)
+        return response
+
+    @app.post("/manifests")
+    async def create_manifest(request: Request):
+        if request_is_unauthorized(request, app.state.tokens):
+            return JSONResponse({"title": "Unauthorized", "status": 401}, status_code=401)
+        numbers = (await request.json()).get("shipmentNumbers") or []
+        app.state.calls.append(("POST /manifests", numbers))
+        app.state.manifested.update(number for number in numbers if number in app.state.shipments)
+        return shipment_items(numbers, lambda shipment_no: {})
+
+    @app.get("/manifests")
+    async def get_manifest(request: Request):
+        if request_is_unauthorized(request, app.state.tokens):
+            return JSONResponse({"title": "Unauthorized", "status": 401}, status_code=401)
+        manifest_date = request.query_params.get("date")
+        app.state.calls.append(("GET /manifests", manifest_date))
+        return {"status": {"title": "OK", "statusCode": 200}, "manifestDate": manifest_date,
+                "manifest": {"b64": base64.b64encode(f"%PDF-mock manifest {manifest_date}".encode()).decode(),
+                             "fileFormat": "PDF"}}
+
+    return app
+
+
+def request_is_unauthorized(request: Request, tokens=()):
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:] not in tokens
+    if not authorization.lower().startswith("basic "):
+        return False
+    try:
+        username = base64.b64decode(authorization[6:]).decode("utf-8").split(":", 1)[0]
+    except ValueError:
+        return True
+    return username == INVALID_USER
@@ -0,0 +1,188 @@
+import base64
+import asyncio
+import itertools
+import random
+import re
+
+from fastapi import FastAPI, Request, Response
+
+from benchmarks.synthetic_labels import make_gls_label_pdf
+
+TYPES_NAMESPACE = "http://fpcs.gls-group.eu/v1/ShipmentProcessing/types"
+COMMON_NAMESPACE = "http://fpcs.gls-group.eu/v1/Common"
+SERVICE_NAMESPACE = "http://fpcs.gls-group.eu/v1/ShipmentProcessing"
+
+# Ausschnitt der GLS ShipIT WSDL mit den Typen, die carriers/gls.py verwendet. Die Reihenfolge der Schemas
+# ist wichtig: zeep vergibt ns0 für die ShipmentProcessing Typen und ns1 für Common - wie beim echten Service.
+WSDL_TEMPLATE = f"""<?xml version="1.0" encoding="UTF-8"?>
+<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns:tns="{SERVICE_NAMESPACE}" xmlns:sp="{TYPES_NAMESPACE}"
+    targetNamespace="{SERVICE_NAMESPACE}">
+  <wsdl:types>
+    <xs:schema targetNamespace="{TYPES_NAMESPACE}" xmlns:common="{COMMON_NAMESPACE}" elementFormDefault="qualified">
+      <xs:import namespace="{COMMON_NAMESPACE}"/>
+      <xs:complexType name="ShipmentUnit">
+        <xs:sequence>
+          <xs:element name="ShipmentUnitReference" type="xs:string" minOccurs="0" maxOccurs="unbounded"/>
+          <xs:element name="Weight" type="xs:decimal"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Shipment">
+        <xs:sequence>
+          <xs:element name="ShipmentReference" type="xs:string" minOccurs="0" maxOccurs="unbounded"/>
+          <xs:element name="Product" type="xs:string"/>
+          <xs:element name="Consignee" type="common:Consignee"/>
+          <xs:element name="Shipper" type="common:Shipper"/>
+          <xs:element name="ShipmentUnit" type="sp:ShipmentUnit" maxOccurs="unbounded"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="ReturnLabels">
+        <xs:sequence>
+          <xs:element name="TemplateSet" type="xs:string"/>
+          <xs:element name="LabelFormat" type="xs:string"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="PrintingOptions">
+        <xs:sequence>
+          <xs:element name="ReturnLabels" type="sp:ReturnLabels"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="ParcelData">
+        <xs:sequence>
+          <xs:element name="TrackID" type="xs:string"/>
+          <xs:element name="ParcelNumber" type="xs:string" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="PrintData">
+        <xs:sequence>
+          <xs:element name="Data" type="xs:base64Binary"/>
+          <xs:element name="LabelFormat" type="xs:string"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="CreatedShipment">
+        <xs:sequence>
+          <xs:element name="ShipmentReference" type="xs:string" minOccurs="0" maxOccurs="unbounded"/>
+          <xs:element name="ParcelData" type="sp:ParcelData" maxOccurs="unbounded"/>
+          <xs:element name="PrintData" type="sp:PrintData" minOccurs="0" maxOccurs="unbounded"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:element name="ShipmentRequestData">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="Shipment" type="sp:Shipment"/>
+            <xs:element name="PrintingOptions" type="sp:PrintingOptions"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="CreateParcelsResponse">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="CreatedShipment" type="sp:CreatedShipment"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+    </xs:schema>
+    <xs:schema targetNamespace="{COMMON_NAMESPACE}" xmlns:common="{COMMON_NAMESPACE}" elementFormDefault="qualified">
+      <xs:complexType name="Address">
+        <xs:sequence>
+          <xs:element name="Name1" type="xs:string" minOccurs="0"/>
+          <xs:element name="Name2" type="xs:string" minOccurs="0"/>
+          <xs:element name="Name3" type="xs:string" minOccurs="0"/>
+          <xs:element name="CountryCode" type="xs:string" minOccurs="0"/>
+          <xs:element name="ZIPCode" type="xs:string" minOccurs="0"/>
+          <xs:element name="City" type="xs:string" minOccurs="0"/>
+          <xs:element name="Street" type="xs:string" minOccurs="0"/>
+          <xs:element name="StreetNumber" type="xs:string" minOccurs="0"/>
+          <xs:element name="ContactPerson" type="xs:string" minOccurs="0"/>
+          <xs:element name="FixedLinePhonenumber" type="xs:string" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Consignee">
+        <xs:sequence>
+          <xs:element name="Address" type="common:Address" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Shipper">
+        <xs:sequence>
+          <xs:element name="ContactID" type="xs:string" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+    </xs:schema>
+  </wsdl:types>
+  <wsdl:message name="createParcelsRequest">
+    <wsdl:part name="parameters" element="sp:ShipmentRequestData"/>
+  </wsdl:message>
+  <wsdl:message name="createParcelsResponse">
+    <wsdl:part name="parameters" element="sp:CreateParcelsResponse"/>
+  </wsdl:message>
+  <wsdl:portType name="ShipmentProcessingPortType">
+    <wsdl:operation name="createParcels">
+      <wsdl:input message="tns:createParcelsRequest"/>
+      <wsdl:output message="tns:createParcelsResponse"/>
+    </wsdl:operation>
+  </wsdl:portType>
+  <wsdl:binding name="ShipmentProcessingServiceSoapBinding" type="tns:ShipmentProcessingPortType">
+    <soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>
+    <wsdl:operation name="createParcels">
+      <soap:operation soapAction="http://fpcs.gls-group.eu/v1/ShipmentProcessing/createParcels"/>
+      <wsdl:input><soap:body use="literal"/></wsdl:input>
+      <wsdl:output><soap:body use="literal"/></wsdl:output>
+    </wsdl:operation>
+  </wsdl:binding>
+  <wsdl:service name="ShipmentProcessingService">
+    <wsdl:port name="ShipmentProcessingPort" binding="tns:ShipmentProcessingServiceSoapBinding">
+      <soap:address location="{{location}}"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+"""
+
+RESPONSE_TEMPLATE = (
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+    f'<soapenv:Body><ns:CreateParcelsResponse xmlns:ns="{TYPES_NAMESPACE}"><ns:CreatedShipment>'
+    "{parcels}{print_data}"
+    "</ns:CreatedShipment></ns:CreateParcelsResponse></soapenv:Body></soapenv:Envelope>"
+)
+
+FAULT_TEMPLATE = (
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"><soapenv:Body><soapenv:Fault>'
+    "<faultcode>soapenv:Server</faultcode><faultstring>{message}</faultstring>"
+    "</soapenv:Fault></soapenv:Body></soapenv:Envelope>"
+)
+
+_SHIPMENT_UNIT_PATTERN = re.compile(rb"<(?:\w+:)?ShipmentUnit>")
+
+
+def create_mock_gls_app(latency=0.0, error_rate=0.0, seed=None):
+    # Mock des GLS ShipIT createParcels: liefert die WSDL aus und antwortet mit einem PDF je Packstück
+    app = FastAPI()
+    rng = random.Random(seed)
+    track_ids = itertools.count(1)
+    # Das PDF wird einmal erzeugt und wiederverwendet, damit der Mock nicht selbst zum Engpass wird
+    label_data = base64.b64encode(make_gls_label_pdf("ZXYMOCK")).decode("ascii")
+
+    @app.get("/{path:path}")
+    async def wsdl(request: Request):
+        location = str(request.url.replace(query=""))
+        return Response(WSDL_TEMPLATE.format(location=location), media_type="text/xml")
+
+    @app.post("/{path:path}")
+    async def create_parcels(request: Request):
+        body = await request.body()
+        if latency:
+            await asyncio.sleep(latency)
+        if error_rate and rng.random() < error_rate:
+            return Response(FAULT_TEMPLATE.format(message="Mock: internal error"), status_code=500,
+                            media_type="text/xml")
+
+        parcels, print_data = [], []
+        for _ in range(max(1, len(_SHIPMENT_UNIT_PATTERN.findall(body)))):
+            track_id = f"ZXYMOCK{next(track_ids):06d}"
+            parcels.append(f"<ns:ParcelData><ns:TrackID>{track_id}</ns:TrackID>"
+                           f"<ns:ParcelNumber>{track_id[-6:]}</ns:ParcelNumber></ns:ParcelData>")
+            print_data.append(f"<ns:PrintData><ns:Data>{label_data}</ns:Data>"
+                              "<ns:LabelFormat>PDF</ns:LabelFormat></ns:PrintData>")
+        return Response(RESPONSE_TEMPLATE.format(parcels="".join(parcels), print_data="".join(print_data)),
+                        media_type="text/xml")
+
+    return app
@@ -0,0 +1,60 @@
+import multiprocessing
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import uvicorn
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def run_in_thread(app, port=None, **uvicorn_kwargs):
+    # Startet eine ASGI-App mit uvicorn in einem Hintergrund-Thread und liefert die Basis-URL
+    port = port or get_free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", **uvicorn_kwargs)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    scheme = "https" if uvicorn_kwargs.get("ssl_certfile") else "http"
+    try:
+        yield f"{scheme}://127.0.0.1:{port}/"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def _serve_app(factory, kwargs, port):
+    uvicorn.run(factory(**kwargs), host="127.0.0.1", port=port, log_level="warning")
+
+
+@contextmanager
+def run_in_process(factory, port=None, **kwargs):
+    # Wie run_in_thread, aber in einem eigenen Prozess - der Mock teilt sich dann nicht den GIL mit dem Lastgenerator.
+    # factory muss importierbar sein (spawn), z.B. create_mock_dhl_app.
+    port = port or get_free_port()
+    process = multiprocessing.get_context("spawn").Process(target=_serve_app, args=(factory, kwargs, port),
+                                                           daemon=True)
+    process.start()
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            break
+        except OSError:
+            if not process.is_alive() or time.monotonic() > deadline:
+                process.terminate()
+                raise RuntimeError(f"Mock {factory.__name__} did not start")
+            time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}/"
+    finally:
+        process.terminate()
+        process.join(timeout=10)
@@ -0,0 +1,255 @@
+"""
+Spielt einen Mitschnitt (TRAFFIC_CAPTURE_PATH, siehe utils/traffic_capture.py) gegen den Proxy ab. DHL und GLS
+werden durch einen Mock ersetzt, der die aufgezeichneten Upstream Antworten (samt Latenz) zurückgibt.
+Verglichen werden die SOAP Antworten mit den aufgezeichneten, dazu Latenz und Durchsatz.
+
+    python -m benchmarks.replay cache/capture/capture-*.jsonl.gz
+    python -m benchmarks.replay capture.jsonl.gz --speed 10          # zehnfach beschleunigt
+    python -m benchmarks.replay capture.jsonl.gz --speed 0 --concurrency 50   # so schnell wie möglich
+
+Upstream Requests werden zuerst über Route und Payload zugeordnet. Hat sich das Mapping geändert, wird die nächste
+unbenutzte Antwort derselben Route genommen und als "Payload abweichend" gezählt. EKP, Abrechnungsnummern und
+GLS_CLIENT_ID kommen aus der .env, damit die Payloads eines Produktions-Mitschnitts wieder übereinstimmen.
+Der Exit-Code ist 1, sobald sich eine Antwort unterscheidet.
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import re
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request, Response
+from lxml import etree
+
+from benchmarks.load_test import get_proxy_env, percentile, start_proxy, wait_until_ready
+from benchmarks.mock_gls import WSDL_TEMPLATE
+from benchmarks.mock_servers import get_free_port, run_in_thread
+from utils.traffic_capture import read_capture
+
+# Geschäftsdaten aus der .env, die in die Upstream Payloads eingehen
+BUSINESS_SETTINGS = ("EKP", "DHL_BILLING_NUMBER_NAT_PREFIX", "DHL_BILLING_NUMBER_INTL_PREFIX",
+                     "DHL_BILLING_NUMBER_KLP_PREFIX", "GLS_CLIENT_ID")
+
+_GLS_LABEL_URL = re.compile(r"[^<>\"\s]*/label/gls/label_[0-9a-f-]{36}\.pdf")
+_XML_LABEL = re.compile(r"(<(?:[\w-]+:)?(?:XMLLabel|ExportDocPDFData)>)[^<]*")
+_FAULT = re.compile(rb"<(?:[\w-]+:)?Fault[\s>]")
+
+
+def canonical_json(payload):
+    return json.dumps(payload, sort_keys=True, separators=(",", ":")) if payload is not None else ""
+
+
+def canonical_xml(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        return etree.tostring(etree.fromstring(data), method="c14n")
+    except etree.XMLSyntaxError:
+        return data
+
+
+class RecordedUpstream:
+    # Aufgezeichnete Upstream Antworten, zugeordnet über (Carrier, Methode, Pfad, Query, Payload)
+
+    def __init__(self, records):
+        self.exact = defaultdict(deque)
+        self.by_route = defaultdict(deque)
+        self.used = set()
+        self.stats = Counter()
+        for record in records:
+            for entry in record.get("upstream", []):
+                if entry.get("response") is None:
+                    continue
+                route, key = self.get_recorded_key(entry)
+                self.exact[key].append(entry)
+                self.by_route[route].append(entry)
+
+    @staticmethod
+    def get_recorded_key(entry):
+        if entry["carrier"] == "GLS":
+            route = ("GLS", "POST", "")
+            return route, route + (canonical_xml(entry["request"]),)
+        route = ("DHL", entry["method"], entry["path"].strip("/"))
+        params = tuple(sorted(httpx.QueryParams(entry.get("params") or {}).multi_items()))
+        return route, route + (params, canonical_json(entry.get("payload")))
+
+    def take(self, route, key):
+        for candidates, kind in ((self.exact.get(key), "exact"), (self.by_route.get(route), "payload_differs")):
+            while candidates:
+                entry = candidates.popleft()
+                if id(entry) not in self.used:
+                    self.used.add(id(entry))
+                    self.stats[kind] += 1
+                    return entry
+        self.stats["missing"] += 1
+        return None
+
+
+def create_recorded_upstream_app(upstream: RecordedUpstream, speed=1.0):
+    # DHL REST unter /dhl/, GLS SOAP (inkl. WSDL) unter /gls/
+    app = FastAPI()
+
+    async def delay(entry):
+        if speed > 0 and entry.get("duration_ms"):
+            await asyncio.sleep(entry["duration_ms"] / 1000 / speed)
+
+    @app.api_route("/dhl/{path:path}", methods=["GET", "POST", "DELETE"])
+    async def dhl(path: str, request: Request):
+        body = await request.body()
+        route = ("DHL", request.method, path.strip("/"))
+        params = tuple(sorted(request.query_params.multi_items()))
+        entry = upstream.take(route, route + (params, canonical_json(json.loads(body) if body else None)))
+        if entry is None:
+            return Response(json.dumps({"title": "Replay", "detail": "No recorded response"}), status_code=502,
+                            media_type="application/json")
+        await delay(entry)
+        return Response(entry["response"].encode("utf-8"), status_code=entry["status"],
+                        media_type="application/json")
+
+    @app.get("/gls/{path:path}")
+    async def gls_wsdl(request: Request):
+        return Response(WSDL_TEMPLATE.format(location=str(request.url.replace(query=""))), media_type="text/xml")
+
+    @app.post("/gls/{path:path}")
+    async def gls(request: Request):
+        route = ("GLS", "POST", "")
+        entry = upstream.take(route, route + (canonical_xml(await request.body()),))
+        if entry is None:
+            return Response(b"", status_code=502)
+        await delay(entry)
+        response = entry["response"].encode("utf-8")
+        return Response(response, status_code=500 if _FAULT.search(response) else 200, media_type="text/xml")
+
+    return app
+
+
+def normalize(text, compare_labels=False):
+    # Label-Dateinamen sind zufällig, gerenderte PDFs enthalten Zeitstempel
+    text = _GLS_LABEL_URL.sub("<gls-label-url>", text)
+    if not compare_labels:
+        text = _XML_LABEL.sub(r"\1<label>", text)
+    return re.sub(r">\s*<", ">\n<", text.strip())
+
+
+def get_replayed_body(response: httpx.Response):
+    # HTTPException wurde im Mitschnitt nur mit ihrem detail aufgezeichnet
+    if response.headers.get("content-type", "").startswith("application/json"):
+        try:
+            return str(response.json().get("detail"))
+        except (ValueError, AttributeError):
+            pass
+    return response.text
+
+
+async def drive(url, records, speed, concurrency, timeout):
+    results = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        async def send(record, scheduled):
+            if speed > 0:
+                await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(record["path"].lstrip("/"), content=record["request"].encode("utf-8"),
+                                                 headers={"Content-Type": "text/xml; charset=utf-8"})
+                    outcome = (response.status_code, get_replayed_body(response))
+                except httpx.HTTPError as e:
+                    outcome = (0, type(e).__name__)
+                results.append((record, outcome, (time.perf_counter() - start) * 1000))
+
+        start = time.perf_counter()
+        first = records[0]["ts"]
+        await asyncio.gather(*(send(record, start + (record["ts"] - first) / speed if speed > 0 else start)
+                               for record in records))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def report(results, elapsed, upstream: RecordedUpstream, show_diffs, compare_labels=False):
+    identical, status_changed, diffs = 0, 0, []
+    for record, (status, body), _ in results:
+        expected = normalize(_as_text(record.get("response")), compare_labels)
+        actual = normalize(body, compare_labels)
+        if status != record.get("status"):
+            status_changed += 1
+        if status == record.get("status") and expected == actual:
+            identical += 1
+        elif len(diffs) < show_diffs:
+            header = f"--- {record['path']} @ {record['ts']:.3f}: status {record.get('status')} -> {status}"
+            diff = difflib.unified_diff(expected.splitlines(), actual.splitlines(), "recorded", "replayed",
+                                        lineterm="", n=1)
+            diffs.append("\n".join([header, *diff]))
+
+    recorded = sorted(record.get("duration_ms") or 0.0 for record, _, _ in results)
+    replayed = sorted(latency for _, _, latency in results)
+    print(f"Requests:   {len(results)} in {elapsed:.1f} s ({len(results) / elapsed:.1f} req/s)")
+    print(f"Antworten:  {identical} identisch, {len(results) - identical} abweichend "
+          f"(davon {status_changed} mit anderem HTTP Status)")
+    print(f"Upstream:   {upstream.stats['exact']} exakt zugeordnet, {upstream.stats['payload_differs']} Payload "
+          f"abweichend, {upstream.stats['missing']} ohne Aufzeichnung")
+    for name, values in (("aufgezeichnet", recorded), ("Replay", replayed)):
+        print(f"Latenz {name + ':':<15} p50 {percentile(values, 50):.1f} ms, p95 {percentile(values, 95):.1f} ms, "
+              f"p99 {percentile(values, 99):.1f} ms")
+    for diff in diffs:
+        print()
+        print(diff)
+    return identical == len(results)
+
+
+def _as_text(value):
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("captures", nargs="+", help="Mitschnitt-Dateien (.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Zeitraffer (1 = wie aufgezeichnet, 10 = zehnfach, 0 = ohne Pausen)")
+    parser.add_argument("--concurrency", type=int, default=100, help="Höchstens so viele Requests gleichzeitig")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--show-diffs", type=int, default=10, help="So viele Abweichungen ausgeben")
+    parser.add_argument("--idempotency", choices=("on", "off"), default="on",
+                        help="Wie im aufgezeichneten Proxy (IDEMPOTENCY_ENABLED)")
+    parser.add_argument("--compare-labels", action="store_true", help="Auch inline Labels (PDF) vergleichen")
+    args = parser.parse_args()
+
+    records = sorted((record for path in args.captures for record in read_capture(path)
+                      if record.get("request") is not None), key=lambda record: record["ts"])[:args.limit]
+    if not records:
+        parser.error("Mitschnitt enthält keine Requests")
+
+    load_dotenv()
+    business_settings = {key: os.environ[key] for key in BUSINESS_SETTINGS if os.getenv(key)}
+    upstream = RecordedUpstream(records)
+    with tempfile.TemporaryDirectory() as work_dir, \
+            run_in_thread(create_recorded_upstream_app(upstream, args.speed)) as mock_url:
+        env = get_proxy_env(mock_url + "dhl/", mock_url + "gls/", work_dir)
+        env.update(business_settings)
+        # Mit Idempotenz-Cache wurden wiederholte Requests im Original ohne Upstream Call beantwortet
+        env["IDEMPOTENCY_ENABLED"] = "true" if args.idempotency == "on" else "false"
+        env["TRAFFIC_CAPTURE_PATH"] = ""
+        port = get_free_port()
+        url = f"http://127.0.0.1:{port}/"
+        process = start_proxy(port, args.workers, env)
+        try:
+            wait_until_ready(url, process)
+            results, elapsed = asyncio.run(drive(url, records, args.speed, args.concurrency, args.timeout))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    if not report(results, elapsed, upstream, args.show_diffs, args.compare_labels):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
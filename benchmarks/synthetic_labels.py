@@ -0,0 +1,21 @@
+import fitz
+
+CM = 28.3465
+
+
+def make_gls_label_pdf(track_id="ZXYMOCK1", pages=1):
+    # Erzeugt ein GLS-ähnliches Label (10 x 15 cm) mit Text und Barcode-Balken
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page(width=10 * CM, height=15 * CM)
+        page.insert_text((0.5 * CM, 1 * CM), "GLS Germany - Parcel", fontsize=14)
+        page.insert_text((0.5 * CM, 2 * CM), f"Track ID: {track_id}-{page_no}", fontsize=10)
+        for line in range(6):
+            page.insert_text((0.5 * CM, (3 + line * 0.5) * CM), f"Empfänger Zeile {line + 1}", fontsize=9)
+        for bar in range(60):
+            x = 0.5 * CM + bar * 0.14 * CM
+            width = 0.04 * CM if bar % 3 else 0.09 * CM
+            page.draw_rect(fitz.Rect(x, 8 * CM, x + width, 11 * CM), color=(0, 0, 0), fill=(0, 0, 0))
+    pdf_data = doc.tobytes()
+    doc.close()
+    return pdf_data
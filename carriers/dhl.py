@@ -1,14 +1,28 @@
 import os
-import pycountry
+import time
+import asyncio
+import logging
 
 import httpx
-import xml.etree.ElementTree as ET
 
 from fastapi import HTTPException, Request
 from fastapi.responses import JSONResponse
 
+from carriers.dhl_auth import InvalidCredentialsError, get_dhl_auth, get_dhl_config, load_dhl_config, \
+    reject_credentials, start_dhl_token_refresher, stop_dhl_token_refresher
+from carriers.dhl_products import get_product_table, load_product_tables
+from utils.country_codes import ISO2_TO_ISO3
+from utils.soap_request import ShipmentOrder
+from utils.soap_response import create_creation_state, create_shipment_state, merge_shipment_results
+from utils.structured_logging import lazy_payload
+from utils.metrics import POOL_SATURATION, POOL_SIZE, UPSTREAM_ERRORS, enter_pool, leave_pool, observe_stage
+from utils.traffic_capture import capture_upstream
+from utils.upstream_guard import get_upstream_guard
 
-dhl_api_key = os.getenv('DHL_API_KEY')
+
+# Ein langlebiger Client pro Umgebung (sandbox / production), damit TCP- und TLS-Verbindungen
+# zwischen den Requests wiederverwendet werden.
+_dhl_clients = {}
 
 
 def get_dhl_rest_api_base_url(sandbox=False):
@@ -18,41 +32,90 @@ def get_dhl_rest_api_base_url(sandbox=False):
         return os.getenv('DHL_PRODUCTION_REST_API_URL')
 
 
-def get_dhl_rest_api_orders_url(sandbox=False):
-    dhl_rest_api_base_url = get_dhl_rest_api_base_url(sandbox)
-    return f"{dhl_rest_api_base_url}orders"
+def get_dhl_pool_name(sandbox=False):
+    return "dhl_sandbox" if sandbox else "dhl"
+
+
+def create_dhl_client(sandbox=False) -> httpx.AsyncClient:
+    max_connections = int(os.getenv('DHL_POOL_MAX_CONNECTIONS', 100))
+    POOL_SIZE.set(max_connections, get_dhl_pool_name(sandbox))
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=int(os.getenv('DHL_POOL_MAX_KEEPALIVE', 20)),
+        keepalive_expiry=float(os.getenv('DHL_POOL_KEEPALIVE_EXPIRY', 30)),
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv('DHL_TIMEOUT', 30)),
+        connect=float(os.getenv('DHL_CONNECT_TIMEOUT', 5)),
+    )
+    return httpx.AsyncClient(
+        base_url=get_dhl_rest_api_base_url(sandbox) or '',
+        http2=os.getenv('DHL_HTTP2', 'true').lower() in ('1', 'true', 'yes'),
+        limits=limits,
+        timeout=timeout,
+    )
+
+
+async def start_dhl_clients():
+    for sandbox in (False, True):
+        if sandbox not in _dhl_clients:
+            _dhl_clients[sandbox] = create_dhl_client(sandbox)
+    start_dhl_token_refresher(get_dhl_client)
+
+
+async def close_dhl_clients():
+    await stop_dhl_token_refresher()
+    while _dhl_clients:
+        _, client = _dhl_clients.popitem()
+        await client.aclose()
+
 
+# Hooks für carriers/registry.py
 
-async def test_dhl_api():
-    async with httpx.AsyncClient() as client:
+def preload_carrier():
+    load_dhl_config()
+    load_product_tables()
+
+
+async def start_carrier():
+    await start_dhl_clients()
+
+
+async def warm_up_carrier():
+    get_dhl_config()
+    get_product_table()
+
+    async def connect(sandbox):
+        # Verbindungsaufbau (TCP, TLS, HTTP/2) vorziehen - die Verbindung bleibt im Pool
         try:
-            response = await client.get(
-                get_dhl_rest_api_base_url(sandbox=True),
-                headers={
-                    "accept": "application/json",
-                    "dhl-api-key": dhl_api_key
-                }
-            )
-            # Prüfe den Statuscode der Antwort
-            if response.status_code == 200:
-                response_dict = {"message": "DHL API ist erreichbar."}
-                response_dict.update(response.json())
-                return response_dict
-            else:
-                return {"message": "DHL API ist nicht erreichbar.", "status_code": response.status_code}
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=500, detail=f"Anfragefehler: {str(e)}")
+            await get_dhl_client(sandbox).get('', headers={"accept": "application/json",
+                                                           "dhl-api-key": get_dhl_config().api_key})
+        except httpx.HTTPError as e:
+            logging.warning("DHL warm-up connection (sandbox=%s) failed: %s", sandbox, e)
+
+    await asyncio.gather(*(connect(sandbox) for sandbox in (False, True) if get_dhl_rest_api_base_url(sandbox)))
+
+
+async def stop_carrier():
+    await close_dhl_clients()
+
+
+def get_dhl_client(sandbox=False) -> httpx.AsyncClient:
+    # Fallback, falls die App ohne Lifespan (z.B. in Skripten) verwendet wird
+    client = _dhl_clients.get(sandbox)
+    if client is None or client.is_closed:
+        client = _dhl_clients[sandbox] = create_dhl_client(sandbox)
+    return client
 
 
 async def create_dhl_test_shipment(request: Request):
     payload = get_dhl_test_rest_object(package_type='klp')
-    print(payload)
-    username = os.getenv('GKP_SANDBOX_USER')
-    password = os.getenv('GKP_SANDBOX_PASSWORD')
-    dhl_rest_api_orders_url = get_dhl_rest_api_orders_url(sandbox=True)
-    response = await make_dhl_rest_api_call(dhl_rest_api_orders_url, payload, username, password)
-    print(response.json())
-    response = JSONResponse(content=response.json())
+    logging.debug("DHL test payload: %s", lazy_payload(payload))
+    username, password = get_dhl_config().default_credentials[True]
+    response = await make_dhl_rest_api_call("orders", payload, username, password, sandbox=True)
+    rest_data = response.json()
+    logging.debug("DHL test response: %s", lazy_payload(rest_data))
+    response = JSONResponse(content=rest_data)
     return response
 
 
@@ -171,118 +234,183 @@ def get_dhl_test_rest_object(package_type='nat'):
     return payload
 
 
-async def make_dhl_rest_api_call(rest_api_url, payload, username, password):
+async def make_dhl_rest_api_call(rest_api_url, payload, username, password, sandbox=False, include_docs="URL",
+                                 method="POST", params=None):
     headers = {
         "accept": "application/json",
         "Accept-Language": "de-DE",
         "Content-Type": "application/json",
-        "dhl-api-key": dhl_api_key
+        "dhl-api-key": get_dhl_config().api_key
     }
-    auth = (username, password)
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(rest_api_url, json=payload, headers=headers, auth=auth,
-                                     params={"validate": "False", "includeDocs": "URL", "printFormat": "910-300-700"})
+    if params is None:
+        params = {"validate": "False", "includeDocs": include_docs, "printFormat": "910-300-700"}
+    client = get_dhl_client(sandbox)
+    auth = await get_dhl_auth(client, username, password, sandbox)
+    if isinstance(auth, dict):
+        # OAuth: Bearer Token statt Basic Auth
+        headers.update(auth)
+        auth = None
+    pool = get_dhl_pool_name(sandbox)
+
+    async def send():
+        enter_pool(pool)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, rest_api_url, json=payload, headers=headers, auth=auth,
+                                            params=params)
+        except httpx.PoolTimeout:
+            POOL_SATURATION.inc(pool)
+            UPSTREAM_ERRORS.inc("DHL", "pool_timeout")
+            raise
+        except httpx.TimeoutException:
+            UPSTREAM_ERRORS.inc("DHL", "timeout")
+            raise
+        except httpx.ConnectError:
+            UPSTREAM_ERRORS.inc("DHL", "connect")
+            raise
+        except httpx.HTTPError:
+            UPSTREAM_ERRORS.inc("DHL", "error")
+            raise
+        finally:
+            leave_pool(pool)
+            observe_stage("upstream", "DHL", start)
+
+        if is_dhl_failure_response(response):
+            UPSTREAM_ERRORS.inc("DHL", f"http_{response.status_code}")
+        elif response.status_code == 401:
+            reject_credentials(username, password, sandbox)
+        capture_upstream("DHL", method=method, path=rest_api_url, params=params, payload=payload,
+                         status=response.status_code, response=response.content,
+                         duration_ms=round((time.perf_counter() - start) * 1000, 2))
         return response
 
+    # POST /orders legt Sendungen an und wird nur wiederholt, wenn der Request DHL nie erreicht hat - GET beliebig
+    return await get_upstream_guard("DHL", sandbox).call(
+        send,
+        idempotent=method == "GET",
+        is_failure_result=is_dhl_failure_response,
+        is_failure_error=is_dhl_failure_error,
+        is_retry_safe_error=is_dhl_retry_safe_error,
+    )
+
 
-def soap_to_dhl_rest_data(xml_data, sandbox=False):
-    shipment_order = xml_data.get("ShipmentOrder")
-    if not shipment_order:
-        raise HTTPException(status_code=400, detail="Invalid SOAP request: ShipmentOrder missing.")
+def is_dhl_failure_response(response: httpx.Response):
+    return response.status_code >= 500 or response.status_code == 429
 
-    shipment = shipment_order.get("Shipment")
-    if not shipment:
-        raise HTTPException(status_code=400, detail="Invalid SOAP request: Shipment missing.")
 
-    shipment_details = shipment.get("ShipmentDetails")
+def is_dhl_failure_error(error):
+    # Ein voller eigener Pool ist kein Ausfall von DHL
+    return isinstance(error, httpx.TransportError) and not isinstance(error, httpx.PoolTimeout)
+
+
+def is_dhl_retry_safe_error(error):
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+def soap_to_dhl_rest_data(shipment_orders, sandbox=False, username=None):
+    # Alle ShipmentOrder eines Requests werden in einem einzigen REST Call übertragen
+    products = get_product_table(username, sandbox)
+    json_data = {
+        "profile": "STANDARD_GRUPPENPROFIL",
+        "shipments": [soap_order_to_dhl_rest_shipment(shipment_order, sandbox, products)
+                      for shipment_order in shipment_orders]
+    }
+
+    return json_data
+
+
+def soap_order_to_dhl_rest_shipment(shipment_order: ShipmentOrder, sandbox=False, products=None):
+    shipment_details = shipment_order.shipment_details
     if not shipment_details:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: ShipmentDetails missing.")
 
-    shipper = shipment.get("Shipper")
+    shipper = shipment_order.shipper
     if not shipper:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Shipper missing.")
 
-    receiver = shipment.get("Receiver")
+    receiver = shipment_order.receiver
     if not receiver:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Receiver missing.")
 
+    if not shipper.company or not shipper.address or not shipper.communication:
+        raise HTTPException(status_code=400, detail="Invalid SOAP request: Shipper incomplete.")
+    if not receiver.address or not receiver.communication:
+        raise HTTPException(status_code=400, detail="Invalid SOAP request: Receiver incomplete.")
+
     # Absender
     shipper = {
-        "name1": shipper["Company"]["ns1:Company"]["ns1:name1"],
-        "name2": shipper["Company"]["ns1:Company"]["ns1:name2"],
-        "addressStreet": shipper["Address"]["ns1:streetName"],
-        "addressHouse": shipper["Address"]["ns1:streetNumber"],
-        "postalCode": shipper["Address"]["ns1:Zip"]["ns1:germany"],
-        "city": shipper["Address"]["ns1:city"],
-        "country": shipper["Address"]["ns1:Origin"]["ns1:countryISOCode"],
-        "email": shipper["Communication"]["ns1:email"],
-        "phone": shipper["Communication"]["ns1:phone"],
-        "contactName": shipper["Communication"]["ns1:contactPerson"]
+        "name1": shipper.company.name1,
+        "name2": shipper.company.name2,
+        "addressStreet": shipper.address.street_name,
+        "addressHouse": shipper.address.street_number,
+        "postalCode": shipper.address.zip_germany,
+        "city": shipper.address.city,
+        "country": shipper.address.country_iso_code,
+        "email": shipper.communication.email,
+        "phone": shipper.communication.phone,
+        "contactName": shipper.communication.contact_person
     }
 
-    country_iso_code = shipper['country']
-    country = pycountry.countries.get(alpha_2=country_iso_code)
-    if country:
-        shipper['country'] = country.alpha_3
+    country_iso3_code = ISO2_TO_ISO3.get((shipper['country'] or '').upper())
+    if country_iso3_code:
+        shipper['country'] = country_iso3_code
     else:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Country ISO code missing or not valid.")
 
     # Adressat
     consignee = {}
-    company = receiver.get("Company")
-    if company:
-        inner_company = company.get("ns1:Company")
-        inner_person = company.get("ns1:Person")
+    if receiver.has_company:
+        inner_company = receiver.company
+        inner_person = receiver.person
         if inner_company:
-            consignee["name1"] = inner_company.get("ns1:name1", '')
-            if inner_company.get("ns1:name2"):
-                consignee["name2"] = inner_company.get("ns1:name2")
+            consignee["name1"] = inner_company.name1 or ''
+            if inner_company.name2:
+                consignee["name2"] = inner_company.name2
         elif inner_person:
-            consignee["name1"] = inner_person.get("ns1:firstname", '') + " " + inner_person.get("ns1:lastname", '')
+            consignee["name1"] = (inner_person.firstname or '') + " " + (inner_person.lastname or '')
         else:
             raise HTTPException(status_code=400, detail="Invalid SOAP request: Inner Company / Person missing.")
     else:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Company missing.")
 
-    consignee['addressStreet'] = receiver['Address']['ns1:streetName']
+    address = receiver.address
+    consignee['addressStreet'] = address.street_name
 
-    consignee['addressHouse'] = receiver.get('Address').get('ns1:streetNumber', '')
-    additional_address_information = receiver.get('Address').get('ns1:additionalAddressInformation', '')
+    consignee['addressHouse'] = address.street_number or ''
+    additional_address_information = address.additional_address_information
     if additional_address_information:
         if not consignee.get("name2"):
             consignee['name2'] = additional_address_information
         else:
             consignee['name3'] = additional_address_information
 
-    care_of_name = receiver.get('Address').get('ns1:careOfName', '')
+    care_of_name = address.care_of_name
     if care_of_name:
         if not consignee.get("name2"):
             consignee['name2'] = care_of_name
         else:
             consignee['name3'] = care_of_name
 
-    postal_code_german_destination = receiver['Address']['ns1:Zip'].get('ns1:germany')
+    postal_code_german_destination = address.zip_germany
     if postal_code_german_destination:
         postal_code = postal_code_german_destination
     else:
-        postal_code = receiver['Address']['ns1:Zip']['ns1:other']
+        postal_code = address.zip_other
 
     if not postal_code:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Postal code missing.")
     else:
         consignee['postalCode'] = postal_code
 
-    consignee['city'] = receiver['Address']['ns1:city']
+    consignee['city'] = address.city
 
-    country_iso_code = receiver['Address']['ns1:Origin']['ns1:countryISOCode']
-    country = pycountry.countries.get(alpha_2=country_iso_code)
-    if country:
-        consignee['country'] = country.alpha_3
+    country_iso3_code = ISO2_TO_ISO3.get((address.country_iso_code or '').upper())
+    if country_iso3_code:
+        consignee['country'] = country_iso3_code
     else:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Country ISO code missing or not valid.")
 
-    consignee['contactName'] = receiver['Communication']['ns1:contactPerson']
+    consignee['contactName'] = receiver.communication.contact_person
     if consignee.get('contactName') and len(consignee['contactName']) > 3:
         # consignee['contactName'] = consignee['name1']
         if not consignee.get("name2"):
@@ -291,7 +419,7 @@ def soap_to_dhl_rest_data(xml_data, sandbox=False):
             consignee['name3'] = consignee['contactName']
         #del (consignee['contactName'])
 
-    consignee['phone'] = receiver['Communication']['ns1:phone']
+    consignee['phone'] = receiver.communication.phone
 
     #    if 'Packstation' in consignee['addressStreet']:
     #        consignee['name2'] = consignee['contactName']
@@ -304,56 +432,37 @@ def soap_to_dhl_rest_data(xml_data, sandbox=False):
     details = {
         "weight": {
             "uom": "kg",
-            "value": float(shipment_details.get('ShipmentItem').get('WeightInKG'))
+            "value": float(shipment_details.weight_in_kg)
         }
     }
 
-    if sandbox:
-        ekp = os.getenv('EKP_TEST')
-    else:
-        ekp = os.getenv('EKP')
-
-    product_code = shipment_details.get('ProductCode')
-    if product_code == 'EPN':  # DHL Paket
-        product_code = 'V01PAK'
-        billing_number = ekp + os.getenv('DHL_BILLING_NUMBER_NAT_PREFIX')
-    elif product_code == 'BPI':  # Weltpaket
-        product_code = 'V53WPAK'
-        billing_number = ekp + os.getenv('DHL_BILLING_NUMBER_INTL_PREFIX')
-    elif product_code == 'EPI':  # Europaket
-        product_code = 'V54EPAK'
-        billing_number = ekp + os.getenv('DHL_BILLING_NUMBER_INTL_PREFIX')
-    elif product_code == 'KLP':  # Kleinpaket
-        product_code = 'V62KP'
-        billing_number = ekp + os.getenv('DHL_BILLING_NUMBER_KLP_PREFIX')
-    else:
+    # Produkt und Abrechnungsnummer aus der beim Start aufgebauten Tabelle (carriers/dhl_products.py)
+    product = (products or get_product_table(sandbox=sandbox)).get(shipment_details.product_code)
+    if product is None:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Product code missing or not valid.")
-
-    json_data = {
-        "profile": "STANDARD_GRUPPENPROFIL",
-        "shipments": [
-            {
-                "product": product_code,
-                "billingNumber": billing_number,
-                "refNo": shipment_details.get('CustomerReference'),
-                #"shipDate": shipment_details.get('ShipmentDate'),
-                "shipper": shipper,
-                "consignee": consignee,
-                "details": details,
-            }
-        ]
+    if not product.billing_number:
+        raise HTTPException(status_code=500,
+                            detail=f"No DHL billing number configured for {shipment_details.product_code}.")
+
+    rest_shipment = {
+        "product": product.product,
+        "billingNumber": product.billing_number,
+        "refNo": shipment_details.customer_reference,
+        #"shipDate": shipment_details.get('ShipmentDate'),
+        "shipper": shipper,
+        "consignee": consignee,
+        "details": details,
     }
 
-    return json_data
-
+    return rest_shipment
 
-def dhl_rest_to_soap_data(response_statuscode, rest_data):
 
+def get_dhl_status(response_statuscode, rest_data):
     status = rest_data.get("status")
     if status and isinstance(status, dict):
-        status_name = status.get("title").lower()
+        status_name = (status.get("title") or "").lower()
     else:
-        status_name = rest_data.get("title").lower()
+        status_name = (rest_data.get("title") or "").lower()
 
     validation_messages = []
 
@@ -369,94 +478,161 @@ def dhl_rest_to_soap_data(response_statuscode, rest_data):
     else:
         status_code = "1101"
         status_name = 'Hard validation error occured.'
-        validation_message = rest_data.get("items")[0].get("validationMessage")
-        if validation_message:
-            validation_message = validation_message.get('validationMessage')
+    return status_code, status_name, validation_messages
+
 
-    items = rest_data.get("items")
-    label_url = None
-    shipment_no = None
+def dhl_rest_to_soap_data(response_statuscode, rest_data, sequence_numbers):
+    status_code, status_name, validation_messages = get_dhl_status(response_statuscode, rest_data)
 
-    if items:
-        shipment_no = items[0].get("shipmentNo")
-        if items[0].get("label"):
-            label_url = rest_data.get("items")[0].get("label").get("url")
+    creation_states = []
+    # Die Items kommen in der Reihenfolge der gesendeten Shipments zurück
+    for item, sequence_number in zip(rest_data.get("items") or [], sequence_numbers):
+        item_status_code, item_status_name = status_code, status_name
+        item_status = item.get("sstatus")
+        if status_code != "0" and item_status and item_status.get("statusCode") == 200:
+            # Teilerfolg (207 Multi-Status): dieses Shipment wurde angelegt
+            item_status_code, item_status_name = "0", item_status.get("title", "ok").lower()
 
-        if items[0].get("validationMessages"):
-            for validation_message in items[0].get("validationMessages"):
+        status_messages = [item_status_name]
+        item_validation_messages = list(validation_messages)
+        if item.get("validationMessages"):
+            for validation_message in item.get("validationMessages"):
                 message = validation_message.get("validationMessage")
                 if validation_message.get("validationState") == "Warning":
-                    validation_messages.append(message)
+                    item_validation_messages.append(message)
                 else:
-                    validation_messages.insert(0, message)
+                    item_validation_messages.insert(0, message)
+        status_messages.extend(item_validation_messages)
+
+        label_url = None
+        xml_label = None
+        if item.get("label"):
+            # includeDocs=URL liefert "url", includeDocs=include das Label base64-kodiert in "b64"
+            label_url = item.get("label").get("url")
+            xml_label = item.get("label").get("b64")
+
+        creation_states.append(create_creation_state(item_status_code, status_messages, sequence_number,
+                                                     shipment_number=item.get("shipmentNo"), label_url=label_url,
+                                                     xml_label=xml_label))
+
+    return status_code, status_name, creation_states
+
+
+async def create_dhl_shipment(shipment_orders, username, password, sandbox=False, inline_labels=False):
+    start = time.perf_counter()
+    payload = soap_to_dhl_rest_data(shipment_orders, sandbox, username=username)
+    observe_stage("mapping", "DHL", start)
+    logging.debug("DHL REST payload: %s", lazy_payload(payload))
+    try:
+        response = await make_dhl_rest_api_call("orders", payload, username, password, sandbox=sandbox,
+                                                include_docs="include" if inline_labels else "URL")
+    except InvalidCredentialsError as e:
+        # Bereits als ungültig bekannte Zugangsdaten: Antwort wie bei einem 401 von DHL, ohne DHL zu fragen
+        creation_states = [create_creation_state("1001", ["login failed", e.detail], shipment_order.sequence_number)
+                           for shipment_order in shipment_orders]
+        return "1001", "login failed", creation_states
+    rest_data = response.json()
+    logging.debug("DHL REST response (%s): %s", response.status_code, lazy_payload(rest_data),
+                  extra={"carrier": "DHL", "status_code": response.status_code})
+    sequence_numbers = [shipment_order.sequence_number for shipment_order in shipment_orders]
+    shipment_result = dhl_rest_to_soap_data(response.status_code, rest_data, sequence_numbers)
+    logging.debug("DHL shipment result: %s", lazy_payload(shipment_result))
+    return shipment_result
+
+
+def dhl_rest_to_shipment_states(response_statuscode, rest_data, shipment_numbers, document=None):
+    # Antworten von GET/DELETE /orders und POST /manifests: ein Item je ShipmentNumber, zugeordnet über shipmentNo.
+    # document: "label" oder "customsDoc" - welches Dokument aus dem Item übernommen wird
+    status_code, status_name, validation_messages = get_dhl_status(response_statuscode, rest_data)
+    items = {item.get("shipmentNo"): item for item in rest_data.get("items") or []}
+
+    states = []
+    for shipment_number in shipment_numbers:
+        item = items.get(shipment_number)
+        if item is None:
+            item_status_code = status_code if status_code != "0" else "2000"
+            states.append(create_shipment_state(item_status_code, [status_name if status_code != "0" else
+                                                                   "Unknown shipment number.", *validation_messages],
+                                                shipment_number))
+            continue
+
+        item_status = item.get("sstatus") or {}
+        if item_status.get("statusCode", 200) == 200:
+            item_status_code = "0"
+        elif item_status.get("statusCode") == 404:
+            item_status_code = "2000"
+        else:
+            item_status_code = status_code if status_code != "0" else "1101"
+        status_messages = [(item_status.get("title") or status_name).lower(), *validation_messages]
+        status_messages.extend(message.get("validationMessage") for message in item.get("validationMessages") or [])
 
+        doc = (item.get(document) or {}) if document else {}
+        states.append(create_shipment_state(item_status_code, status_messages, shipment_number,
+                                            label_url=doc.get("url"), xml_label=doc.get("b64")))
+    return status_code, status_name, states
 
-    # Namensräume definieren
-    namespaces = {
-        'soapenv': "http://schemas.xmlsoap.org/soap/envelope/",
-        'cis': "http://dhl.de/webservice/cisbase",
-        'is': "http://de.ws.intraship"
-    }
-    # Alle Namensräume für die Verwendung im Dokument registrieren
-    for ns in namespaces:
-        ET.register_namespace(ns, namespaces[ns])
-
-    # Wurzelelement erstellen
-    envelope = ET.Element(f"{{{namespaces['soapenv']}}}Envelope")
-
-    # Header und Body erstellen
-    header = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Header")
-    body = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Body")
-
-    # CreateShipmentResponse Element
-    create_shipment_response = ET.SubElement(body, f"{{{namespaces['is']}}}CreateShipmentResponse")
-
-    # Version Element
-    version = ET.SubElement(create_shipment_response, f"{{{namespaces['cis']}}}Version")
-    ET.SubElement(version, f"{{{namespaces['cis']}}}majorRelease").text = "1"
-    ET.SubElement(version, f"{{{namespaces['cis']}}}minorRelease").text = "0"
-    ET.SubElement(version, f"{{{namespaces['cis']}}}build").text = "14"
-
-    # Status Element
-    status = ET.SubElement(create_shipment_response, "status")
-    ET.SubElement(status, "StatusCode").text = status_code
-    ET.SubElement(status, "StatusMessage").text = status_name
-
-    # ShipmentNumber Element
-    if items:
-        # CreationState Element
-        creation_state = ET.SubElement(create_shipment_response, "CreationState")
-        ET.SubElement(creation_state, "StatusCode").text = status_code
-        ET.SubElement(creation_state, "StatusMessage").text = status_name
-        if validation_messages:
-            for validation_message in validation_messages:
-                ET.SubElement(creation_state, "StatusMessage").text = validation_message
-
-        ET.SubElement(creation_state, "SequenceNumber").text = "1"
-        shipment_number = ET.SubElement(creation_state, "ShipmentNumber")
-        ET.SubElement(shipment_number, f"{{{namespaces['cis']}}}shipmentNumber").text = shipment_no
-
-        # PieceInformation Element
-        piece_information = ET.SubElement(creation_state, "PieceInformation")
-        piece_number = ET.SubElement(piece_information, "PieceNumber")
-        ET.SubElement(piece_number, f"{{{namespaces['cis']}}}licensePlate").text = shipment_no
-
-        # Labelurl
-        if label_url:
-            ET.SubElement(creation_state, "Labelurl").text = label_url
-
-    # Baum in eine Zeichenfolge umwandeln
-    xml_str = ET.tostring(envelope, encoding="utf-8")
-    return xml_str
-
-
-async def create_dhl_shipment(soap_request_data, username, password, sandbox=False):
-    dhl_rest_api_orders_url = get_dhl_rest_api_orders_url(sandbox=sandbox)
-    payload = soap_to_dhl_rest_data(soap_request_data, sandbox)
-    print(payload)
-    response = await make_dhl_rest_api_call(dhl_rest_api_orders_url, payload, username, password)
-    print(response.status_code)
-    print(response.json())
-    soap_response = dhl_rest_to_soap_data(response.status_code, response.json())
-    print(soap_response)
-    return soap_response
+
+def get_login_failed_result(error: InvalidCredentialsError, shipment_numbers):
+    return "1001", "login failed", [create_shipment_state("1001", ["login failed", error.detail], shipment_number)
+                                    for shipment_number in shipment_numbers]
+
+
+async def get_dhl_documents(shipment_numbers, username, password, sandbox=False, inline=False, document="label"):
+    # getLabelDD / getExportDocDD: GET /orders liefert Label bzw. Zollpapiere bereits angelegter Sendungen
+    params = {"shipment": list(shipment_numbers), "docFormat": "PDF",
+              "includeDocs": "include" if inline else "URL"}
+    if document == "label":
+        params["printFormat"] = "910-300-700"
+    try:
+        response = await make_dhl_rest_api_call("orders", None, username, password, sandbox=sandbox, method="GET",
+                                                params=params)
+    except InvalidCredentialsError as e:
+        return get_login_failed_result(e, shipment_numbers)
+    return dhl_rest_to_shipment_states(response.status_code, response.json(), shipment_numbers, document)
+
+
+def get_dhl_batches(shipment_numbers):
+    batch_size = int(os.getenv('DHL_SHIPMENT_BATCH_SIZE', 30))
+    return [shipment_numbers[index:index + batch_size] for index in range(0, len(shipment_numbers), batch_size)]
+
+
+async def delete_dhl_shipments(shipment_numbers, username, password, sandbox=False):
+    # deleteShipmentDD: DELETE /orders mit vielen shipment Parametern je Call, die Batches laufen parallel
+    async def delete_batch(batch):
+        try:
+            response = await make_dhl_rest_api_call("orders", None, username, password, sandbox=sandbox,
+                                                    method="DELETE",
+                                                    params={"profile": "STANDARD_GRUPPENPROFIL", "shipment": batch})
+        except InvalidCredentialsError as e:
+            return get_login_failed_result(e, batch)
+        return dhl_rest_to_shipment_states(response.status_code, response.json(), batch)
+
+    results = await asyncio.gather(*(delete_batch(batch) for batch in get_dhl_batches(list(shipment_numbers))))
+    return merge_shipment_results(results, shipment_numbers)
+
+
+async def do_dhl_manifest(shipment_numbers, username, password, sandbox=False):
+    # doManifestDD: POST /manifests mit den ShipmentNumbers
+    async def manifest_batch(batch):
+        payload = {"profile": "STANDARD_GRUPPENPROFIL", "shipmentNumbers": batch}
+        try:
+            response = await make_dhl_rest_api_call("manifests", payload, username, password, sandbox=sandbox,
+                                                    params={})
+        except InvalidCredentialsError as e:
+            return get_login_failed_result(e, batch)
+        return dhl_rest_to_shipment_states(response.status_code, response.json(), batch)
+
+    results = await asyncio.gather(*(manifest_batch(batch) for batch in get_dhl_batches(list(shipment_numbers))))
+    return merge_shipment_results(results, shipment_numbers)
+
+
+async def get_dhl_manifest(manifest_date, username, password, sandbox=False):
+    # getManifestDD: GET /manifests?date=... liefert das Tagesabschlussprotokoll als PDF (base64)
+    try:
+        response = await make_dhl_rest_api_call("manifests", None, username, password, sandbox=sandbox,
+                                                method="GET", params={"date": manifest_date})
+    except InvalidCredentialsError:
+        return "1001", "login failed", None
+    rest_data = response.json()
+    status_code, status_name, _ = get_dhl_status(response.status_code, rest_data)
+    return status_code, status_name, (rest_data.get("manifest") or {}).get("b64")
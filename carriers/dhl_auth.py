@@ -0,0 +1,228 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import httpx
+
+from utils.upstream_guard import UpstreamUnavailableError, get_upstream_guard
+
+
+# Zugangsdaten für die DHL REST API. Die Konfiguration wird einmal (nach load_dotenv) gelesen; geprüfte Zugangsdaten
+# und OAuth2 Tokens werden je Benutzer und Umgebung zwischengespeichert und im Hintergrund erneuert, damit kein
+# Request den Token-Abruf selbst bezahlen muss.
+
+@dataclass(frozen=True, slots=True)
+class DhlConfig:
+    api_key: str | None
+    api_secret: str | None
+    auth_mode: str  # "basic" oder "oauth"
+    token_urls: dict
+    default_credentials: dict  # sandbox -> (user, password)
+    credential_ttl: float
+    negative_ttl: float
+    refresh_margin: float
+    max_entries: int
+
+
+class InvalidCredentialsError(Exception):
+    def __init__(self, detail="Unauthorized for given resource."):
+        self.detail = detail
+        super().__init__(detail)
+
+
+class _AuthEntry:
+    __slots__ = ("auth", "expires_at", "refresh_at", "last_used", "invalid_until", "password", "pending")
+
+    def __init__(self, password):
+        self.auth = None
+        self.expires_at = 0.0
+        self.refresh_at = 0.0
+        self.last_used = 0.0
+        self.invalid_until = 0.0
+        # Nur für die Token-Erneuerung im OAuth Modus; verfällt mit dem Eintrag nach credential_ttl
+        self.password = password
+        self.pending = None
+
+
+_dhl_config = None
+# Schlüssel kommen vom Client (beliebige Benutzernamen) - daher LRU mit DHL_CREDENTIAL_MAX_ENTRIES Einträgen
+_auth_cache = OrderedDict()
+_refresher_task = None
+
+
+def load_dhl_config():
+    global _dhl_config
+    _dhl_config = DhlConfig(
+        api_key=os.getenv('DHL_API_KEY'),
+        api_secret=os.getenv('DHL_API_SECRET'),
+        auth_mode=os.getenv('DHL_AUTH_MODE', 'basic').lower(),
+        token_urls={
+            False: os.getenv('DHL_PRODUCTION_TOKEN_URL'),
+            True: os.getenv('DHL_SANDBOX_TOKEN_URL'),
+        },
+        default_credentials={
+            False: (os.getenv('GKP_USER'), os.getenv('GKP_PASSWORD')),
+            True: (os.getenv('GKP_SANDBOX_USER'), os.getenv('GKP_SANDBOX_PASSWORD')),
+        },
+        credential_ttl=float(os.getenv('DHL_CREDENTIAL_TTL', 3600)),
+        negative_ttl=float(os.getenv('DHL_CREDENTIAL_NEGATIVE_TTL', 60)),
+        refresh_margin=float(os.getenv('DHL_TOKEN_REFRESH_MARGIN', 300)),
+        max_entries=int(os.getenv('DHL_CREDENTIAL_MAX_ENTRIES', 10000)),
+    )
+    if _dhl_config.auth_mode == 'oauth' and not (_dhl_config.api_secret and all(_dhl_config.token_urls.values())):
+        logging.warning("DHL_AUTH_MODE=oauth needs DHL_API_SECRET and both token URLs")
+    return _dhl_config
+
+
+def get_dhl_config() -> DhlConfig:
+    return _dhl_config if _dhl_config is not None else load_dhl_config()
+
+
+def resolve_credentials(user, signature, sandbox=False):
+    # Sandbox immer mit den eigenen Testzugangsdaten, Produktion mit denen aus dem SOAP Header
+    # oder - falls keine mitgeschickt wurden - mit den hinterlegten Standardzugangsdaten
+    config = get_dhl_config()
+    if sandbox or (not user and not signature):
+        return config.default_credentials[sandbox]
+    return user, signature
+
+
+def get_cache_key(username, password, sandbox):
+    # Passwörter nicht als Klartext-Schlüssel halten
+    return sandbox, username, hashlib.sha256((password or '').encode('utf-8')).hexdigest()
+
+
+async def get_dhl_auth(client: httpx.AsyncClient, username, password, sandbox=False):
+    # Liefert ein httpx Auth Objekt (Basic) bzw. den Bearer Token Header
+    config = get_dhl_config()
+    key = get_cache_key(username, password, sandbox)
+    entry = _auth_cache.get(key)
+    now = time.monotonic()
+    if entry is None:
+        entry = _auth_cache[key] = _AuthEntry(password)
+        while len(_auth_cache) > config.max_entries:
+            _auth_cache.popitem(last=False)
+    else:
+        _auth_cache.move_to_end(key)
+    entry.last_used = now
+    if entry.invalid_until > now:
+        raise InvalidCredentialsError()
+
+    if config.auth_mode != 'oauth':
+        if entry.auth is None:
+            entry.auth = httpx.BasicAuth(username or '', password or '')
+        return entry.auth
+
+    if entry.auth is None or entry.expires_at <= now:
+        # Nur der erste Request eines Benutzers wartet auf den Token - gleichzeitige Requests teilen sich den Abruf
+        if entry.pending is None:
+            entry.pending = asyncio.ensure_future(fetch_token(client, username, entry, sandbox))
+        try:
+            await asyncio.shield(entry.pending)
+        finally:
+            if entry.pending is not None and entry.pending.done():
+                entry.pending = None
+    return entry.auth
+
+
+async def fetch_token(client: httpx.AsyncClient, username, entry: _AuthEntry, sandbox=False):
+    config = get_dhl_config()
+    data = {
+        "grant_type": "password",
+        "username": username or '',
+        "password": entry.password or '',
+        "client_id": config.api_key or '',
+        "client_secret": config.api_secret or '',
+    }
+
+    async def request_token():
+        return await client.post(config.token_urls[sandbox], data=data, headers={"accept": "application/json"})
+
+    guard = get_upstream_guard("DHL", sandbox)
+    try:
+        response = await guard.call(
+            request_token,
+            idempotent=True,
+            is_failure_result=lambda response: response.status_code >= 500 or response.status_code == 429,
+            is_failure_error=lambda error: isinstance(error, httpx.TransportError),
+        )
+    except httpx.TransportError as e:
+        raise UpstreamUnavailableError(guard.name, f"token request failed: {type(e).__name__}") from e
+    if response.status_code in (400, 401, 403):
+        entry.auth = None
+        entry.invalid_until = time.monotonic() + config.negative_ttl
+        try:
+            detail = response.json().get("error_description")
+        except (ValueError, AttributeError):
+            # Fehlerseite statt JSON (z.B. vom Gateway) - trotzdem ein Login-Fehler
+            detail = None
+        raise InvalidCredentialsError(detail or "Login failed.")
+    if response.is_error:
+        # Token-Endpunkt gestört (5xx, 429) oder falsch konfiguriert - wie jeder andere Ausfall als SOAP Fault (503)
+        # beantworten, nicht als unbehandelte HTTPStatusError (500)
+        retry_after = response.headers.get("retry-after", "")
+        raise UpstreamUnavailableError(guard.name, f"token endpoint returned HTTP {response.status_code}",
+                                       retry_after=float(retry_after) if retry_after.isdigit() else None)
+
+    token = response.json()
+    expires_in = float(token.get("expires_in", 1800))
+    now = time.monotonic()
+    entry.auth = {"Authorization": f"Bearer {token['access_token']}"}
+    entry.expires_at = now + expires_in
+    entry.refresh_at = now + max(expires_in - config.refresh_margin, expires_in / 2)
+    logging.info("DHL token for %s refreshed (valid %d s)", username, expires_in,
+                 extra={"carrier": "DHL", "sandbox": sandbox})
+
+
+def reject_credentials(username, password, sandbox=False):
+    # DHL hat mit 401 geantwortet. Basic: die Zugangsdaten eine Weile sofort mit "login failed" beantworten, statt
+    # DHL erneut zu fragen. OAuth: nur den Token verwerfen - ob die Zugangsdaten taugen, entscheidet der nächste Abruf.
+    entry = _auth_cache.get(get_cache_key(username, password, sandbox))
+    if entry is not None:
+        entry.auth = None
+        if get_dhl_config().auth_mode != 'oauth':
+            entry.invalid_until = time.monotonic() + get_dhl_config().negative_ttl
+
+
+async def _refresh_periodically(get_client, interval):
+    while True:
+        await asyncio.sleep(interval)
+        config = get_dhl_config()
+        now = time.monotonic()
+        for key, entry in list(_auth_cache.items()):
+            if now - entry.last_used > config.credential_ttl:
+                # Länger nicht benutzte Zugangsdaten (samt Passwort) verwerfen
+                del _auth_cache[key]
+            elif config.auth_mode == 'oauth' and entry.auth is not None and entry.refresh_at <= now \
+                    and entry.pending is None:
+                sandbox, username, _ = key
+                entry.pending = asyncio.ensure_future(fetch_token(get_client(sandbox), username, entry, sandbox))
+                try:
+                    await entry.pending
+                except Exception as e:
+                    logging.error("DHL token refresh for %s failed: %s", username, e, extra={"carrier": "DHL"})
+                finally:
+                    entry.pending = None
+
+
+def start_dhl_token_refresher(get_client):
+    # get_client(sandbox) -> httpx.AsyncClient, damit die Verbindungen des jeweiligen DHL Clients genutzt werden
+    global _refresher_task
+    if _refresher_task is None:
+        interval = float(os.getenv('DHL_TOKEN_REFRESH_INTERVAL', 15))
+        _refresher_task = asyncio.create_task(_refresh_periodically(get_client, interval))
+
+
+async def stop_dhl_token_refresher():
+    global _refresher_task
+    if _refresher_task is not None:
+        _refresher_task.cancel()
+        try:
+            await _refresher_task
+        except asyncio.CancelledError:
+            pass
+        _refresher_task = None
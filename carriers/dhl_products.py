@@ -0,0 +1,73 @@
+import os
+import json
+from dataclasses import dataclass
+from types import MappingProxyType
+
+
+# Intraship Produktcode -> (DHL REST Produkt, Abrechnungsart). Die Abrechnungsart bestimmt das Präfix
+# der Abrechnungsnummer (DHL_BILLING_NUMBER_<ART>_PREFIX), das an die EKP angehängt wird.
+DEFAULT_PRODUCTS = {
+    "EPN": ("V01PAK", "NAT"),  # DHL Paket
+    "BPI": ("V53WPAK", "INTL"),  # Weltpaket
+    "EPI": ("V54EPAK", "INTL"),  # Europaket
+    "KLP": ("V62KP", "KLP"),  # Kleinpaket
+}
+
+
+@dataclass(frozen=True, slots=True)
+class DhlProduct:
+    product: str
+    billing_number: str | None
+
+
+_product_tables = None
+_product_codes = frozenset()
+
+
+def build_product_table(ekp, overrides=None):
+    # overrides: {"EPN": {"product": "V01PAK", "billing_prefix": "0102"} | {"billing_number": "..."}, ...}
+    table = {}
+    for product_code, (product, billing_type) in DEFAULT_PRODUCTS.items():
+        prefix = os.getenv(f"DHL_BILLING_NUMBER_{billing_type}_PREFIX")
+        table[product_code] = DhlProduct(product, ekp + prefix if ekp and prefix else None)
+
+    for product_code, override in (overrides or {}).items():
+        default = table.get(product_code)
+        if not override.get("product") and default is None:
+            raise ValueError(f"DHL product mapping for {product_code} has no product")
+        billing_number = override.get("billing_number")
+        if billing_number is None and override.get("billing_prefix") and ekp:
+            billing_number = ekp + override["billing_prefix"]
+        table[product_code] = DhlProduct(
+            override.get("product") or default.product,
+            billing_number or (default.billing_number if default else None),
+        )
+    return MappingProxyType(table)
+
+
+def load_product_tables():
+    # Einmalig beim Start: Standardtabelle je Umgebung plus kundenspezifische Tabellen aus DHL_PRODUCT_MAPPINGS,
+    # z.B. {"kunde-a": {"EPN": {"billing_prefix": "0102"}}} - Schlüssel ist der Intraship Benutzer
+    global _product_tables, _product_codes
+    client_overrides = json.loads(os.getenv("DHL_PRODUCT_MAPPINGS") or "{}")
+    tables = {}
+    for sandbox in (False, True):
+        ekp = os.getenv("EKP_TEST" if sandbox else "EKP")
+        tables[(None, sandbox)] = build_product_table(ekp)
+        for client, overrides in client_overrides.items():
+            tables[(client, sandbox)] = build_product_table(ekp, overrides)
+    _product_tables = MappingProxyType(tables)
+    _product_codes = frozenset(product_code for table in tables.values() for product_code in table)
+    return _product_tables
+
+
+def get_product_table(username=None, sandbox=False):
+    tables = _product_tables if _product_tables is not None else load_product_tables()
+    return tables.get((username, sandbox)) or tables[(None, sandbox)]
+
+
+def get_product_codes():
+    # Alle Produktcodes der Tabellen (Standard und kundenspezifisch), z.B. um Metrik-Labels zu begrenzen
+    if _product_tables is None:
+        load_product_tables()
+    return _product_codes
@@ -1,62 +1,190 @@
 import os
-import fitz
+import time
+import base64
+import asyncio
+import logging
+import contextvars
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
-import xml.etree.ElementTree as ET
 
 from requests import Session
-from zeep import Client, Transport
+from requests.exceptions import ConnectTimeout, RequestException, Timeout
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.adapters import HTTPAdapter
+from lxml import etree
+from zeep import Client, Plugin, Transport
+from zeep.cache import InMemoryCache, SqliteCache
+from zeep.exceptions import TransportError
 
 from fastapi import HTTPException, Request
 
+from carriers.gls_labels import render_label, shutdown_label_pool, start_label_pool, warm_up_label_pool
+from utils.label_store import get_label_store
+from utils.metrics import POOL_SIZE, UPSTREAM_ERRORS, enter_pool, leave_pool, observe_stage
+from utils.soap_request import ShipmentOrder
+from utils.soap_response import create_creation_state, create_error_state
+from utils.traffic_capture import capture_upstream
+from utils.upstream_guard import get_upstream_guard
+
+
+# Prozessweite Registry: WSDL wird pro URL nur einmal geladen und geparst
+_gls_clients = {}
+_gls_clients_lock = threading.Lock()
+_gls_client_stats = {
+    "client_builds": 0,
+    "last_build_ms": None,
+    "cold_requests": 0,
+    "cold_request_ms": 0.0,
+    "warm_requests": 0,
+    "warm_request_ms": 0.0,
+}
+
+# zeep/requests und PyMuPDF sind synchron - sie laufen in einem begrenzten Thread-Pool,
+# damit ein langsamer GLS Call nicht den Event Loop (und damit alle DHL Requests) blockiert
+_gls_executor = None
+
+
+class GlsSoapClient:
+    def __init__(self, client: Client):
+        self.client = client
+        self.service = client.service
+        # Type Factories einmalig auflösen
+        self.factory = client.type_factory("ns0")
+        self.common = client.type_factory("ns1")
+
+
+class GlsCapturePlugin(Plugin):
+    # Schreibt bei aktivem Mitschnitt (utils/traffic_capture.py) den GLS SOAP Envelope und die Antwort mit.
+    # egress und ingress laufen im selben Executor Thread, dort ist der Kontext des Requests kopiert.
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def egress(self, envelope, http_headers, operation, binding_options):
+        entry = capture_upstream("GLS", operation=operation.name, request=etree.tostring(envelope))
+        self._local.call = (entry, time.perf_counter()) if entry is not None else None
+        return envelope, http_headers
+
+    def ingress(self, envelope, http_headers, operation):
+        call = getattr(self._local, "call", None)
+        if call is not None:
+            entry, start = call
+            entry.update(response=etree.tostring(envelope), duration_ms=round((time.perf_counter() - start) * 1000, 2))
+            self._local.call = None
+        return envelope, http_headers
+
+
+def start_gls_executor():
+    global _gls_executor
+    if _gls_executor is None:
+        _gls_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("GLS_EXECUTOR_WORKERS", 8)),
+            thread_name_prefix="gls"
+        )
+        POOL_SIZE.set(_gls_executor._max_workers, "gls_executor")
+    return _gls_executor
 
-async def create_gls_shipment(soap_request_data, base_url, sandbox=False):
-    gls_soap_api_url = os.getenv('GLS_SOAP_API_URL')
-    gls_client = create_gls_soap_client(gls_soap_api_url)
-    gls_soap_payload = soap_to_gls_soap_data(gls_client, soap_request_data)
-    gls_soap_response = make_gls_soap_call(gls_client, gls_soap_payload, sandbox=sandbox)
-    gls_soap_response_w_url = save_attachment_and_get_url(gls_soap_response, base_url)
-    soap_response = gls_soap_to_soap_data(gls_soap_response_w_url)
-    return soap_response
 
+def shutdown_gls_executor():
+    global _gls_executor
+    if _gls_executor is not None:
+        _gls_executor.shutdown(wait=True)
+        _gls_executor = None
 
-def save_attachment_and_get_url(gls_soap_response, base_url):
-    filename = f"label_{uuid4()}.pdf"
-    label_dir = os.getenv("GLS_LABELS_FOLDER", 'labels')
-    os.makedirs(label_dir, exist_ok=True)
 
-    filepath = os.path.join(label_dir, filename)
+async def run_in_gls_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Kontext (Korrelations-ID) in den Worker Thread mitnehmen
+    context = contextvars.copy_context()
+    enter_pool("gls_executor")
+    try:
+        return await loop.run_in_executor(start_gls_executor(), partial(context.run, func, *args, **kwargs))
+    finally:
+        leave_pool("gls_executor")
+
+
+async def create_gls_shipment(shipment_orders, base_url, sandbox=False, inline_labels=False):
+    # createParcels nimmt genau eine Sendung entgegen - mehrere ShipmentOrder laufen parallel.
+    # Bei nur einer ShipmentOrder wird ein Fehler wie bisher als HTTPException weitergereicht.
+    creation_states = await asyncio.gather(
+        *(create_gls_order_shipment(shipment_order, shipment_order.sequence_number, base_url, sandbox, inline_labels)
+          for shipment_order in shipment_orders),
+        return_exceptions=len(shipment_orders) > 1
+    )
 
-    output = fitz.open()
+    status_code, status_name = "0", "ok"
+    for index, creation_state in enumerate(creation_states):
+        if isinstance(creation_state, Exception):
+            creation_state = create_error_state(creation_state, shipment_orders[index].sequence_number)
+            creation_states[index] = creation_state
+        if status_code == "0" and creation_state["status_code"] != "0":
+            status_code, status_name = creation_state["status_code"], creation_state["status_messages"][0]
 
-    for doc in gls_soap_response.PrintData:
-        # print(doc.Data)
-        pdf_data = doc.Data
-        original = fitz.open(stream=pdf_data, filetype="pdf")
+    return status_code, status_name, creation_states
 
-        page = original[0]
 
-        # Extra margins in points (1 cm = 28.3465 pt)
-        margin_left = 2.8 * 28.3465
-        margin_top = 2 * 28.3465
+async def create_gls_order_shipment(shipment_order, sequence_number, base_url, sandbox=False, inline_labels=False):
+    start = time.perf_counter()
+    gls_soap_api_url = os.getenv('GLS_SOAP_API_URL')
+    try:
+        gls_client, cold = await load_gls_soap_client(gls_soap_api_url, sandbox)
+    except Exception as e:
+        record_gls_upstream_error(e)
+        raise
+    stage_start = time.perf_counter()
+    gls_soap_payload = soap_to_gls_soap_data(gls_client, shipment_order)
+    observe_stage("mapping", "GLS", stage_start)
 
-        label_width = 15.0 * 28.3465  # 15 cm in points
-        label_height = 20.8 * 28.3465  # 10 cm in points
+    stage_start = time.perf_counter()
+    try:
+        # createParcels legt Sendungen an - keine Wiederholung, außer der Verbindungsaufbau schlug fehl
+        gls_soap_response = await get_upstream_guard("GLS", sandbox).call(
+            partial(run_in_gls_executor, make_gls_soap_call, gls_client, gls_soap_payload, sandbox=sandbox),
+            is_failure_error=is_gls_failure_error,
+            is_retry_safe_error=is_gls_retry_safe_error,
+        )
+    except Exception as e:
+        record_gls_upstream_error(e)
+        raise
+    finally:
+        observe_stage("upstream", "GLS", stage_start)
+
+    stage_start = time.perf_counter()
+    label_pdf = await render_label([doc.Data for doc in gls_soap_response.PrintData], executor=start_gls_executor())
+    observe_stage("relayout", "GLS", stage_start)
+    if inline_labels:
+        # Label direkt aus dem Speicher in die Antwort - kein Schreiben auf die Platte, kein zweiter Request
+        gls_soap_response.PrintData = []
+        gls_soap_response.LabelURL = None
+        creation_state = gls_soap_to_soap_data(gls_soap_response, sequence_number,
+                                               xml_label=base64.b64encode(label_pdf).decode("ascii"))
+    else:
+        gls_soap_response_w_url = await save_attachment_and_get_url(gls_soap_response, label_pdf, base_url)
+        creation_state = gls_soap_to_soap_data(gls_soap_response_w_url, sequence_number)
+    record_gls_request_timing(cold, (time.perf_counter() - start) * 1000)
+    return creation_state
 
-        old_width, old_height = page.rect.width, page.rect.height
-        new_width = old_width + margin_left
-        new_height = old_height + margin_top
 
-        # Create new PDF with larger page size
-        # output = fitz.open()
-        new_page = output.new_page(height=label_height, width=label_width)
+def record_gls_request_timing(cold, duration_ms):
+    kind = "cold" if cold else "warm"
+    _gls_client_stats[f"{kind}_requests"] += 1
+    _gls_client_stats[f"{kind}_request_ms"] += duration_ms
+    logging.debug("GLS request (%s) took %.1f ms", kind, duration_ms)
 
-        # Insert the original page content at the offset defined by the margins
-        new_page.show_pdf_page(
-            fitz.Rect(margin_left, margin_top, old_width + margin_left, new_height),
-            original, 0
-        )
 
-        output.save(filepath)
+def get_gls_client_stats():
+    stats = dict(_gls_client_stats)
+    for kind in ("cold", "warm"):
+        count = stats[f"{kind}_requests"]
+        stats[f"{kind}_request_avg_ms"] = stats[f"{kind}_request_ms"] / count if count else None
+    return stats
+
+
+async def save_attachment_and_get_url(gls_soap_response, label_pdf, base_url):
+    filename = f"label_{uuid4()}.pdf"
+    await get_label_store().put(filename, label_pdf)
 
     # Exchange PrintData Data with the URL
     gls_soap_response.PrintData = []
@@ -64,88 +192,168 @@ def save_attachment_and_get_url(gls_soap_response, base_url):
     return gls_soap_response
 
 
+async def load_gls_soap_client(gls_soap_api_url, sandbox=False):
+    # Wie get_gls_soap_client, aber das Laden des WSDL ist ein Upstream Call wie createParcels und läuft über
+    # denselben Guard: bei offenem Circuit sofort abgelehnt, statt einen Executor Thread bis GLS_TIMEOUT zu blockieren
+    gls_client = _gls_clients.get(gls_soap_api_url)
+    if gls_client is not None:
+        return gls_client, False
+    return await get_upstream_guard("GLS", sandbox).call(
+        partial(run_in_gls_executor, get_gls_soap_client, gls_soap_api_url),
+        idempotent=True,
+        is_failure_error=is_gls_failure_error,
+    )
+
+
+def get_gls_soap_client(gls_soap_api_url):
+    # Liefert (client, cold) - cold ist True, wenn der Client in diesem Aufruf erzeugt wurde
+    gls_client = _gls_clients.get(gls_soap_api_url)
+    if gls_client is not None:
+        return gls_client, False
+
+    with _gls_clients_lock:
+        gls_client = _gls_clients.get(gls_soap_api_url)
+        if gls_client is not None:
+            return gls_client, False
+
+        start = time.perf_counter()
+        gls_client = GlsSoapClient(create_gls_soap_client(gls_soap_api_url))
+        build_ms = (time.perf_counter() - start) * 1000
+        _gls_client_stats["client_builds"] += 1
+        _gls_client_stats["last_build_ms"] = build_ms
+        logging.info("GLS SOAP client for %s built in %.1f ms", gls_soap_api_url, build_ms)
+
+        _gls_clients[gls_soap_api_url] = gls_client
+        return gls_client, True
+
+
+def preload_gls_soap_client():
+    # Vor dem fork der Worker (serve.py): WSDL einmal laden und parsen, alle Worker erben den fertigen Client.
+    # Die Verbindungen der Session werden geschlossen - ein Socket darf nicht von mehreren Prozessen genutzt werden.
+    gls_soap_api_url = os.getenv('GLS_SOAP_API_URL')
+    if not gls_soap_api_url:
+        return None
+    gls_client, _ = get_gls_soap_client(gls_soap_api_url)
+    gls_client.client.transport.session.close()
+    return gls_client
+
+
+# Hooks für carriers/registry.py
+
+def preload_carrier():
+    preload_gls_soap_client()
+
+
+async def start_carrier():
+    start_gls_executor()
+    start_label_pool()
+
+
+async def warm_up_carrier():
+    gls_soap_api_url = os.getenv('GLS_SOAP_API_URL')
+    if gls_soap_api_url:
+        await run_in_gls_executor(get_gls_soap_client, gls_soap_api_url)
+    await warm_up_label_pool()
+
+
+async def stop_carrier():
+    shutdown_gls_executor()
+    shutdown_label_pool()
+
+
+def get_gls_wsdl_cache():
+    timeout = int(os.getenv("GLS_WSDL_CACHE_TTL", 86400))
+    cache_path = os.getenv("GLS_WSDL_CACHE_PATH")
+    if cache_path:
+        return SqliteCache(path=cache_path, timeout=timeout)
+    return InMemoryCache(timeout=timeout)
+
+
 def create_gls_soap_client(gls_soap_api_url) -> Client:
     session = Session()
+    pool_size = int(os.getenv("GLS_POOL_MAXSIZE", 10))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
     session.headers.update({
         "Authorization": "Basic " + os.getenv("GLS_AUTH"),
         "Requester": "bizness rocket GmbH"
     })
     session.verify = False
 
-    client = Client(wsdl=gls_soap_api_url, transport=Transport(session=session))
+    timeout = float(os.getenv("GLS_TIMEOUT", 30))
+    # Ohne operation_timeout wartet requests unbegrenzt auf eine hängende GLS Antwort
+    transport = Transport(session=session, cache=get_gls_wsdl_cache(), timeout=timeout,
+                          operation_timeout=(float(os.getenv("GLS_CONNECT_TIMEOUT", 5)), timeout))
+    client = Client(wsdl=gls_soap_api_url, transport=transport, plugins=[GlsCapturePlugin()])
 
     return client
 
 
-def soap_to_gls_soap_data(gls_client, xml_data):
-    shipment_order = xml_data.get("ShipmentOrder")
-    if not shipment_order:
-        raise HTTPException(status_code=400, detail="Invalid SOAP request: ShipmentOrder missing.")
-
-    shipment = shipment_order.get("Shipment")
-    if not shipment:
-        raise HTTPException(status_code=400, detail="Invalid SOAP request: Shipment missing.")
-
-    shipment_details = shipment.get("ShipmentDetails")
+def soap_to_gls_soap_data(gls_client: GlsSoapClient, shipment_order: ShipmentOrder):
+    shipment_details = shipment_order.shipment_details
     if not shipment_details:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: ShipmentDetails missing.")
 
-    receiver = shipment.get("Receiver")
+    receiver = shipment_order.receiver
     if not receiver:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Receiver missing.")
 
-    factory = gls_client.type_factory("ns0")
-    common = gls_client.type_factory("ns1")
+    if not receiver.address or not receiver.communication:
+        raise HTTPException(status_code=400, detail="Invalid SOAP request: Receiver incomplete.")
+
+    factory = gls_client.factory
+    common = gls_client.common
 
     consignee = {}
-    company = receiver.get("Company")
-    if company:
-        inner_company = company.get("ns1:Company")
-        inner_person = company.get("ns1:Person")
+    if receiver.has_company:
+        inner_company = receiver.company
+        inner_person = receiver.person
         if inner_company:
-            consignee["name1"] = inner_company.get("ns1:name1", '')
-            if inner_company.get("ns1:name2"):
-                consignee["name2"] = inner_company.get("ns1:name2")
+            consignee["name1"] = inner_company.name1 or ''
+            if inner_company.name2:
+                consignee["name2"] = inner_company.name2
         elif inner_person:
-            consignee["name1"] = inner_person.get("ns1:firstname", '') + " " + inner_person.get("ns1:lastname", '')
+            consignee["name1"] = (inner_person.firstname or '') + " " + (inner_person.lastname or '')
         else:
             raise HTTPException(status_code=400, detail="Invalid SOAP request: Inner Company / Person missing.")
     else:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Company missing.")
 
-    # consignee['addressStreet'] = receiver['Address']['ns1:streetName']
-    consignee['addressHouse'] = receiver.get('Address').get('ns1:streetNumber', '')
-    additional_address_information = receiver.get('Address').get('ns1:additionalAddressInformation', '')
+    address = receiver.address
+    # consignee['addressStreet'] = address.street_name
+    consignee['addressHouse'] = address.street_number or ''
+    additional_address_information = address.additional_address_information
     if additional_address_information:
         if not consignee.get("name2"):
             consignee['name2'] = additional_address_information
         else:
             consignee['name3'] = additional_address_information
 
-    care_of_name = receiver.get('Address').get('ns1:careOfName', '')
+    care_of_name = address.care_of_name
     if care_of_name:
         if not consignee.get("name2"):
             consignee['name2'] = care_of_name
         else:
             consignee['name3'] = care_of_name
 
-    postal_code_german_destination = receiver['Address']['ns1:Zip'].get('ns1:germany')
+    postal_code_german_destination = address.zip_germany
     if postal_code_german_destination:
         postal_code = postal_code_german_destination
     else:
-        postal_code = receiver['Address']['ns1:Zip']['ns1:other']
+        postal_code = address.zip_other
 
     if not postal_code:
         raise HTTPException(status_code=400, detail="Invalid SOAP request: Postal code missing.")
     else:
         consignee['postalCode'] = postal_code
 
-    consignee['city'] = receiver['Address']['ns1:city']
+    consignee['city'] = address.city
 
-    country_iso_code = receiver['Address']['ns1:Origin']['ns1:countryISOCode']
+    country_iso_code = address.country_iso_code
     consignee['country'] = country_iso_code
 
-    consignee['contactName'] = receiver['Communication']['ns1:contactPerson']
+    consignee['contactName'] = receiver.communication.contact_person
     if consignee.get('contactName') and len(consignee['contactName']) > 3:
         # consignee['contactName'] = consignee['name1']
         if not consignee.get("name2"):
@@ -154,7 +362,7 @@ def soap_to_gls_soap_data(gls_client, xml_data):
             consignee['name3'] = consignee['contactName']
         # del (consignee['contactName'])
 
-    consignee['phone'] = receiver['Communication']['ns1:phone']
+    consignee['phone'] = receiver.communication.phone
 
     #    if 'Packstation' in consignee['addressStreet']:
     #        consignee['name2'] = consignee['contactName']
@@ -179,12 +387,12 @@ def soap_to_gls_soap_data(gls_client, xml_data):
     shipper = common.Shipper(ContactID=os.getenv("GLS_CLIENT_ID"))
 
     # Paketinhalt
-    weight = float(shipment_details.get('ShipmentItem').get('WeightInKG'))
+    weight = float(shipment_details.weight_in_kg)
     shipment_unit = factory.ShipmentUnit(Weight=weight)
 
     # Gesamt-Sendung
     shipment = factory.Shipment(
-        ShipmentReference=shipment_details.get('CustomerReference'),
+        ShipmentReference=shipment_details.customer_reference,
         Product='Parcel',
         Consignee=consignee,
         Shipper=shipper,
@@ -194,8 +402,8 @@ def soap_to_gls_soap_data(gls_client, xml_data):
     return shipment
 
 
-def make_gls_soap_call(gls_client, gls_soap_payload, sandbox=False):
-    factory = gls_client.type_factory("ns0")
+def make_gls_soap_call(gls_client: GlsSoapClient, gls_soap_payload, sandbox=False):
+    factory = gls_client.factory
 
     # Druckoptionen
     printing_options = factory.PrintingOptions(
@@ -207,79 +415,54 @@ def make_gls_soap_call(gls_client, gls_soap_payload, sandbox=False):
 
     try:
         # service = client.bind("ShipmentProcessingPortType", "ShipmentProcessingServiceSoapBinding")
-        service = gls_client.service
-        result = service.createParcels(
+        result = gls_client.service.createParcels(
             Shipment=gls_soap_payload,
             PrintingOptions=printing_options
         )
 
         return result
     except Exception as e:
-        print("Fehler beim Erstellen des Versandlabels:", str(e))
-        raise HTTPException(status_code=500, detail=f"Error creating GLS shipment: {str(e)}")
+        logging.error("Fehler beim Erstellen des Versandlabels: %s", e, extra={"carrier": "GLS"})
+        raise HTTPException(status_code=500, detail=f"Error creating GLS shipment: {str(e)}") from e
+
+
+def is_gls_failure_error(error):
+    # Nur Transportfehler zählen für den Circuit Breaker - ein SOAP Fault (z.B. ungültige Adresse) ist eine Antwort
+    cause = error.__cause__ or error
+    return isinstance(cause, (RequestException, TransportError))
+
+
+def is_gls_retry_safe_error(error):
+    return isinstance(error.__cause__ or error, ConnectTimeout)
+
+
+def record_gls_upstream_error(error):
+    kind = get_gls_error_kind(error)
+    if kind is not None:
+        UPSTREAM_ERRORS.inc("GLS", kind)
+
+
+def get_gls_error_kind(error):
+    # Art des Fehlers für UPSTREAM_ERRORS (wie bei DHL); None für SOAP Faults und lokale Fehler beim Aufbau
+    # des Requests - die liegen an den Daten des Clients, nicht an GLS
+    cause = error.__cause__ or error
+    if isinstance(cause, Timeout):
+        return "timeout"
+    if isinstance(cause, RequestsConnectionError):
+        return "connect"
+    if isinstance(cause, TransportError):
+        return f"http_{cause.status_code}"
+    if isinstance(cause, RequestException):
+        return "error"
+    return None
 
 
-def gls_soap_to_soap_data(gls_soap_response):
-    print(gls_soap_response)
+def gls_soap_to_soap_data(gls_soap_response, sequence_number, xml_label=None):
+    logging.debug("GLS SOAP response: %s", gls_soap_response)
 
-    status_code = 0
+    status_code = "0"
     status_name = 'ok'
     shipment_no = gls_soap_response.ParcelData[0].TrackID
 
-    # Namensräume definieren
-    namespaces = {
-        'soapenv': "http://schemas.xmlsoap.org/soap/envelope/",
-        'cis': "http://dhl.de/webservice/cisbase",
-        'is': "http://de.ws.intraship"
-    }
-    # Alle Namensräume für die Verwendung im Dokument registrieren
-    for ns in namespaces:
-        ET.register_namespace(ns, namespaces[ns])
-
-    # Wurzelelement erstellen
-    envelope = ET.Element(f"{{{namespaces['soapenv']}}}Envelope")
-
-    # Header und Body erstellen
-    header = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Header")
-    body = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Body")
-
-    # CreateShipmentResponse Element
-    create_shipment_response = ET.SubElement(body, f"{{{namespaces['is']}}}CreateShipmentResponse")
-
-    # Version Element
-    version = ET.SubElement(create_shipment_response, f"{{{namespaces['cis']}}}Version")
-    ET.SubElement(version, f"{{{namespaces['cis']}}}majorRelease").text = "1"
-    ET.SubElement(version, f"{{{namespaces['cis']}}}minorRelease").text = "0"
-    ET.SubElement(version, f"{{{namespaces['cis']}}}build").text = "14"
-
-    # Status Element
-    status = ET.SubElement(create_shipment_response, "status")
-    ET.SubElement(status, "StatusCode").text = status_code
-    ET.SubElement(status, "StatusMessage").text = status_name
-
-    # ShipmentNumber Element
-    #if items:
-        # CreationState Element
-    creation_state = ET.SubElement(create_shipment_response, "CreationState")
-    ET.SubElement(creation_state, "StatusCode").text = status_code
-    ET.SubElement(creation_state, "StatusMessage").text = status_name
-    #if validation_messages:
-    #    for validation_message in validation_messages:
-    #        ET.SubElement(creation_state, "StatusMessage").text = validation_message
-
-    ET.SubElement(creation_state, "SequenceNumber").text = "1"
-    shipment_number = ET.SubElement(creation_state, "ShipmentNumber")
-    ET.SubElement(shipment_number, f"{{{namespaces['cis']}}}shipmentNumber").text = shipment_no
-
-    # PieceInformation Element
-    piece_information = ET.SubElement(creation_state, "PieceInformation")
-    piece_number = ET.SubElement(piece_information, "PieceNumber")
-    ET.SubElement(piece_number, f"{{{namespaces['cis']}}}licensePlate").text = shipment_no
-
-    # Labelurl
-    if gls_soap_response.LabelURL:
-        ET.SubElement(creation_state, "LabelURL").text = gls_soap_response.LabelURL
-
-    # Baum in eine Zeichenfolge umwandeln
-    xml_str = ET.tostring(envelope, encoding="utf-8")
-    return xml_str
+    return create_creation_state(status_code, [status_name], sequence_number, shipment_number=shipment_no,
+                                 label_url=gls_soap_response.LabelURL, label_element="LabelURL", xml_label=xml_label)
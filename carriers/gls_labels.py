@@ -0,0 +1,109 @@
+import os
+import json
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+from utils.metrics import POOL_SIZE, enter_pool, leave_pool
+
+
+CM = 28.3465  # 1 cm in points
+
+# Größe des Zielformats und Verschiebung des GLS Labels darauf (alle Werte in cm)
+LABEL_TEMPLATES = {
+    "default": {"width": 15.0, "height": 20.8, "margin_left": 2.8, "margin_top": 2.0},
+    "a6": {"width": 10.5, "height": 14.8, "margin_left": 0.0, "margin_top": 0.0},
+    "a5": {"width": 14.8, "height": 21.0, "margin_left": 2.0, "margin_top": 2.0},
+}
+
+_label_pool = None
+
+
+def get_label_templates():
+    templates = dict(LABEL_TEMPLATES)
+    # Eigene Templates als JSON, z.B. {"zebra": {"width": 10, "height": 15, "margin_left": 0.5, "margin_top": 0.5}}
+    custom_templates = os.getenv("GLS_LABEL_TEMPLATES")
+    if custom_templates:
+        templates.update(json.loads(custom_templates))
+    return templates
+
+
+def get_label_template(name=None):
+    name = name or os.getenv("GLS_LABEL_TEMPLATE", "default")
+    templates = get_label_templates()
+    if name not in templates:
+        raise ValueError(f"Unknown GLS label template: {name}")
+    return templates[name]
+
+
+def relayout_label(pdf_documents, template):
+    # Läuft im Prozess-Pool: nimmt die rohen PrintData PDFs einer Sendung und liefert ein PDF mit einer Seite
+    # pro Packstück zurück. Gespeichert wird erst danach, genau einmal pro Sendung.
+    margin_left = template["margin_left"] * CM
+    margin_top = template["margin_top"] * CM
+    label_width = template["width"] * CM
+    label_height = template["height"] * CM
+
+    output = fitz.open()
+    for pdf_data in pdf_documents:
+        original = fitz.open(stream=pdf_data, filetype="pdf")
+        page = original[0]
+
+        old_width, old_height = page.rect.width, page.rect.height
+        new_page = output.new_page(height=label_height, width=label_width)
+
+        # Insert the original page content at the offset defined by the margins
+        new_page.show_pdf_page(
+            fitz.Rect(margin_left, margin_top, old_width + margin_left, old_height + margin_top),
+            original, 0
+        )
+        original.close()
+
+    label_pdf = output.tobytes()
+    output.close()
+    return label_pdf
+
+
+def start_label_pool():
+    global _label_pool
+    workers = int(os.getenv("GLS_LABEL_WORKERS") or os.cpu_count() or 1)
+    if _label_pool is None and workers > 0:
+        # spawn statt fork, da der Server-Prozess bereits Threads (Executor, Event Loop) besitzt
+        _label_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        POOL_SIZE.set(workers, "gls_labels")
+    return _label_pool
+
+
+def shutdown_label_pool():
+    global _label_pool
+    if _label_pool is not None:
+        _label_pool.shutdown(wait=True)
+        _label_pool = None
+
+
+def _get_worker_pid():
+    return os.getpid()
+
+
+async def warm_up_label_pool():
+    # Startet alle Prozesse des Pools (spawn, Import von PyMuPDF) vor dem ersten Label
+    pool = start_label_pool()
+    if pool is None:
+        return 0
+    loop = asyncio.get_running_loop()
+    pids = await asyncio.gather(*(loop.run_in_executor(pool, _get_worker_pid) for _ in range(pool._max_workers)))
+    return len(set(pids))
+
+
+async def render_label(pdf_documents, template=None, executor=None):
+    template = template or get_label_template()
+    pool = start_label_pool()
+    loop = asyncio.get_running_loop()
+    # GLS_LABEL_WORKERS=0: kein Prozess-Pool, das Rendering läuft im übergebenen (Thread-)Executor
+    enter_pool("gls_labels" if pool else "gls_executor")
+    try:
+        return await loop.run_in_executor(pool or executor, relayout_label, list(pdf_documents), template)
+    finally:
+        leave_pool("gls_labels" if pool else "gls_executor")
@@ -0,0 +1,98 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+
+from fastapi import HTTPException
+
+
+# Carrier Code -> Modul. Importiert wird erst beim ersten Zugriff: GLS zieht zeep, lxml, requests und PyMuPDF nach,
+# eine reine DHL Installation (ENABLED_CARRIERS=DHL) braucht davon nichts.
+# Jedes Modul stellt preload_carrier(), start_carrier(), warm_up_carrier() und stop_carrier() bereit.
+CARRIER_MODULES = {
+    "DHL": "carriers.dhl",
+    "GLS": "carriers.gls",
+}
+
+_carriers = {}
+_started = {}
+_start_lock = None
+
+
+def get_enabled_carriers():
+    value = os.getenv("ENABLED_CARRIERS", ",".join(CARRIER_MODULES))
+    return [code for code in (entry.strip().upper() for entry in value.split(",")) if code in CARRIER_MODULES]
+
+
+def import_carrier(code):
+    # Import ohne Start (Pools, Tasks) - z.B. im Master von serve.py vor dem fork
+    carrier = _carriers.get(code)
+    if carrier is None:
+        if code not in get_enabled_carriers():
+            raise HTTPException(status_code=400, detail=f"Carrier {code} is not enabled.")
+        start = time.perf_counter()
+        carrier = _carriers[code] = importlib.import_module(CARRIER_MODULES[code])
+        logging.info("Carrier %s loaded in %.1f ms", code, (time.perf_counter() - start) * 1000)
+    return carrier
+
+
+async def get_carrier(code):
+    # Liefert das Carrier-Modul; beim ersten Zugriff wird es importiert und gestartet
+    carrier = _started.get(code)
+    if carrier is not None:
+        return carrier
+    global _start_lock
+    if _start_lock is None:
+        _start_lock = asyncio.Lock()
+    async with _start_lock:
+        if code not in _started:
+            carrier = import_carrier(code)
+            await carrier.start_carrier()
+            _started[code] = carrier
+    return _started[code]
+
+
+def get_loaded_carrier(code):
+    # Für Statistiken: None, solange der Carrier nicht benutzt wurde - löst keinen Import aus
+    return _started.get(code)
+
+
+def preload_carriers():
+    for code in get_enabled_carriers():
+        try:
+            import_carrier(code).preload_carrier()
+        except Exception as e:
+            # z.B. GLS nicht erreichbar: der Worker lädt beim ersten Request selbst
+            logging.warning("Carrier %s preload failed: %s", code, e)
+
+
+async def warm_up_carriers():
+    # WSDL, Produkttabellen, Verbindungen und Label-Prozesse vor dem ersten Request statt in ihm
+    async def warm_up(code):
+        start = time.perf_counter()
+        try:
+            await (await get_carrier(code)).warm_up_carrier()
+            logging.info("Carrier %s warmed up in %.1f ms", code, (time.perf_counter() - start) * 1000)
+        except Exception as e:
+            logging.warning("Carrier %s warm-up failed: %s", code, e)
+
+    await asyncio.gather(*(warm_up(code) for code in get_enabled_carriers()))
+
+
+async def start_carriers():
+    # Aus dem Lifespan: ohne STARTUP_WARMUP wird nichts geladen, jeder Carrier startet mit seinem ersten Request
+    unknown = [entry.strip() for entry in os.getenv("ENABLED_CARRIERS", "").split(",")
+               if entry.strip() and entry.strip().upper() not in CARRIER_MODULES]
+    if unknown:
+        logging.warning("Unknown carriers in ENABLED_CARRIERS: %s", ", ".join(unknown))
+    if os.getenv("STARTUP_WARMUP", "false").lower() in ("1", "true", "yes"):
+        await warm_up_carriers()
+
+
+async def stop_carriers():
+    global _start_lock
+    while _started:
+        _, carrier = _started.popitem()
+        await carrier.stop_carrier()
+    _start_lock = None
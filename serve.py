@@ -0,0 +1,136 @@
+"""
+Produktiver Start des Proxys mit mehreren Worker-Prozessen (Standard: ein Worker je verfügbarem CPU-Kern).
+
+    python serve.py
+    python serve.py --workers 4 --port 8000
+
+Mit gunicorn (Linux/macOS) lädt der Master Konfiguration, Produkttabellen und den GLS WSDL einmal vor dem fork
+(preload_shared_state), die Worker sind uvicorn Worker. Ohne gunicorn startet uvicorn die Worker selbst - dann
+lädt jeder Worker alles neu. Idempotenz-Cache und Sendungsjournal liegen in SQLite Dateien, die alle Worker teilen;
+Labels im gemeinsamen GLS_LABELS_FOLDER. Zugangsdaten, DHL Tokens und Circuit Breaker gelten je Worker.
+"""
+import os
+import sys
+import logging
+import argparse
+
+from dotenv import load_dotenv
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # Windows oder nicht installiert
+    BaseApplication = None
+
+
+def get_default_workers():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_worker_class():
+    try:
+        from uvicorn_worker import UvicornWorker
+    except ImportError:
+        from uvicorn.workers import UvicornWorker
+
+    class ProxyWorker(UvicornWorker):
+        # Forwarded Header wertet ProxiedHeadersMiddleware aus - uvicorn darf den Client nicht vorher umschreiben
+        CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "proxy_headers": False}
+
+    return ProxyWorker
+
+
+def prepare_environment(workers):
+    # Muss vor dem Import von app passieren - die Singletons lesen ihre Einstellungen beim ersten Zugriff
+    if workers < 2:
+        return
+    if not os.getenv("GLS_LABEL_WORKERS"):
+        # Jeder Worker startet einen eigenen Label-Pool - ohne Vorgabe je Worker einen Prozess pro Kern, also
+        # Kerne² Prozesse. Die Kerne werden stattdessen auf die Worker aufgeteilt.
+        os.environ["GLS_LABEL_WORKERS"] = str(max(1, get_default_workers() // workers))
+    if os.getenv("LABEL_STORE", "local") == "memory":
+        raise SystemExit("LABEL_STORE=memory only works with a single worker - the label download may hit "
+                         "another worker than the one that stored it")
+    idempotency_enabled = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() in ("1", "true", "yes")
+    if idempotency_enabled and not os.getenv("IDEMPOTENCY_DB_PATH"):
+        # Ohne gemeinsame Datei würde jeder Worker eine Wiederholung erneut beim Carrier anlegen
+        os.environ["IDEMPOTENCY_DB_PATH"] = "cache/idempotency.sqlite"
+    if os.getenv("LEDGER_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        # Ohne gemeinsames Journal erfährt ein Worker nichts von den Stornos der anderen und würde aus seinem Index
+        # stornierte Labels ausliefern - dann fragt getLabelDD immer den Carrier
+        os.environ["SHIPMENT_INDEX_MAX_ENTRIES"] = "0"
+
+
+def post_fork(server, worker):
+    # Der Listener Thread des Loggings existiert nach dem fork nur im Master
+    from utils.structured_logging import setup_logging
+    setup_logging()
+
+
+if BaseApplication is not None:
+    class ProxyApplication(BaseApplication):
+
+        def __init__(self, options, preload=True):
+            self.options = options
+            self.preload = preload
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import app
+            if self.preload:
+                app.preload_shared_state()
+            return app.app
+
+
+def run_gunicorn(host, port, workers, preload):
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": get_worker_class(),
+        "preload_app": preload,
+        "post_fork": post_fork,
+        # Ein GLS createParcels darf GLS_TIMEOUT ausschöpfen, ohne dass der Master den Worker abschießt
+        "timeout": int(os.getenv("SERVE_WORKER_TIMEOUT", 120)),
+        "graceful_timeout": int(os.getenv("SERVE_GRACEFUL_TIMEOUT", 30)),
+        "keepalive": int(os.getenv("SERVE_KEEPALIVE", 5)),
+    }
+    ProxyApplication(options, preload=preload).run()
+
+
+def run_uvicorn(host, port, workers, preload):
+    import uvicorn
+    if workers == 1:
+        import app
+        if preload:
+            app.preload_shared_state()
+        uvicorn.run(app.app, host=host, port=port, proxy_headers=False)
+        return
+    logging.warning("gunicorn is not installed - starting uvicorn workers without preloaded state")
+    uvicorn.run("app:app", host=host, port=port, workers=workers, proxy_headers=False)
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=os.getenv("SERVE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVE_PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", 0)) or get_default_workers(),
+                        help="Worker-Prozesse (Standard: verfügbare CPU-Kerne)")
+    parser.add_argument("--no-preload", action="store_true", help="Jeder Worker lädt Konfiguration und WSDL selbst")
+    args = parser.parse_args()
+
+    prepare_environment(args.workers)
+    if BaseApplication is not None and args.workers > 1:
+        run_gunicorn(args.host, args.port, args.workers, not args.no_preload)
+    else:
+        run_uvicorn(args.host, args.port, args.workers, not args.no_preload)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
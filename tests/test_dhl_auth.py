@@ -0,0 +1,74 @@
+import os
+import unittest
+from unittest import mock
+
+import httpx
+
+from carriers import dhl_auth
+from utils import upstream_guard
+from utils.upstream_guard import UpstreamUnavailableError
+
+ENVIRONMENT = {
+    "DHL_AUTH_MODE": "oauth",
+    "DHL_API_KEY": "key",
+    "DHL_API_SECRET": "secret",
+    "DHL_PRODUCTION_TOKEN_URL": "https://dhl.test/token",
+    "DHL_SANDBOX_TOKEN_URL": "https://dhl.test/sandbox/token",
+    "DHL_MAX_RETRIES": "0",
+}
+
+
+class FetchTokenTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, ENVIRONMENT)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        dhl_auth.load_dhl_config()
+        dhl_auth._auth_cache.clear()
+        upstream_guard._guards.clear()
+        self.addCleanup(dhl_auth._auth_cache.clear)
+        self.addCleanup(upstream_guard._guards.clear)
+        self.addCleanup(setattr, dhl_auth, "_dhl_config", None)
+
+    def get_client(self, status_code, **kwargs):
+        transport = httpx.MockTransport(lambda request: httpx.Response(status_code, **kwargs))
+        client = httpx.AsyncClient(transport=transport)
+        self.addAsyncCleanup(client.aclose)
+        return client
+
+    async def test_unavailable_token_endpoint_is_upstream_unavailable(self):
+        client = self.get_client(503, text="<html>Service Unavailable</html>", headers={"Retry-After": "7"})
+        with self.assertRaises(UpstreamUnavailableError) as context:
+            await dhl_auth.get_dhl_auth(client, "user", "password")
+        self.assertEqual(context.exception.upstream, "dhl_production")
+        self.assertEqual(context.exception.retry_after, 7.0)
+
+    async def test_rate_limited_token_endpoint_is_upstream_unavailable(self):
+        client = self.get_client(429)
+        with self.assertRaises(UpstreamUnavailableError):
+            await dhl_auth.get_dhl_auth(client, "user", "password", sandbox=True)
+
+    async def test_unreachable_token_endpoint_is_upstream_unavailable(self):
+        def refuse(request):
+            raise httpx.ConnectError("connection refused", request=request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(refuse))
+        self.addAsyncCleanup(client.aclose)
+        with self.assertRaises(UpstreamUnavailableError):
+            await dhl_auth.get_dhl_auth(client, "user", "password")
+
+    async def test_rejected_credentials_are_login_failure(self):
+        client = self.get_client(401, text="Unauthorized")
+        with self.assertRaises(dhl_auth.InvalidCredentialsError) as context:
+            await dhl_auth.get_dhl_auth(client, "user", "wrong")
+        self.assertEqual(context.exception.detail, "Login failed.")
+
+    async def test_token_is_used_as_bearer_header(self):
+        client = self.get_client(200, json={"access_token": "abc", "expires_in": 1800})
+        auth = await dhl_auth.get_dhl_auth(client, "user", "password")
+        self.assertEqual(auth, {"Authorization": "Bearer abc"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import unittest
+from unittest import mock
+
+from requests.exceptions import ConnectTimeout
+
+from carriers import gls
+from utils import upstream_guard
+from utils.upstream_guard import UpstreamUnavailableError
+
+WSDL_URL = "https://gls.test/backend/ShipmentProcessingService/ShipmentProcessingPortType?wsdl"
+
+
+class LoadGlsSoapClientTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {"GLS_CIRCUIT_FAILURE_THRESHOLD": "2", "GLS_MAX_RETRIES": "0"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        upstream_guard._guards.clear()
+        self.addCleanup(upstream_guard._guards.clear)
+        self.addCleanup(gls.shutdown_gls_executor)
+        self.calls = 0
+
+    def unreachable_wsdl(self, url):
+        self.calls += 1
+        raise ConnectTimeout(f"Connection to {url} timed out")
+
+    async def test_open_circuit_rejects_without_loading_the_wsdl(self):
+        with mock.patch.object(gls, "get_gls_soap_client", self.unreachable_wsdl):
+            for _ in range(2):
+                with self.assertRaises(ConnectTimeout):
+                    await gls.load_gls_soap_client(WSDL_URL)
+            with self.assertRaises(UpstreamUnavailableError):
+                await gls.load_gls_soap_client(WSDL_URL)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(upstream_guard.get_upstream_guard("GLS").breaker.state, "open")
+
+    async def test_loaded_client_bypasses_the_guard(self):
+        client = object()
+        with mock.patch.dict(gls._gls_clients, {WSDL_URL: client}):
+            guard = upstream_guard.get_upstream_guard("GLS")
+            guard.breaker.state, guard.breaker.opened_at = "open", float("inf")
+            self.assertEqual(await gls.load_gls_soap_client(WSDL_URL), (client, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
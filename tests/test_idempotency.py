@@ -0,0 +1,55 @@
+import unittest
+
+from utils.idempotency import IdempotencyCache
+from utils.soap_response import build_create_shipment_response, create_creation_state, has_only_created_shipments
+
+
+def build_response(*status_codes):
+    states = [create_creation_state(status_code, ["ok" if status_code == "0" else "error"], str(index),
+                                    shipment_number=f"00340434000000000{index}" if status_code == "0" else None)
+              for index, status_code in enumerate(status_codes, 1)]
+    return build_create_shipment_response(status_codes[0], "ok", states)
+
+
+class IdempotencyCacheTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_partially_failed_batch_is_not_cached(self):
+        cache = IdempotencyCache()
+        responses = [build_response("0", "1000"), build_response("0", "0")]
+        calls = []
+
+        async def create():
+            calls.append(1)
+            return responses[len(calls) - 1]
+
+        self.assertEqual(await cache.run("key", create, cacheable=has_only_created_shipments), responses[0])
+        # Die Wiederholung versucht es erneut, statt den Fehler des zweiten Auftrags aus dem Cache zu liefern
+        self.assertEqual(await cache.run("key", create, cacheable=has_only_created_shipments), responses[1])
+        self.assertEqual(await cache.run("key", create, cacheable=has_only_created_shipments), responses[1])
+        self.assertEqual(len(calls), 2)
+
+    async def test_memory_is_bounded_by_bytes(self):
+        cache = IdempotencyCache(max_bytes=250)
+        for index in range(5):
+            await cache.put(f"key{index}", bytes(100), references=[f"ref{index}"])
+        self.assertEqual(list(cache._entries), ["key3", "key4"])
+        self.assertEqual(cache._bytes, 200)
+        await cache.forget(["ref4"])
+        self.assertEqual(cache._bytes, 100)
+        # Eine einzelne zu große Antwort bleibt trotzdem - die Wiederholung darf kein zweites Label anlegen
+        await cache.put("large", bytes(1000))
+        self.assertEqual(await cache.get("large"), bytes(1000))
+        self.assertEqual(list(cache._entries), ["large"])
+
+
+class HasOnlyCreatedShipmentsTest(unittest.TestCase):
+
+    def test_status_codes(self):
+        self.assertTrue(has_only_created_shipments(build_response("0")))
+        self.assertTrue(has_only_created_shipments(build_response("0", "0")))
+        self.assertFalse(has_only_created_shipments(build_response("0", "1000")))
+        self.assertFalse(has_only_created_shipments(build_response("1101")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import asyncio
+import tempfile
+import unittest
+
+from utils import label_store
+from utils.label_store import LocalLabelStore, MemoryLabelStore, parse_range
+
+
+class SweeperLockTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        if label_store.fcntl is None:
+            self.skipTest("fcntl not available")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = LocalLabelStore(directory.name)
+        self.addAsyncCleanup(label_store.stop_label_sweeper)
+
+    async def put_expired(self, filename):
+        await self.store.put(filename, b"%PDF")
+        os.utime(self.store.get_path(filename), (0, 0))
+
+    async def test_other_worker_takes_over_when_lock_holder_dies(self):
+        await self.put_expired("label_1.pdf")
+        # Ein anderer Worker hält den Lock (flock gilt je geöffneter Datei, auch im selben Prozess)
+        holder = open(os.path.join(self.store.root, ".sweeper.lock"), "a")
+        label_store.fcntl.flock(holder, label_store.fcntl.LOCK_EX | label_store.fcntl.LOCK_NB)
+        label_store._sweeper_task = asyncio.create_task(label_store._sweep_periodically(self.store, 60, 0.01))
+        await asyncio.sleep(0.05)
+        self.assertIsNotNone(await self.store.stat("label_1.pdf"))
+
+        holder.close()
+        await asyncio.sleep(0.05)
+        self.assertIsNone(await self.store.stat("label_1.pdf"))
+        self.assertIsNotNone(label_store._sweeper_lock_file)
+
+
+class ReadRangeTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_unknown_label_yields_nothing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for store in (LocalLabelStore(directory), MemoryLabelStore()):
+                self.assertEqual([chunk async for chunk in store.read_range("label_x.pdf", 0, 10)], [])
+
+    async def test_range_is_read_from_one_handle(self):
+        data = os.urandom(3 * label_store.CHUNK_SIZE)
+        with tempfile.TemporaryDirectory() as directory:
+            store = LocalLabelStore(directory)
+            await store.put("label_1.pdf", data)
+            chunks = store.read_range("label_1.pdf", 10, len(data) - 10)
+            first = await anext(chunks)
+            # Während des Downloads gelöscht: der offene Handle liefert den Rest trotzdem
+            await store.delete("label_1.pdf")
+            self.assertEqual(first + b"".join([chunk async for chunk in chunks]), data[10:len(data) - 9])
+
+
+class ParseRangeTest(unittest.TestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=50-500", 100), (50, 99))
+
+    def test_invalid_range_is_ignored(self):
+        self.assertIsNone(parse_range("bytes=5-3", 100))
+        self.assertIsNone(parse_range("items=0-9", 100))
+
+    def test_unsatisfiable_range(self):
+        with self.assertRaises(ValueError):
+            parse_range("bytes=100-", 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
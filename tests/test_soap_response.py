@@ -0,0 +1,146 @@
+import ast
+import inspect
+import subprocess
+import unittest
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from lxml import etree
+
+from benchmarks import baseline_soap_response as baseline
+from benchmarks.bench_soap_response import build_baseline_gls, build_dhl, build_gls, expected_gls, get_dhl_cases, \
+    get_gls_response
+from utils.soap_response import build_shipment_states_response, build_soap_fault, create_shipment_state, namespaces
+from utils.soap_validation import SCHEMA_PATH
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_COMMIT = "50b72f1"
+
+
+def get_baseline_source(path, name):
+    try:
+        source = subprocess.run(["git", "show", f"{BASELINE_COMMIT}:{path}"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.FunctionDef) and node.name == name:
+            return ast.get_source_segment(source, node)
+    return None
+
+
+def build_reference_states_response(response_tag, status_code, status_name, states, state_tag, status_tag):
+    # Für getLabelDD und deleteShipmentDD gab es in der Baseline keinen Builder - Referenz mit ElementTree nach dem
+    # Muster der Baseline (registrierte Namensräume, ET.tostring)
+    for ns in namespaces:
+        ET.register_namespace(ns, namespaces[ns])
+    envelope = ET.Element(f"{{{namespaces['soapenv']}}}Envelope")
+    ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Header")
+    body = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Body")
+    response = ET.SubElement(body, f"{{{namespaces['is']}}}{response_tag}")
+    version = ET.SubElement(response, f"{{{namespaces['cis']}}}Version")
+    ET.SubElement(version, f"{{{namespaces['cis']}}}majorRelease").text = "1"
+    ET.SubElement(version, f"{{{namespaces['cis']}}}minorRelease").text = "0"
+    ET.SubElement(version, f"{{{namespaces['cis']}}}build").text = "14"
+    status = ET.SubElement(response, status_tag)
+    ET.SubElement(status, "StatusCode").text = status_code
+    ET.SubElement(status, "StatusMessage").text = status_name
+    for state in states:
+        element = ET.SubElement(response, state_tag)
+        shipment_number = ET.SubElement(element, "ShipmentNumber")
+        ET.SubElement(shipment_number, f"{{{namespaces['cis']}}}shipmentNumber").text = state["shipment_number"]
+        state_status = ET.SubElement(element, "Status")
+        ET.SubElement(state_status, "StatusCode").text = state["status_code"]
+        ET.SubElement(state_status, "StatusMessage").text = "; ".join(filter(None, state["status_messages"]))
+        if state["label_url"]:
+            ET.SubElement(element, state["label_element"]).text = state["label_url"]
+    return ET.tostring(envelope, encoding="utf-8")
+
+
+def build_reference_fault(fault_string, fault_code):
+    for ns in namespaces:
+        ET.register_namespace(ns, namespaces[ns])
+    envelope = ET.Element(f"{{{namespaces['soapenv']}}}Envelope")
+    ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Header")
+    body = ET.SubElement(envelope, f"{{{namespaces['soapenv']}}}Body")
+    fault = ET.SubElement(body, f"{{{namespaces['soapenv']}}}Fault")
+    ET.SubElement(fault, "faultcode").text = fault_code
+    ET.SubElement(fault, "faultstring").text = fault_string
+    return ET.tostring(envelope, encoding="utf-8")
+
+
+def canonicalize(response):
+    return etree.tostring(etree.fromstring(response), method="c14n", exclusive=True)
+
+
+class BaselineCopyTest(unittest.TestCase):
+
+    def test_copy_matches_baseline_commit(self):
+        for path, func in (("carriers/dhl.py", baseline.dhl_rest_to_soap_data),
+                           ("carriers/gls.py", baseline.gls_soap_to_soap_data)):
+            source = get_baseline_source(path, func.__name__)
+            if source is None:
+                self.skipTest(f"Baseline commit {BASELINE_COMMIT} not available")
+            self.assertEqual(inspect.getsource(func).rstrip("\n"), source)
+
+
+class CreateShipmentResponseTest(unittest.TestCase):
+
+    def test_dhl_matches_baseline(self):
+        for name, (status_code, rest_data) in get_dhl_cases().items():
+            with self.subTest(name):
+                self.assertEqual(build_dhl(status_code, rest_data),
+                                 baseline.dhl_rest_to_soap_data(status_code, rest_data))
+
+    def test_gls_matches_baseline(self):
+        gls_response = get_gls_response()
+        baseline_response = build_baseline_gls(gls_response)
+        self.assertIn(b"<StatusCode />", baseline_response)
+        self.assertEqual(build_gls(gls_response), expected_gls(baseline_response))
+
+
+class ShipmentStatesResponseTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schema = etree.XMLSchema(etree.parse(str(SCHEMA_PATH)))
+
+    def assert_matches_reference(self, response_tag, states, state_tag, status_tag):
+        response = build_shipment_states_response(response_tag, "0", "ok", states, state_tag=state_tag,
+                                                  status_tag=status_tag)
+        self.assertEqual(response, build_reference_states_response(response_tag, "0", "ok", states, state_tag,
+                                                                   status_tag))
+        operation = etree.fromstring(response).find(f"{{{namespaces['soapenv']}}}Body")[0]
+        self.assertTrue(self.schema.validate(operation), self.schema.error_log)
+
+    def test_get_label(self):
+        states = [
+            create_shipment_state("0", ["ok"], "00340434161094042557",
+                                  label_url="https://api-eu.dhl.com/labels?token=a&b=<c>"),
+            create_shipment_state("2000", ["Unknown shipment number.", None, "Straße > 35 Zeichen"],
+                                  "00340434161094042558"),
+        ]
+        self.assert_matches_reference("GetLabelResponse", states, "LabelData", "status")
+
+    def test_delete_shipment(self):
+        states = [
+            create_shipment_state("0", ["ok"], "00340434161094042557"),
+            create_shipment_state("1000", ["Deletion of GLS shipments is not supported."], "ZXYMOCK1"),
+        ]
+        self.assert_matches_reference("DeleteShipmentResponse", states, "DeletionState", "Status")
+
+
+class SoapFaultTest(unittest.TestCase):
+
+    def test_fault(self):
+        for fault_string, fault_code in (("dhl_production temporarily unavailable (circuit open)", "soapenv:Server"),
+                                         ("Invalid SOAP request: <Shipper> & Größe", "soapenv:Client")):
+            with self.subTest(fault_code):
+                # Der Envelope deklariert wie bei allen Antworten auch cis und is, ElementTree nur soapenv -
+                # verglichen wird daher die exklusive Kanonisierung
+                self.assertEqual(canonicalize(build_soap_fault(fault_string, fault_code=fault_code)),
+                                 canonicalize(build_reference_fault(fault_string, fault_code)))
+
+
+if __name__ == "__main__":
+    unittest.main()
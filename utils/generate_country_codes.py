@@ -0,0 +1,37 @@
+"""
+Erzeugt utils/country_codes.py aus der pycountry Datenbank.
+
+    python -m utils.generate_country_codes
+
+pycountry wird nur hier (zur Build-Zeit) benötigt - zur Laufzeit wird ausschließlich die generierte Tabelle gelesen.
+Nach einem Update von pycountry neu ausführen und die geänderte Datei committen.
+"""
+from importlib.metadata import version
+from pathlib import Path
+
+import pycountry
+
+OUTPUT = Path(__file__).resolve().parent / "country_codes.py"
+
+
+def render():
+    countries = sorted((country.alpha_2, country.alpha_3) for country in pycountry.countries)
+    lines = [
+        f"# Automatisch erzeugt von utils/generate_country_codes.py (pycountry {version('pycountry')})"
+        " - nicht von Hand ändern",
+        "from types import MappingProxyType",
+        "",
+        "ISO2_TO_ISO3 = MappingProxyType({",
+    ]
+    lines.extend(f'    "{alpha_2}": "{alpha_3}",' for alpha_2, alpha_3 in countries)
+    lines.append("})")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    OUTPUT.write_text(render(), encoding="utf-8")
+    print(f"{OUTPUT} geschrieben")
+
+
+if __name__ == "__main__":
+    main()
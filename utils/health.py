@@ -0,0 +1,180 @@
+import os
+import time
+import asyncio
+import logging
+
+import httpx
+
+from carriers.registry import get_enabled_carriers
+from utils.metrics import get_pool_states
+from utils.upstream_guard import get_upstream_states
+
+
+# Erreichbarkeit der Upstreams für /readyz und /: ein Hintergrund-Task prüft alle HEALTH_CHECK_INTERVAL Sekunden
+# DHL (Produktion, Sandbox) und den GLS WSDL. Die Probes lesen nur das Ergebnis - kein Upstream Call je Probe.
+# Die Prüfungen laufen über einen eigenen Client, damit sie weder Pool noch Circuit Breaker des Verkehrs berühren.
+
+
+class HealthCheck:
+    __slots__ = ("name", "carrier", "url", "headers", "required", "ok", "status_code", "latency_ms", "error",
+                 "data", "checked_at")
+
+    def __init__(self, name, carrier, url, headers=None, required=True):
+        self.name = name
+        self.carrier = carrier
+        self.url = url
+        self.headers = headers or {}
+        # Sandbox-Prüfungen werden angezeigt, entscheiden aber nicht über die Readiness
+        self.required = required
+        self.ok = None
+        self.status_code = None
+        self.latency_ms = None
+        self.error = None
+        self.data = None
+        self.checked_at = None
+
+    def get_state(self):
+        return {"ok": self.ok, "required": self.required, "status_code": self.status_code,
+                "latency_ms": self.latency_ms, "error": self.error,
+                "age": round(time.monotonic() - self.checked_at, 1) if self.checked_at is not None else None}
+
+
+def create_health_checks():
+    checks = []
+    enabled = get_enabled_carriers()
+    if "DHL" in enabled:
+        headers = {"accept": "application/json", "dhl-api-key": os.getenv("DHL_API_KEY") or ""}
+        for name, setting, required in (("dhl_production", "DHL_PRODUCTION_REST_API_URL", True),
+                                        ("dhl_sandbox", "DHL_SANDBOX_REST_API_URL", False)):
+            if os.getenv(setting):
+                checks.append(HealthCheck(name, "DHL", os.getenv(setting), headers, required))
+    if "GLS" in enabled and os.getenv("GLS_SOAP_API_URL"):
+        checks.append(HealthCheck("gls_wsdl", "GLS", os.getenv("GLS_SOAP_API_URL"),
+                                  {"Authorization": "Basic " + (os.getenv("GLS_AUTH") or "")}))
+    return checks
+
+
+class HealthChecker:
+
+    def __init__(self, checks, interval=30.0, timeout=5.0, max_pool_load=2.0):
+        self.checks = {check.name: check for check in checks}
+        self.interval = interval
+        self.timeout = timeout
+        self.max_pool_load = max_pool_load
+        self._client = None
+        self._task = None
+        self._refresh = None
+
+    async def run_check(self, check: HealthCheck):
+        start = time.perf_counter()
+        try:
+            response = await self._client.get(check.url, headers=check.headers)
+            # Erreichbar ist, wer mit HTTP antwortet; 5xx heißt gestört. Der WSDL muss tatsächlich kommen.
+            check.ok = response.status_code == 200 if check.carrier == "GLS" else response.status_code < 500
+            check.status_code = response.status_code
+            check.error = None
+            # Versionsinfo der DHL API für GET /
+            check.data = response.json() if check.carrier == "DHL" and response.status_code == 200 else None
+        except (httpx.HTTPError, ValueError) as e:
+            check.ok, check.status_code, check.error, check.data = False, None, f"{type(e).__name__}: {e}", None
+        check.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        check.checked_at = time.monotonic()
+        if not check.ok and check.required:
+            logging.warning("Health check %s failed: %s", check.name, check.error or check.status_code)
+
+    async def refresh(self):
+        # Gleichzeitige Aufrufe (Hintergrund-Task und /) teilen sich einen Durchlauf
+        if self._refresh is None or self._refresh.done():
+            if self._client is None:
+                # verify=False wie beim GLS SOAP Client
+                self._client = httpx.AsyncClient(timeout=self.timeout, verify=False)
+            self._refresh = asyncio.ensure_future(
+                asyncio.gather(*(self.run_check(check) for check in self.checks.values())))
+        await asyncio.shield(self._refresh)
+
+    async def refresh_if_stale(self, name):
+        check = self.checks.get(name)
+        if check is not None and (check.checked_at is None or time.monotonic() - check.checked_at > self.interval):
+            await self.refresh()
+        return check
+
+    async def _run_periodically(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error("Health checks failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_readiness(self):
+        # Nur Lesen aus dem Speicher - die Probe kostet Mikrosekunden
+        reasons = []
+        stale_after = self.interval * 3 + self.timeout
+        now = time.monotonic()
+        for check in self.checks.values():
+            if not check.required:
+                continue
+            if check.checked_at is None:
+                reasons.append(f"{check.name}: not checked yet")
+            elif not check.ok:
+                reasons.append(f"{check.name}: unreachable")
+            elif now - check.checked_at > stale_after:
+                reasons.append(f"{check.name}: check is stale")
+        upstreams = get_upstream_states()
+        for name, state in upstreams.items():
+            if state["circuit"] == "open" and not name.endswith("_sandbox"):
+                reasons.append(f"{name}: circuit open")
+        pools = get_pool_states()
+        for name, pool in pools.items():
+            if pool["size"] and pool["in_flight"] >= pool["size"] * self.max_pool_load:
+                reasons.append(f"{name}: pool saturated")
+        return not reasons, {"status": "ready" if not reasons else "not ready", "reasons": reasons,
+                             "checks": {name: check.get_state() for name, check in self.checks.items()},
+                             "upstreams": upstreams, "pools": pools}
+
+
+_health_checker = None
+
+
+def start_health_checks():
+    # HEALTH_CHECKS_ENABLED=false: keine Upstream Prüfungen, die Readiness folgt dann nur Circuit Breakern und Pools
+    global _health_checker
+    if _health_checker is None:
+        enabled = os.getenv("HEALTH_CHECKS_ENABLED", "true").lower() in ("1", "true", "yes")
+        _health_checker = HealthChecker(
+            create_health_checks() if enabled else [],
+            interval=float(os.getenv("HEALTH_CHECK_INTERVAL", 30)),
+            timeout=float(os.getenv("HEALTH_CHECK_TIMEOUT", 5)),
+            max_pool_load=float(os.getenv("HEALTH_MAX_POOL_LOAD", 2.0)),
+        )
+        if _health_checker.checks:
+            _health_checker.start()
+    return _health_checker
+
+
+def get_health_checker() -> HealthChecker:
+    # Fallback, falls die App ohne Lifespan verwendet wird
+    return _health_checker if _health_checker is not None else start_health_checks()
+
+
+async def stop_health_checks():
+    global _health_checker
+    if _health_checker is not None:
+        await _health_checker.stop()
+        _health_checker = None
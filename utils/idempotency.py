@@ -0,0 +1,307 @@
+import os
+import time
+import json
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from utils.soap_request import SoapRequest
+
+
+def _normalise(value):
+    if value is None:
+        return ""
+    return " ".join(str(value).split()).casefold()
+
+
+def _normalise_weight(value):
+    try:
+        return _normalise(float(value))
+    except (TypeError, ValueError):
+        return _normalise(value)
+
+
+def get_idempotency_key(soap_request: SoapRequest, username, password, sandbox=False, inline_labels=False):
+    # Gleiche Aufträge vom gleichen Konto ergeben den gleichen Schlüssel - egal wie oft der Client sie sendet.
+    # Das Passwort geht nur gehasht ein, damit nach einer Korrektur der Zugangsdaten nicht die alte Antwort kommt.
+    orders = []
+    for order in soap_request.orders:
+        details = order.shipment_details
+        receiver = order.receiver
+        address = receiver.address if receiver else None
+        company = receiver.company if receiver else None
+        person = receiver.person if receiver else None
+        orders.append([
+            order.sequence_number,
+            _normalise(details.product_code if details else None),
+            _normalise(details.customer_reference if details else None),
+            _normalise_weight(details.weight_in_kg if details else None),
+            _normalise(company.name1 if company else None),
+            _normalise(company.name2 if company else None),
+            _normalise(person.firstname if person else None),
+            _normalise(person.lastname if person else None),
+            _normalise(address.street_name if address else None),
+            _normalise(address.street_number if address else None),
+            _normalise((address.zip_germany or address.zip_other) if address else None),
+            _normalise(address.city if address else None),
+            _normalise(address.country_iso_code if address else None),
+            _normalise(order.label_response_type),
+        ])
+
+    key_data = {
+        "method": soap_request.method,
+        "sandbox": sandbox,
+        "inline_labels": inline_labels,
+        "account": _normalise(username),
+        "password": hashlib.sha256((password or "").encode("utf-8")).hexdigest(),
+        "orders": orders,
+    }
+    return hashlib.sha256(json.dumps(key_data, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class IdempotencyCache:
+    # LRU mit TTL im Speicher oder - mit Datei - SQLite (übersteht Neustarts und wird von allen Worker-Prozessen
+    # geteilt). Mit Datei ist sie die einzige Quelle, damit ein Storno (forget) sofort in allen Workern gilt.
+    # Laufende Requests mit gleichem Schlüssel werden zu einem Upstream Call zusammengefasst - im Prozess über den
+    # laufenden Task, zwischen Prozessen über einen Claim in der Datei.
+    # Zu jedem Eintrag merkt sich der Cache Referenzen (die ShipmentNumbers der Antwort), über die forget ihn findet.
+    # Im Speicher begrenzen max_entries und max_bytes - Antworten mit Inline-Labels (base64 PDF) sind groß.
+
+    def __init__(self, path=None, ttl=86400, max_entries=10000, max_bytes=64 * 1024 * 1024, claim_timeout=90.0,
+                 poll_interval=0.05):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._bytes = 0
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+        self._entries = OrderedDict()
+        self._keys_by_reference = {}
+        self._in_flight = {}
+        self._db = None
+        self._db_lock = threading.Lock()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency (key TEXT PRIMARY KEY, expires_at REAL, response BLOB)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency_claims (key TEXT PRIMARY KEY, owner TEXT, expires_at REAL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency_references "
+                "(reference TEXT, key TEXT, expires_at REAL, PRIMARY KEY (reference, key))"
+            )
+            for table in ("idempotency", "idempotency_claims", "idempotency_references"):
+                self._db.execute(f"DELETE FROM {table} WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def _get_from_memory(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response, _ = entry
+        if expires_at < time.time():
+            self._drop_from_memory(key)
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _put_in_memory(self, key, expires_at, response, references=()):
+        self._drop_from_memory(key)
+        self._entries[key] = (expires_at, response, tuple(references))
+        self._bytes += len(response)
+        for reference in references:
+            self._keys_by_reference.setdefault(reference, set()).add(key)
+        # Die neueste Antwort bleibt auch, wenn sie allein max_bytes übersteigt - sonst legte die Wiederholung neu an
+        while len(self._entries) > self.max_entries or (self._bytes > self.max_bytes and len(self._entries) > 1):
+            self._drop_from_memory(next(iter(self._entries)))
+
+    def _drop_from_memory(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[1])
+        for reference in entry[2]:
+            keys = self._keys_by_reference.get(reference)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_reference[reference]
+
+    def _db_get(self, key):
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, response FROM idempotency WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return row
+
+    def _db_put(self, key, expires_at, response, references=()):
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO idempotency (key, expires_at, response) VALUES (?, ?, ?)",
+                             (key, expires_at, response))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO idempotency_references (reference, key, expires_at) VALUES (?, ?, ?)",
+                [(reference, key, expires_at) for reference in references])
+            self._db.commit()
+
+    def _db_forget(self, references):
+        with self._db_lock:
+            keys = set()
+            # SQLite begrenzt die Anzahl der Parameter je Statement
+            for index in range(0, len(references), 500):
+                chunk = references[index:index + 500]
+                keys.update(row[0] for row in self._db.execute(
+                    f"SELECT key FROM idempotency_references WHERE reference IN ({', '.join('?' * len(chunk))})",
+                    chunk))
+            self._db.executemany("DELETE FROM idempotency WHERE key = ?", [(key,) for key in keys])
+            self._db.executemany("DELETE FROM idempotency_references WHERE key = ?", [(key,) for key in keys])
+            self._db.commit()
+        return len(keys)
+
+    @property
+    def _owner(self):
+        # Pro Worker-Prozess eindeutig, auch wenn der Cache vor dem fork angelegt wurde
+        return f"{os.getpid()}-{id(self):x}"
+
+    def _db_claim(self, key):
+        # Nur ein Prozess bekommt den Claim; ein abgelaufener Claim (Worker abgestürzt) wird übernommen
+        now = time.time()
+        with self._db_lock:
+            cursor = self._db.execute(
+                "INSERT INTO idempotency_claims (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE idempotency_claims.expires_at < ?",
+                (key, self._owner, now + self.claim_timeout, now))
+            self._db.commit()
+        return cursor.rowcount == 1
+
+    def _db_release(self, key):
+        with self._db_lock:
+            self._db.execute("DELETE FROM idempotency_claims WHERE key = ? AND owner = ?", (key, self._owner))
+            self._db.commit()
+
+    async def _claim_or_wait(self, key):
+        # Liefert die Antwort eines anderen Workers oder None, sobald dieser Prozess selbst anlegen darf
+        while not await asyncio.to_thread(self._db_claim, key):
+            await asyncio.sleep(self.poll_interval)
+            row = await asyncio.to_thread(self._db_get, key)
+            if row:
+                return row[1]
+        return None
+
+    async def get(self, key):
+        if self._db is None:
+            return self._get_from_memory(key)
+        row = await asyncio.to_thread(self._db_get, key)
+        return row[1] if row else None
+
+    async def put(self, key, response, references=()):
+        expires_at = time.time() + self.ttl
+        if self._db is None:
+            self._put_in_memory(key, expires_at, response, references)
+        else:
+            await asyncio.to_thread(self._db_put, key, expires_at, response, references)
+
+    async def forget(self, references):
+        # Entfernt alle Einträge mit diesen Referenzen - nach einem Storno darf ein erneuter Request nicht die
+        # stornierte Sendung zurückbekommen
+        references = list(dict.fromkeys(references))
+        if not references:
+            return 0
+        if self._db is not None:
+            return await asyncio.to_thread(self._db_forget, references)
+        keys = set()
+        for reference in references:
+            keys.update(self._keys_by_reference.get(reference, ()))
+        for key in keys:
+            self._drop_from_memory(key)
+        return len(keys)
+
+    async def run(self, key, create, cacheable=lambda response: True, references=lambda response: ()):
+        # create: Coroutine-Funktion, die die SOAP Antwort (bytes) erzeugt; references(response) liefert die
+        # Referenzen für forget
+        response = self._get_from_memory(key)
+        if response is not None:
+            logging.info("Idempotency cache hit for %.12s", key)
+            return response
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            logging.info("Coalescing request %.12s with in-flight request", key)
+            return await asyncio.shield(task)
+
+        # Der Task wird registriert, bevor irgendetwas awaited wird - so gibt es pro Schlüssel nur einen Upstream Call.
+        # shield: bricht der erste Client die Verbindung ab, läuft der Call trotzdem zu Ende und wird gecacht.
+        task = asyncio.ensure_future(self._load_or_create(key, create, cacheable, references))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load_or_create(self, key, create, cacheable, references):
+        response = await self.get(key)
+        if response is not None:
+            logging.info("Idempotency cache hit for %.12s", key)
+            return response
+
+        if self._db is None:
+            response = await create()
+            if cacheable(response):
+                await self.put(key, response, references(response))
+            return response
+
+        response = await self._claim_or_wait(key)
+        if response is not None:
+            logging.info("Idempotency cache hit for %.12s (other worker)", key)
+            return response
+        try:
+            response = await create()
+            if cacheable(response):
+                await self.put(key, response, references(response))
+            return response
+        finally:
+            # Ohne cachebare Antwort (Fehler) darf der nächste Versuch - auch in einem anderen Worker - neu anlegen
+            await asyncio.to_thread(self._db_release, key)
+
+
+_idempotency_cache = None
+
+
+def start_idempotency_cache():
+    global _idempotency_cache
+    if _idempotency_cache is None:
+        _idempotency_cache = IdempotencyCache(
+            path=os.getenv("IDEMPOTENCY_DB_PATH"),
+            ttl=int(os.getenv("IDEMPOTENCY_TTL", 86400)),
+            max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000)),
+            max_bytes=int(os.getenv("IDEMPOTENCY_MAX_BYTES", 64 * 1024 * 1024)),
+            claim_timeout=float(os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT", 90)),
+        )
+    return _idempotency_cache
+
+
+def close_idempotency_cache():
+    global _idempotency_cache
+    if _idempotency_cache is not None:
+        _idempotency_cache.close()
+        _idempotency_cache = None
+
+
+def get_idempotency_cache():
+    if os.getenv("IDEMPOTENCY_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return start_idempotency_cache()
@@ -0,0 +1,332 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+CHUNK_SIZE = 64 * 1024
+_FILENAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+@dataclass(slots=True)
+class LabelInfo:
+    size: int
+    modified: float
+
+    @property
+    def etag(self):
+        return f'"{self.size:x}-{int(self.modified * 1000):x}"'
+
+
+def is_valid_label_filename(filename):
+    return bool(_FILENAME_PATTERN.match(filename)) and filename not in (".", "..")
+
+
+class LabelStore(ABC):
+    # Schnittstelle für die Ablage der Labels - put/stat/read_range/delete/sweep
+
+    @abstractmethod
+    async def put(self, filename, data):
+        ...
+
+    @abstractmethod
+    async def stat(self, filename):
+        ...
+
+    @abstractmethod
+    def read_range(self, filename, start, end):
+        # Async Generator: liefert die Bytes [start, end] (inklusive) in Blöcken von CHUNK_SIZE,
+        # für eine unbekannte Datei nichts
+        ...
+
+    @abstractmethod
+    async def delete(self, filename):
+        ...
+
+    @abstractmethod
+    async def sweep(self, max_age):
+        ...
+
+
+class LocalLabelStore(LabelStore):
+    # Dateien liegen in gehashten Unterverzeichnissen (root/ab/cd/label_x.pdf), damit kein Verzeichnis
+    # hunderttausende Einträge bekommt. Datei-I/O läuft in Threads, nicht auf dem Event Loop.
+
+    def __init__(self, root):
+        self.root = root
+
+    def get_path(self, filename):
+        digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], filename)
+
+    def _find_path(self, filename):
+        path = self.get_path(filename)
+        if os.path.exists(path):
+            return path
+        # Labels aus der Zeit vor dem Sharding liegen direkt im Wurzelverzeichnis
+        legacy_path = os.path.join(self.root, filename)
+        if os.path.isfile(legacy_path):
+            return legacy_path
+        return None
+
+    def _write(self, filename, data):
+        path = self.get_path(filename)
+        tmp_path = f"{path}.tmp"
+        for attempt in range(2):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                f = open(tmp_path, "wb")
+            except FileNotFoundError:
+                # Der Sweeper hat das leere Verzeichnis zwischen makedirs und open entfernt
+                if attempt:
+                    raise
+                continue
+            with f:
+                f.write(data)
+            break
+        os.replace(tmp_path, path)
+
+    def _stat(self, filename):
+        path = self._find_path(filename)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        return LabelInfo(size=stat.st_size, modified=stat.st_mtime)
+
+    def _open(self, filename, offset):
+        path = self._find_path(filename)
+        if path is None:
+            return None
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:  # zwischen _find_path und open gelöscht
+            return None
+        f.seek(offset)
+        return f
+
+    def _delete(self, filename):
+        path = self._find_path(filename)
+        if path is None:
+            return False
+        os.remove(path)
+        return True
+
+    def _sweep(self, max_age):
+        removed = 0
+        threshold = time.time() - max_age
+        # Von unten nach oben, damit leer gewordene Shard-Verzeichnisse gleich mit entfernt werden
+        for directory, _, filenames in os.walk(self.root, topdown=False):
+            for filename in filenames:
+                if filename == ".sweeper.lock":
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    if os.stat(path).st_mtime < threshold:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+            if directory != self.root:
+                try:
+                    os.rmdir(directory)
+                except OSError:  # nicht leer
+                    pass
+        return removed
+
+    async def put(self, filename, data):
+        await asyncio.to_thread(self._write, filename, data)
+
+    async def stat(self, filename):
+        return await asyncio.to_thread(self._stat, filename)
+
+    async def read_range(self, filename, start, end):
+        # Einmal öffnen und aus dem Handle lesen - auch wenn die Datei währenddessen gelöscht wird
+        f = await asyncio.to_thread(self._open, filename, start)
+        if f is None:
+            return
+        try:
+            offset = start
+            while offset <= end:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, end - offset + 1))
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def delete(self, filename):
+        return await asyncio.to_thread(self._delete, filename)
+
+    async def sweep(self, max_age):
+        return await asyncio.to_thread(self._sweep, max_age)
+
+
+class MemoryLabelStore(LabelStore):
+    # Für Tests und Deployments ohne persistentes Dateisystem
+
+    def __init__(self):
+        self._labels = {}
+
+    async def put(self, filename, data):
+        self._labels[filename] = (bytes(data), time.time())
+
+    async def stat(self, filename):
+        label = self._labels.get(filename)
+        if label is None:
+            return None
+        return LabelInfo(size=len(label[0]), modified=label[1])
+
+    async def read_range(self, filename, start, end):
+        label = self._labels.get(filename)
+        if label is None:
+            return
+        data = label[0]
+        for offset in range(start, end + 1, CHUNK_SIZE):
+            yield data[offset:min(offset + CHUNK_SIZE, end + 1)]
+
+    async def delete(self, filename):
+        return self._labels.pop(filename, None) is not None
+
+    async def sweep(self, max_age):
+        threshold = time.time() - max_age
+        expired = [filename for filename, (_, modified) in self._labels.items() if modified < threshold]
+        for filename in expired:
+            del self._labels[filename]
+        return len(expired)
+
+
+def parse_range(range_header, size):
+    # Unterstützt einen einzelnen Bereich; (start, end) inklusive, None = ganze Datei, ValueError = nicht erfüllbar.
+    # Ungültige Angaben (z.B. bytes=5-3) werden nach RFC 9110 ignoriert, nicht mit 416 beantwortet.
+    match = _RANGE_PATTERN.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    start, end = match.group(1), match.group(2)
+    if start == "":
+        start, end = max(0, size - int(end)), size - 1
+    elif end and int(end) < int(start):
+        return None
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+async def label_response(store: LabelStore, filename, request: Request, media_type="application/pdf"):
+    if not is_valid_label_filename(filename):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    info = await store.stat(filename)
+    if info is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    headers = {
+        "ETag": info.etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if request.headers.get("if-none-match") == info.etag:
+        return Response(status_code=304, headers=headers)
+
+    start, end, status_code = 0, info.size - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == info.etag):
+        try:
+            byte_range = parse_range(range_header, info.size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{info.size}"})
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(store.read_range(filename, start, end), status_code=status_code,
+                             media_type=media_type, headers=headers)
+
+
+_label_store = None
+_sweeper_task = None
+_sweeper_lock_file = None
+
+
+def get_label_store() -> LabelStore:
+    global _label_store
+    if _label_store is None:
+        if os.getenv("LABEL_STORE", "local") == "memory":
+            _label_store = MemoryLabelStore()
+        else:
+            _label_store = LocalLabelStore(os.getenv("GLS_LABELS_FOLDER", 'labels'))
+    return _label_store
+
+
+async def _sweep_periodically(store, max_age, interval):
+    while True:
+        try:
+            # Jeder Worker versucht es in jedem Intervall - stirbt der Worker mit dem Lock oder wird er von gunicorn
+            # ersetzt (max_requests, Timeout), räumt beim nächsten Intervall ein anderer auf
+            if _acquire_sweeper_lock(store):
+                removed = await store.sweep(max_age)
+                if removed:
+                    logging.info("Label sweeper removed %d expired labels", removed)
+            else:
+                logging.debug("Label sweeper runs in another worker")
+        except Exception as e:
+            logging.error("Label sweeper failed: %s", e)
+        await asyncio.sleep(interval)
+
+
+def _acquire_sweeper_lock(store):
+    # Bei mehreren Workern mit gemeinsamem Label-Verzeichnis räumt nur einer auf: wer den Lock bekommt.
+    # Der Lock hängt am offenen File Handle und wird vom Kernel freigegeben, wenn der Worker stirbt.
+    global _sweeper_lock_file
+    if _sweeper_lock_file is not None or not isinstance(store, LocalLabelStore) or fcntl is None:
+        return True
+    os.makedirs(store.root, exist_ok=True)
+    lock_file = open(os.path.join(store.root, ".sweeper.lock"), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _sweeper_lock_file = lock_file
+    return True
+
+
+def start_label_sweeper():
+    global _sweeper_task
+    max_age = int(os.getenv("LABEL_RETENTION", 30 * 86400))
+    if _sweeper_task is None and max_age > 0:
+        store = get_label_store()
+        interval = int(os.getenv("LABEL_SWEEP_INTERVAL", 3600))
+        _sweeper_task = asyncio.create_task(_sweep_periodically(store, max_age, interval))
+
+
+async def stop_label_sweeper():
+    global _sweeper_task, _sweeper_lock_file
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+        try:
+            await _sweeper_task
+        except asyncio.CancelledError:
+            pass
+        _sweeper_task = None
+    if _sweeper_lock_file is not None:
+        _sweeper_lock_file.close()
+        _sweeper_lock_file = None
@@ -0,0 +1,197 @@
+import os
+import time
+from bisect import bisect_left
+
+
+# Schlanke Prometheus-Metriken ohne zusätzliche Abhängigkeit. Beobachtet wird ausschließlich auf dem Event Loop,
+# daher ohne Locks; Labels werden erst beim Abruf von /metrics formatiert.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        if metrics_enabled:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def collect(self):
+        for labelvalues, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+
+class Gauge:
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def set(self, value, *labelvalues):
+        self._values[labelvalues] = value
+
+    def get(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def inc(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) - amount
+
+    def collect(self):
+        for labelvalues, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [Anzahl je Bucket (nicht kumuliert) ..., +Inf, Summe]
+        self._series = {}
+
+    def observe(self, value, *labelvalues):
+        if not metrics_enabled:
+            return
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def collect(self):
+        bounds = [_format_value(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for labelvalues, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(series[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "proxy_stage_duration_seconds",
+    "Dauer der einzelnen Verarbeitungsstufen (parse, validate, mapping, upstream, relayout, serialize)",
+    ("stage", "carrier"),
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "proxy_request_duration_seconds",
+    "Gesamtdauer eines SOAP Requests",
+    ("method", "status"),
+))
+SHIPMENT_DURATION = REGISTRY.register(Histogram(
+    "proxy_shipment_duration_seconds",
+    "Dauer des Carrier Calls je ShipmentOrder nach Produkt und StatusCode des CreationState",
+    ("carrier", "product", "status"),
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "proxy_upstream_errors_total",
+    "Fehlgeschlagene Upstream Calls nach Carrier und Art (http_<status>, timeout, connect, error)",
+    ("carrier", "kind"),
+))
+SCHEMA_VIOLATIONS = REGISTRY.register(Counter(
+    "proxy_schema_violations_total",
+    "Requests, deren Operation nicht dem Intraship Schema entspricht (SOAP_VALIDATION=log|reject)",
+    ("method",),
+))
+POOL_SATURATION = REGISTRY.register(Counter(
+    "proxy_pool_saturation_total",
+    "Calls, die auf einen voll ausgelasteten Pool getroffen sind",
+    ("pool",),
+))
+POOL_SIZE = REGISTRY.register(Gauge(
+    "proxy_pool_size",
+    "Konfigurierte Größe der Verbindungs- bzw. Worker-Pools",
+    ("pool",),
+))
+POOL_IN_FLIGHT = REGISTRY.register(Gauge(
+    "proxy_pool_in_flight",
+    "Aktuell laufende Calls je Pool",
+    ("pool",),
+))
+
+
+def observe_stage(stage, carrier, start):
+    STAGE_DURATION.observe(time.perf_counter() - start, stage, carrier)
+
+
+def enter_pool(pool):
+    # Zählt laufende Calls und merkt sich, wenn ein Call nur noch auf einen vollen Pool trifft
+    in_flight = POOL_IN_FLIGHT.get(pool)
+    size = POOL_SIZE.get(pool)
+    if size and in_flight >= size:
+        POOL_SATURATION.inc(pool)
+    POOL_IN_FLIGHT.set(in_flight + 1, pool)
+
+
+def leave_pool(pool):
+    POOL_IN_FLIGHT.dec(pool)
+
+
+def get_pool_states():
+    # Größe und laufende Calls je Pool - auch mit METRICS_ENABLED=false gepflegt (Readiness)
+    return {labelvalues[0]: {"size": size, "in_flight": POOL_IN_FLIGHT.get(*labelvalues)}
+            for labelvalues, size in POOL_SIZE._values.items()}
+
+
+def render_metrics():
+    return REGISTRY.render()
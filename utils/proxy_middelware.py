@@ -1,29 +1,158 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.types import ASGIApp
+import os
+import ipaddress
 
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-class ProxiedHeadersMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
 
-    async def dispatch(self, request: Request, call_next):
-        headers = list(request.scope.get("headers", []))
-        headers_dict = {k.lower(): v for k, v in headers}
+# Übernimmt Client, Schema, Host und Port vom vorgeschalteten Proxy (nginx), damit request.base_url - und damit
+# die GLS Label-URLs - die öffentliche Adresse enthalten. Reines ASGI: der scope wird direkt angepasst, die
+# Antwort (z.B. gestreamte Label-Downloads) läuft unverändert durch.
+# Ausgewertet werden die Header nur, wenn die Verbindung von einem vertrauenswürdigen Proxy kommt
+# (FORWARDED_ALLOW_IPS: IPs, Netze oder *). Forwarded (RFC 7239) hat Vorrang vor X-Forwarded-*.
 
-        updated = False
+_FORWARDED_HEADERS = {b"forwarded", b"x-forwarded-for", b"x-forwarded-proto", b"x-forwarded-host",
+                      b"x-forwarded-port"}
+_SCHEMES = {"http": "http", "https": "https", "ws": "ws", "wss": "wss"}
+_WEBSOCKET_SCHEMES = {"http": "ws", "https": "wss"}
+_DEFAULT_PORTS = {"http": 80, "https": 443, "ws": 80, "wss": 443}
 
-        # Host anpassen
-        if b"x-forwarded-host" in headers_dict:
-            new_host = headers_dict[b"x-forwarded-host"]
-            headers = [(k, new_host) if k == b"host" else (k, v) for k, v in headers]
-            updated = True
 
-        # Schema anpassen (http/https)
-        if b"x-forwarded-proto" in headers_dict:
-            request.scope["scheme"] = headers_dict[b"x-forwarded-proto"].decode()
+class TrustedProxies:
+    def __init__(self, allow_ips):
+        entries = [entry.strip() for entry in allow_ips.split(",") if entry.strip()]
+        self.always = "*" in entries
+        self.hosts = set()
+        self.networks = []
+        for entry in entries:
+            if entry == "*":
+                continue
+            try:
+                if "/" in entry:
+                    self.networks.append(ipaddress.ip_network(entry, strict=False))
+                else:
+                    self.hosts.add(str(ipaddress.ip_address(entry)))
+            except ValueError:
+                # Hostnamen (z.B. "nginx") werden wörtlich verglichen
+                self.hosts.add(entry)
 
-        if updated:
-            request.scope["headers"] = headers
+    def __contains__(self, host):
+        if self.always or host in self.hosts:
+            return True
+        if not self.networks or not host:
+            return False
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
 
-        return await call_next(request)
+
+def parse_forwarded(value):
+    # Forwarded: for=192.0.2.60;proto=https;host=example.com, for="[2001:db8::1]:4711" -> Liste von dicts
+    elements = []
+    for element in value.split(","):
+        pairs = {}
+        for pair in element.split(";"):
+            name, separator, pair_value = pair.partition("=")
+            if separator:
+                pairs[name.strip().lower()] = pair_value.strip().strip('"')
+        elements.append(pairs)
+    return elements
+
+
+def split_node(node):
+    # "192.0.2.60", "192.0.2.60:4711", "[2001:db8::1]:4711", "unknown", "_hidden" -> (host, port)
+    if node.startswith("["):
+        host, _, rest = node[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    elif node.count(":") == 1:
+        host, _, port = node.partition(":")
+    else:
+        host, port = node, ""
+    return host, int(port) if port.isdigit() else 0
+
+
+class ProxiedHeadersMiddleware:
+
+    def __init__(self, app: ASGIApp, trusted_hosts: str | None = None):
+        self.app = app
+        if trusted_hosts is None:
+            trusted_hosts = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1,::1")
+        self.trusted = TrustedProxies(trusted_hosts)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] in ("http", "websocket"):
+            forwarded = None
+            for name, value in scope["headers"]:
+                if name in _FORWARDED_HEADERS:
+                    if forwarded is None:
+                        forwarded = {}
+                    # Mehrfach gesendete Header wie eine kommagetrennte Liste behandeln
+                    forwarded[name] = forwarded[name] + b"," + value if name in forwarded else value
+            if forwarded is not None and self.is_trusted(scope.get("client")):
+                self.apply(scope, forwarded)
+        return await self.app(scope, receive, send)
+
+    def is_trusted(self, client):
+        # Ohne Client-Adresse (Unix Socket) kann nur ein lokaler Prozess verbunden sein
+        return client is None or client[0] in self.trusted
+
+    def get_client_index(self, hosts):
+        # Von rechts: jeder vertrauenswürdige Proxy hat seinen Vorgänger angehängt. Der erste nicht
+        # vertrauenswürdige Eintrag ist der Client, sind alle vertrauenswürdig, der erste.
+        for index in range(len(hosts) - 1, -1, -1):
+            if hosts[index] not in self.trusted:
+                return index
+        return 0
+
+    def apply(self, scope, forwarded):
+        if b"forwarded" in forwarded:
+            elements = parse_forwarded(forwarded[b"forwarded"].decode("latin-1"))
+            nodes = [split_node(element.get("for", "")) for element in elements]
+            index = self.get_client_index([host for host, _ in nodes])
+            client, proto, host = nodes[index], elements[index].get("proto"), elements[index].get("host")
+            port = None
+        else:
+            client = proto = host = port = None
+            if b"x-forwarded-for" in forwarded:
+                hosts = [split_node(node.strip())[0]
+                         for node in forwarded[b"x-forwarded-for"].decode("latin-1").split(",")]
+                index = self.get_client_index(hosts)
+                client = (hosts[index], 0)
+            proto = self.get_value(forwarded, b"x-forwarded-proto")
+            host = self.get_value(forwarded, b"x-forwarded-host")
+            port = self.get_value(forwarded, b"x-forwarded-port")
+
+        # "unknown" und verschleierte Bezeichner (_hidden) sind keine Adressen
+        if client is not None and client[0] and client[0] != "unknown" and not client[0].startswith("_"):
+            scope["client"] = client
+        scheme = _SCHEMES.get((proto or "").lower())
+        if scheme is not None:
+            scope["scheme"] = _WEBSOCKET_SCHEMES.get(scheme, scheme) if scope["type"] == "websocket" else scheme
+        if host or (port and port.isdigit()):
+            self.rewrite_host(scope, host, int(port) if port and port.isdigit() else None)
+
+    @staticmethod
+    def get_value(forwarded, name):
+        # Bei Listen (mehrere Proxies) zählt der Eintrag des äußersten Proxys
+        value = forwarded.get(name)
+        return value.decode("latin-1").split(",")[0].strip() if value else None
+
+    @staticmethod
+    def rewrite_host(scope, host, port):
+        # Host Header (daraus baut Starlette base_url) und scope["server"] auf die öffentliche Adresse setzen
+        headers = scope["headers"]
+        current = next((value.decode("latin-1") for name, value in headers if name == b"host"), "")
+        hostname, host_port = split_node(host or current)
+        default_port = _DEFAULT_PORTS.get(scope["scheme"])
+        port = port or host_port or default_port
+        scope["server"] = (hostname, port)
+        authority = f"[{hostname}]" if ":" in hostname else hostname
+        if port != default_port:
+            authority = f"{authority}:{port}"
+        value = authority.encode("latin-1")
+        if current:
+            scope["headers"] = [(name, value) if name == b"host" else (name, header_value)
+                                for name, header_value in headers]
+        else:
+            scope["headers"] = [*headers, (b"host", value)]
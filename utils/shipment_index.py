@@ -0,0 +1,83 @@
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+# Lokaler Index der zuletzt angelegten Sendungen: ShipmentNumber -> Carrier, Konto und Label-URL.
+# Damit beantwortet getLabelDD einen Nachdruck ohne DHL Call, und deleteShipmentDD weiß, welcher Carrier
+# zuständig ist.
+
+@dataclass(frozen=True, slots=True)
+class ShipmentRecord:
+    shipment_number: str
+    carrier: str
+    sandbox: bool
+    account: str
+    credentials: str
+    label_url: str | None
+    inline_label: bool
+    created_at: float
+
+
+def get_account_key(username):
+    # Nur ein Hash des Benutzers, damit der Index keine Zugangsdaten enthält
+    return hashlib.sha256((username or "").encode("utf-8")).hexdigest()[:16]
+
+
+def get_credential_key(username, password):
+    # Hash aus Benutzer und Passwort: Index und Journal beantworten nur Requests mit denselben Zugangsdaten wie beim
+    # Anlegen. Mit anderen Zugangsdaten geht der Request an den Carrier, der sie prüft.
+    return hashlib.sha256(f"{username or ''}\0{password or ''}".encode("utf-8")).hexdigest()
+
+
+class ShipmentIndex:
+    # LRU mit TTL im Speicher - wie der Idempotenz-Cache nur im jeweiligen Worker
+
+    def __init__(self, ttl=86400, max_entries=50000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._records = OrderedDict()
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, shipment_number, carrier, sandbox, username, password, label_url=None, inline_label=False):
+        if not shipment_number:
+            return
+        self._records[shipment_number] = ShipmentRecord(shipment_number, carrier, sandbox, get_account_key(username),
+                                                        get_credential_key(username, password), label_url,
+                                                        inline_label, time.time())
+        self._records.move_to_end(shipment_number)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+
+    def get(self, shipment_number, sandbox, username, password) -> ShipmentRecord | None:
+        # Nur Sendungen des anfragenden Kontos mit denselben Zugangsdaten in der gleichen Umgebung - alles andere
+        # entscheidet der Carrier
+        record = self._records.get(shipment_number)
+        if record is None:
+            return None
+        if record.created_at + self.ttl < time.time():
+            del self._records[shipment_number]
+            return None
+        if record.sandbox != sandbox or record.credentials != get_credential_key(username, password):
+            return None
+        return record
+
+    def discard(self, shipment_number):
+        self._records.pop(shipment_number, None)
+
+
+_shipment_index = None
+
+
+def get_shipment_index() -> ShipmentIndex:
+    global _shipment_index
+    if _shipment_index is None:
+        _shipment_index = ShipmentIndex(
+            ttl=int(os.getenv("SHIPMENT_INDEX_TTL", 86400)),
+            max_entries=int(os.getenv("SHIPMENT_INDEX_MAX_ENTRIES", 50000)),
+        )
+    return _shipment_index
@@ -0,0 +1,266 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from utils.shipment_index import get_account_key, get_credential_key
+
+
+# Lokales Journal aller erzeugten Sendungen (SQLite im WAL Modus). Geschrieben wird ausschließlich von einem
+# eigenen Thread, der die Einträge aus einer Queue sammelt und gebündelt committet - ein Create wartet nie auf
+# die Platte. Statusänderungen (Storno) warten dagegen auf ihren Commit: sonst läse getLabelDD - auch in anderen
+# Workern - bis zum nächsten Flush noch "created". Gelesen wird über eigene Verbindungen in Worker-Threads; WAL
+# erlaubt Lesen parallel zum Schreiben.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shipments (
+    shipment_number TEXT PRIMARY KEY,
+    carrier TEXT NOT NULL,
+    sandbox INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    customer_reference TEXT,
+    product_code TEXT,
+    label_url TEXT,
+    inline_label INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    credentials TEXT
+);
+CREATE INDEX IF NOT EXISTS shipments_reference ON shipments (customer_reference);
+CREATE INDEX IF NOT EXISTS shipments_created_at ON shipments (created_at);
+"""
+
+COLUMNS = ("shipment_number", "carrier", "sandbox", "account", "customer_reference", "product_code", "label_url",
+           "inline_label", "status", "created_at", "updated_at", "credentials")
+
+_INSERT = f"INSERT OR REPLACE INTO shipments ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+# Der Hash der Zugangsdaten dient nur dem Abgleich in get/get_many und wird nie ausgegeben (Ledger API)
+_SELECT = f"SELECT {', '.join(column for column in COLUMNS if column != 'credentials')} FROM shipments"
+_UPDATE_STATUS = "UPDATE shipments SET status = ?, updated_at = ? WHERE shipment_number = ?"
+
+STATUS_CREATED = "created"
+STATUS_DELETED = "deleted"
+STATUS_MANIFESTED = "manifested"
+
+_STOP = object()
+
+
+def connect(path):
+    connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # Im WAL Modus reicht NORMAL: ein Stromausfall kann die letzten Commits kosten, aber nie die Datei beschädigen
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+class ShipmentLedger:
+
+    def __init__(self, path, batch_size=200, flush_interval=0.5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._local = threading.local()
+        connection = connect(path)
+        connection.executescript(SCHEMA)
+        if "credentials" not in {row["name"] for row in connection.execute("PRAGMA table_info(shipments)")}:
+            # Journal aus einer älteren Version: Zeilen ohne Hash werden nie lokal beantwortet
+            connection.execute("ALTER TABLE shipments ADD COLUMN credentials TEXT")
+        connection.close()
+        self._writer = threading.Thread(target=self._write_loop, name="shipment-ledger", daemon=True)
+        self._writer.start()
+
+    # Schreiben: nur Einreihen, der Writer Thread erledigt den Rest
+
+    def record_created(self, shipment_number, carrier, sandbox, username, password, customer_reference=None,
+                       product_code=None, label_url=None, inline_label=False):
+        now = time.time()
+        self._queue.put(("insert", (shipment_number, carrier, int(sandbox), get_account_key(username),
+                                    customer_reference, product_code, label_url, int(inline_label), STATUS_CREATED,
+                                    now, now, get_credential_key(username, password))))
+
+    def record_status(self, shipment_numbers, status):
+        now = time.time()
+        for shipment_number in shipment_numbers:
+            self._queue.put(("status", (status, now, shipment_number)))
+
+    async def record_status_async(self, shipment_numbers, status):
+        # Wie record_status, kehrt aber erst nach dem Commit zurück. Über dieselbe Queue, damit ein noch nicht
+        # geschriebenes Create derselben Sendung vorher committet wird.
+        if not shipment_numbers:
+            return
+        loop = asyncio.get_running_loop()
+        committed = loop.create_future()
+        self.record_status(shipment_numbers, status)
+        self._queue.put(("commit", (loop, committed)))
+        await committed
+
+    def _write_loop(self):
+        connection = connect(self.path)
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            # Was sich in der Zwischenzeit angesammelt hat, geht im selben Commit mit
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not _STOP and batch[-1][0] != "commit":
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                running = False
+                batch = [entry for entry in batch if entry is not _STOP]
+            waiters = [values for kind, values in batch if kind == "commit"]
+            try:
+                self._write_batch(connection, [entry for entry in batch if entry[0] != "commit"])
+            except sqlite3.Error as e:
+                logging.error("Shipment ledger write of %d entries failed: %s", len(batch), e)
+            # Auch nach einem Fehler: der Storno beim Carrier ist passiert, der Request soll nicht hängen
+            for loop, committed in waiters:
+                try:
+                    loop.call_soon_threadsafe(_resolve, committed)
+                except RuntimeError:
+                    # Event Loop bereits beendet (Shutdown)
+                    pass
+        connection.close()
+
+    @staticmethod
+    def _write_batch(connection, batch):
+        with connection:
+            for kind, values in batch:
+                connection.execute(_INSERT if kind == "insert" else _UPDATE_STATUS, values)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join(timeout=10)
+
+    # Lesen: synchron im Thread, async Varianten für den Event Loop
+
+    def _reader(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = connect(self.path)
+        return connection
+
+    def _query(self, sql, params=()):
+        return [dict(row) for row in self._reader().execute(sql, params).fetchall()]
+
+    def get(self, shipment_number, sandbox=None, username=None, password=None):
+        sql, params = _SELECT + " WHERE shipment_number = ?", [shipment_number]
+        if sandbox is not None:
+            sql, params = sql + " AND sandbox = ?", params + [int(sandbox)]
+        if username is not None:
+            sql, params = sql + " AND account = ?", params + [get_account_key(username)]
+        if password is not None:
+            sql, params = sql + " AND credentials = ?", params + [get_credential_key(username, password)]
+        rows = self._query(sql, params)
+        return rows[0] if rows else None
+
+    def get_many(self, shipment_numbers, sandbox=None, username=None, password=None):
+        rows = []
+        shipment_numbers = list(shipment_numbers)
+        # SQLite begrenzt die Anzahl der Parameter je Statement
+        for index in range(0, len(shipment_numbers), 500):
+            chunk = shipment_numbers[index:index + 500]
+            sql = _SELECT + f" WHERE shipment_number IN ({', '.join('?' * len(chunk))})"
+            params = list(chunk)
+            if sandbox is not None:
+                sql, params = sql + " AND sandbox = ?", params + [int(sandbox)]
+            if username is not None:
+                sql, params = sql + " AND account = ?", params + [get_account_key(username)]
+            if password is not None:
+                sql, params = sql + " AND credentials = ?", params + [get_credential_key(username, password)]
+            rows.extend(self._query(sql, params))
+        return rows
+
+    def find(self, customer_reference=None, date=None, carrier=None, status=None, sandbox=None, username=None,
+             limit=1000):
+        # Für Nachdruck (Referenz), Storno und Tagesabschluss (Datum, Status)
+        conditions, params = [], []
+        if customer_reference is not None:
+            conditions.append("customer_reference = ?")
+            params.append(customer_reference)
+        if date is not None:
+            start, end = get_day_bounds(date)
+            conditions.append("created_at >= ? AND created_at < ?")
+            params += [start, end]
+        for column, value in (("carrier", carrier), ("status", status)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if sandbox is not None:
+            conditions.append("sandbox = ?")
+            params.append(int(sandbox))
+        if username is not None:
+            conditions.append("account = ?")
+            params.append(get_account_key(username))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(f"{_SELECT}{where} ORDER BY created_at LIMIT ?", params + [limit])
+
+    def summary(self, date, sandbox=None):
+        # Tagesabschluss: Anzahl je Carrier und Status
+        start, end = get_day_bounds(date)
+        sql = "SELECT carrier, status, COUNT(*) AS count FROM shipments WHERE created_at >= ? AND created_at < ?"
+        params = [start, end]
+        if sandbox is not None:
+            sql, params = sql + " AND sandbox = ?", params + [int(sandbox)]
+        return self._query(sql + " GROUP BY carrier, status ORDER BY carrier, status", params)
+
+    async def get_async(self, *args, **kwargs):
+        return await asyncio.to_thread(self.get, *args, **kwargs)
+
+    async def get_many_async(self, *args, **kwargs):
+        return await asyncio.to_thread(self.get_many, *args, **kwargs)
+
+    async def find_async(self, *args, **kwargs):
+        return await asyncio.to_thread(self.find, *args, **kwargs)
+
+    async def summary_async(self, *args, **kwargs):
+        return await asyncio.to_thread(self.summary, *args, **kwargs)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def get_day_bounds(date):
+    # date: "YYYY-MM-DD" in lokaler Zeit des Servers
+    day = datetime.strptime(date, "%Y-%m-%d")
+    return day.timestamp(), (day + timedelta(days=1)).timestamp()
+
+
+_shipment_ledger = None
+
+
+def start_shipment_ledger():
+    global _shipment_ledger
+    if _shipment_ledger is None:
+        _shipment_ledger = ShipmentLedger(
+            os.getenv("LEDGER_DB_PATH", "cache/shipments.sqlite"),
+            batch_size=int(os.getenv("LEDGER_BATCH_SIZE", 200)),
+            flush_interval=float(os.getenv("LEDGER_FLUSH_INTERVAL", 0.5)),
+        )
+    return _shipment_ledger
+
+
+def close_shipment_ledger():
+    global _shipment_ledger
+    if _shipment_ledger is not None:
+        _shipment_ledger.close()
+        _shipment_ledger = None
+
+
+def get_shipment_ledger() -> ShipmentLedger | None:
+    if os.getenv("LEDGER_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return start_shipment_ledger()
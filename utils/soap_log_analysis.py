@@ -0,0 +1,238 @@
+"""
+Analyse großer Intraship/SOAP Logs: findet alle SOAP Envelopes, zählt die Operationen und schreibt
+Request/Response Paare als JSONL (eine Zeile je Austausch) - z.B. als Grundlage für Replay Tests.
+
+    python -m utils.soap_log_analysis res/intraship.log -o cache/intraship.jsonl.gz
+    python -m utils.soap_log_analysis res/intraship.log --counts-only
+
+Die Datei wird per mmap gelesen und an Envelope-Grenzen in Abschnitte geteilt, die ein Prozess-Pool parallel
+durchsucht. Als Bibliothek: iter_soap_messages, iter_soap_exchanges, count_operations und read_exchanges.
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import mmap
+import argparse
+import multiprocessing
+from collections import Counter, deque
+from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+_ENVELOPE_START = re.compile(rb"<(?:[\w.-]+:)?Envelope[\s>]")
+_ENVELOPE_END = re.compile(rb"</(?:[\w.-]+:)?Envelope\s*>")
+# Erstes Element im Body = Operation (CreateShipmentDDRequest, GetLabelResponse, Fault, ...)
+_BODY_ELEMENT = re.compile(rb"<(?:[\w.-]+:)?Body(?:\s[^>]*)?>\s*<(?:[\w.-]+:)?([\w.-]+)")
+_DIRECTION = re.compile(rb"\b(REQUEST|RESPONSE)\b")
+# Zugangsdaten (ns1:signature) landen nicht in der Ausgabe
+_SIGNATURE = re.compile(rb"(<(?:[\w.-]+:)?signature>)[^<]*")
+_TIMESTAMP = re.compile(rb"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?")
+
+# Nur so viel Text vor einem Envelope nach REQUEST/RESPONSE und Zeitstempel durchsuchen
+_PREFIX_WINDOW = 4096
+
+
+@dataclass(slots=True)
+class SoapLogMessage:
+    offset: int
+    direction: str  # "request" oder "response"
+    operation: str | None
+    timestamp: str | None
+    xml: str | None
+
+
+@dataclass(slots=True)
+class SoapExchange:
+    offset: int
+    operation: str | None
+    response_operation: str | None
+    request_ts: str | None
+    response_ts: str | None
+    request: str | None
+    response: str | None
+
+
+def get_direction(marker, operation):
+    # Das Intraship Log kennzeichnet Requests mit REQUEST - fehlt die Markierung, entscheidet der Elementname
+    if marker:
+        return marker.decode("ascii").lower()
+    if operation and (operation.endswith("Response") or operation == "Fault"):
+        return "response"
+    return "request"
+
+
+def _last_match(pattern, data):
+    match = None
+    for match in pattern.finditer(data):
+        pass
+    return match.group(0) if match else None
+
+
+def scan_range(path, start, end, with_xml=True):
+    # Läuft im Worker: eigener mmap der Datei, durchsucht nur [start, end)
+    messages = []
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        position = start
+        while True:
+            opening = _ENVELOPE_START.search(data, position, end)
+            if opening is None:
+                break
+            closing = _ENVELOPE_END.search(data, opening.end(), end)
+            if closing is None:
+                # Abgeschnittener Envelope am Ende des Logs
+                break
+            prefix = data[max(position, opening.start() - _PREFIX_WINDOW):opening.start()]
+            marker = _last_match(_DIRECTION, prefix)
+            timestamp = _last_match(_TIMESTAMP, prefix)
+            element = _BODY_ELEMENT.search(data, opening.start(), closing.start())
+            operation = element.group(1).decode("ascii", errors="replace") if element else None
+            xml = None
+            if with_xml:
+                xml = _SIGNATURE.sub(rb"\1***", data[opening.start():closing.end()]).decode("utf-8", errors="replace")
+            messages.append(SoapLogMessage(
+                offset=opening.start(),
+                direction=get_direction(marker, operation),
+                operation=operation,
+                timestamp=timestamp.decode("ascii").replace(",", ".") if timestamp else None,
+                xml=xml,
+            ))
+            position = closing.end()
+    return messages
+
+
+def find_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Abschnitte enden immer direkt hinter einem </Envelope>, damit kein Envelope geteilt wird
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bounds = [0]
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        offset = chunk_size
+        while offset < size:
+            closing = _ENVELOPE_END.search(data, offset)
+            if closing is None:
+                break
+            bounds.append(closing.end())
+            offset = closing.end() + chunk_size
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def iter_soap_messages(path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, with_xml=True):
+    # Liefert die Nachrichten in der Reihenfolge des Logs
+    chunks = find_chunks(path, chunk_size)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        for start, end in chunks:
+            yield from scan_range(path, start, end, with_xml)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    # Nur ein begrenztes Fenster an Abschnitten gleichzeitig, sonst stauen sich die Ergebnisse im Speicher
+    pending = deque()
+    chunks = deque(chunks)
+    try:
+        while chunks or pending:
+            while chunks and len(pending) < workers * 2:
+                start, end = chunks.popleft()
+                pending.append(pool.submit(scan_range, path, start, end, with_xml))
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_soap_exchanges(path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Paart jeden Request mit der unmittelbar folgenden Response; Einzelgänger bleiben mit None erhalten
+    request = None
+    for message in iter_soap_messages(path, workers, chunk_size):
+        if message.direction == "request":
+            if request is not None:
+                yield _build_exchange(request, None)
+            request = message
+        else:
+            yield _build_exchange(request, message)
+            request = None
+    if request is not None:
+        yield _build_exchange(request, None)
+
+
+def _build_exchange(request: SoapLogMessage | None, response: SoapLogMessage | None) -> SoapExchange:
+    return SoapExchange(
+        offset=request.offset if request else response.offset,
+        operation=request.operation if request else None,
+        response_operation=response.operation if response else None,
+        request_ts=request.timestamp if request else None,
+        response_ts=response.timestamp if response else None,
+        request=request.xml if request else None,
+        response=response.xml if response else None,
+    )
+
+
+def count_operations(path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE) -> Counter:
+    return Counter(message.operation for message in iter_soap_messages(path, workers, chunk_size, with_xml=False))
+
+
+def _open_text(path, mode):
+    if path == "-":
+        return sys.stdout if "w" in mode else sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_exchanges(exchanges, output, limit=None) -> Counter:
+    counts = Counter()
+    file = _open_text(output, "w")
+    try:
+        for written, exchange in enumerate(exchanges, 1):
+            file.write(json.dumps(asdict(exchange), ensure_ascii=False, separators=(",", ":")))
+            file.write("\n")
+            counts[exchange.operation or exchange.response_operation] += 1
+            if limit and written >= limit:
+                break
+    finally:
+        if file is not sys.stdout:
+            file.close()
+    return counts
+
+
+def read_exchanges(path):
+    # Gegenstück zu write_exchanges, z.B. für Replay Tests
+    file = _open_text(path, "r")
+    try:
+        for line in file:
+            if line.strip():
+                yield SoapExchange(**json.loads(line))
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SOAP Request/Response Paare aus einem Log extrahieren")
+    parser.add_argument("log", help="Logdatei, z.B. res/intraship.log")
+    parser.add_argument("-o", "--output", default="-", help="JSONL Ausgabe (.gz wird komprimiert, - für stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl Prozesse (Standard: CPU Kerne)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+                        help="Größe der Abschnitte je Worker in MiB")
+    parser.add_argument("--limit", type=int, default=None, help="Höchstens so viele Paare schreiben")
+    parser.add_argument("--counts-only", action="store_true", help="Nur die Operationen zählen")
+    args = parser.parse_args(argv)
+
+    chunk_size = args.chunk_size * 1024 * 1024
+    if args.counts_only:
+        counts = count_operations(args.log, args.workers, chunk_size)
+    else:
+        counts = write_exchanges(iter_soap_exchanges(args.log, args.workers, chunk_size), args.output, args.limit)
+    # Zusammenfassung nicht in die JSONL Ausgabe mischen
+    summary = sys.stderr if args.output == "-" and not args.counts_only else sys.stdout
+    print(json.dumps(dict(counts.most_common()), indent=2), file=summary)
+
+
+if __name__ == "__main__":
+    main()
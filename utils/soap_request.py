@@ -0,0 +1,227 @@
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+
+
+# Kompakte Records für die Felder, die der Proxy aus einem Intraship Request benötigt.
+# Präfixe spielen keine Rolle - es wird nur auf die lokalen Elementnamen geschaut.
+
+@dataclass(slots=True)
+class Name:
+    name1: str | None = None
+    name2: str | None = None
+
+
+@dataclass(slots=True)
+class Person:
+    firstname: str | None = None
+    lastname: str | None = None
+
+
+@dataclass(slots=True)
+class Address:
+    street_name: str | None = None
+    street_number: str | None = None
+    additional_address_information: str | None = None
+    care_of_name: str | None = None
+    zip_germany: str | None = None
+    zip_other: str | None = None
+    city: str | None = None
+    country_iso_code: str | None = None
+
+
+@dataclass(slots=True)
+class Communication:
+    phone: str | None = None
+    email: str | None = None
+    contact_person: str | None = None
+
+
+@dataclass(slots=True)
+class Party:
+    has_company: bool = False
+    company: Name | None = None
+    person: Person | None = None
+    address: Address | None = None
+    communication: Communication | None = None
+
+
+@dataclass(slots=True)
+class ShipmentDetails:
+    product_code: str | None = None
+    customer_reference: str | None = None
+    weight_in_kg: str | None = None
+
+
+@dataclass(slots=True)
+class ShipmentOrder:
+    sequence_number: str | None = None
+    shipment_details: ShipmentDetails | None = None
+    shipper: Party | None = None
+    receiver: Party | None = None
+    label_response_type: str | None = None
+
+
+@dataclass(slots=True)
+class SoapRequest:
+    method: str | None = None
+    has_envelope: bool = False
+    has_header: bool = False
+    has_auth: bool = False
+    has_body: bool = False
+    user: str | None = None
+    signature: str | None = field(default=None, repr=False)
+    orders: list = field(default_factory=list)
+    shipment_numbers: list = field(default_factory=list)
+    doc_type: str | None = None
+    manifest_date: str | None = None
+    manifest_from_date: str | None = None
+    manifest_to_date: str | None = None
+
+
+# (Elternelement, Element) -> (Record, Attribut)
+_FIELDS = {
+    ("Authentification", "user"): ("request", "user"),
+    ("Authentification", "signature"): ("request", "signature"),
+    ("ShipmentNumber", "shipmentNumber"): ("shipment_numbers", None),
+    ("GetExportDocDDRequest", "DocType"): ("request", "doc_type"),
+    ("GetManifestDDRequest", "manifestDate"): ("request", "manifest_date"),
+    ("manifestDateRange", "fromDate"): ("request", "manifest_from_date"),
+    ("manifestDateRange", "toDate"): ("request", "manifest_to_date"),
+    ("ShipmentOrder", "SequenceNumber"): ("order", "sequence_number"),
+    ("ShipmentOrder", "LabelResponseType"): ("order", "label_response_type"),
+    ("ShipmentDetails", "ProductCode"): ("details", "product_code"),
+    ("ShipmentDetails", "CustomerReference"): ("details", "customer_reference"),
+    ("ShipmentItem", "WeightInKG"): ("details", "weight_in_kg"),
+    ("Company", "name1"): ("company", "name1"),
+    ("Company", "name2"): ("company", "name2"),
+    ("Person", "firstname"): ("person", "firstname"),
+    ("Person", "lastname"): ("person", "lastname"),
+    ("Address", "streetName"): ("address", "street_name"),
+    ("Address", "streetNumber"): ("address", "street_number"),
+    ("Address", "additionalAddressInformation"): ("address", "additional_address_information"),
+    ("Address", "careOfName"): ("address", "care_of_name"),
+    ("Address", "city"): ("address", "city"),
+    ("Zip", "germany"): ("address", "zip_germany"),
+    ("Zip", "other"): ("address", "zip_other"),
+    ("Origin", "countryISOCode"): ("address", "country_iso_code"),
+    ("Communication", "phone"): ("communication", "phone"),
+    ("Communication", "email"): ("communication", "email"),
+    ("Communication", "contactPerson"): ("communication", "contact_person"),
+}
+
+_PARTY_SCOPE = ("company", "person", "address", "communication")
+
+
+class SoapRequestReader:
+    # Parser-Target für ET.XMLParser: es werden keine Elemente aufgebaut, nur die benötigten Felder übernommen
+    __slots__ = ("request", "current", "stack", "text")
+
+    def __init__(self):
+        self.request = SoapRequest()
+        self.current = {"request": self.request, "shipment_numbers": self.request.shipment_numbers}
+        self.stack = []
+        self.text = []
+
+    def start(self, tag, attrib=None):
+        local = tag[tag.rfind("}") + 1:]
+        stack = self.stack
+        current = self.current
+        parent = stack[-1] if stack else None
+        stack.append(local)
+        self.text = []
+
+        depth = len(stack)
+        if depth <= 3:
+            request = self.request
+            if depth == 1:
+                request.has_envelope = local == "Envelope"
+            elif parent == "Envelope":
+                if local == "Header":
+                    request.has_header = True
+                elif local == "Body":
+                    request.has_body = True
+            elif parent == "Body":
+                request.method = local
+            elif parent == "Header" and local == "Authentification":
+                request.has_auth = True
+        elif local == "ShipmentOrder":
+            order = ShipmentOrder()
+            self.request.orders.append(order)
+            current["order"] = order
+        elif parent == "Shipment":
+            if local == "ShipmentDetails":
+                current["details"] = current["order"].shipment_details = ShipmentDetails()
+            elif local in ("Shipper", "Receiver"):
+                party = Party()
+                if local == "Shipper":
+                    current["order"].shipper = party
+                else:
+                    current["order"].receiver = party
+                current["party"] = party
+        elif current.get("party") is not None:
+            party = current["party"]
+            if parent in ("Shipper", "Receiver"):
+                if local == "Company":
+                    party.has_company = True
+                elif local == "Address":
+                    current["address"] = party.address = Address()
+                elif local == "Communication":
+                    current["communication"] = party.communication = Communication()
+            elif parent == "Company" and stack[-3] in ("Shipper", "Receiver"):
+                if local == "Company":
+                    current["company"] = party.company = Name()
+                elif local == "Person":
+                    current["person"] = party.person = Person()
+
+    def data(self, text):
+        self.text.append(text)
+
+    def end(self, tag):
+        stack = self.stack
+        local = stack.pop()
+        if not stack:
+            return
+        if local in ("Shipper", "Receiver") and stack[-1] == "Shipment":
+            self.current["party"] = None
+            for scope in _PARTY_SCOPE:
+                self.current.pop(scope, None)
+            return
+
+        target = _FIELDS.get((stack[-1], local))
+        if target is not None:
+            owner = self.current.get(target[0])
+            if owner is not None:
+                text = "".join(self.text).strip() or None
+                if target[1] is None:
+                    if text:
+                        owner.append(text)
+                else:
+                    setattr(owner, target[1], text)
+        self.text = []
+
+    def close(self):
+        # Fehlende SequenceNumber durch die Position im Request ersetzen, damit jede Antwort zuordenbar ist
+        for index, order in enumerate(self.request.orders):
+            if not order.sequence_number:
+                order.sequence_number = str(index + 1)
+        return self.request
+
+
+def parse_soap_request(data: bytes) -> SoapRequest:
+    parser = ET.XMLParser(target=SoapRequestReader())
+    parser.feed(data)
+    return parser.close()
+
+
+def read_soap_request(events) -> SoapRequest:
+    # events: (event, element) Paare wie von iterparse/iterwalk - so kann auch ein bereits geparster Baum
+    # gelesen werden, ohne das Dokument erneut zu parsen
+    reader = SoapRequestReader()
+    for event, elem in events:
+        if event == "start":
+            reader.start(elem.tag)
+        else:
+            if elem.text and not len(elem):
+                reader.data(elem.text)
+            reader.end(elem.tag)
+    return reader.close()
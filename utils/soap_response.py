@@ -0,0 +1,161 @@
+import re
+
+# Namensräume definieren
+namespaces = {
+    'soapenv': "http://schemas.xmlsoap.org/soap/envelope/",
+    'cis': "http://dhl.de/webservice/cisbase",
+    'is': "http://de.ws.intraship"
+}
+
+
+def create_creation_state(status_code, status_messages, sequence_number, shipment_number=None, label_url=None,
+                          label_element="Labelurl", xml_label=None, xml_label_element="XMLLabel"):
+    return {
+        "status_code": status_code,
+        "status_messages": status_messages,
+        "sequence_number": sequence_number,
+        "shipment_number": shipment_number,
+        "label_url": label_url,
+        "label_element": label_element,
+        "xml_label": xml_label,
+        "xml_label_element": xml_label_element,
+    }
+
+
+def create_shipment_state(status_code, status_messages, shipment_number, label_url=None, xml_label=None):
+    # Zustand je ShipmentNumber (LabelData, DeletionState, ManifestState, ExportDocData) - als SequenceNumber
+    # dient die ShipmentNumber, damit merge_shipment_results die Reihenfolge des Requests herstellen kann
+    return create_creation_state(status_code, status_messages, shipment_number, shipment_number=shipment_number,
+                                 label_url=label_url, xml_label=xml_label)
+
+
+def create_error_state(exception, sequence_number):
+    # Fehler eines einzelnen Auftrags innerhalb eines Batches, ohne die übrigen Aufträge zu verlieren
+    status_message = getattr(exception, "detail", None) or str(exception)
+    return create_creation_state("1000", [status_message], sequence_number)
+
+
+def merge_shipment_results(results, shipment_orders_sequence):
+    # results: Liste von (status_code, status_name, creation_states) je Carrier.
+    # Der Gesamtstatus ist der erste fehlerhafte Carrier-Status, sonst der des ersten Carriers.
+    status_code, status_name = results[0][0], results[0][1]
+    for result_status_code, result_status_name, _ in results:
+        if result_status_code != "0":
+            status_code, status_name = result_status_code, result_status_name
+            break
+
+    creation_states = [state for _, _, states in results for state in states]
+    # Reihenfolge der ShipmentOrder aus dem Request beibehalten
+    positions = {sequence_number: position for position, sequence_number in enumerate(shipment_orders_sequence)}
+    creation_states.sort(key=lambda state: positions.get(state["sequence_number"], len(positions)))
+    return status_code, status_name, creation_states
+
+
+def escape_text(text):
+    # Entspricht dem Escaping von ElementTree für Textknoten
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def text_element(tag, text):
+    if text:
+        return f"<{tag}>{escape_text(text)}</{tag}>"
+    return f"<{tag} />"
+
+
+# Feste Teile der Antwort werden beim Import einmalig vorberechnet
+_NAMESPACE_DECLARATIONS = "".join(f' xmlns:{prefix}="{uri}"' for prefix, uri in sorted(namespaces.items()))
+ENVELOPE_START = f"<soapenv:Envelope{_NAMESPACE_DECLARATIONS}><soapenv:Header /><soapenv:Body>".encode("utf-8")
+ENVELOPE_END = b"</soapenv:Body></soapenv:Envelope>"
+VERSION = ("<cis:Version><cis:majorRelease>1</cis:majorRelease><cis:minorRelease>0</cis:minorRelease>"
+           "<cis:build>14</cis:build></cis:Version>").encode("utf-8")
+CREATE_SHIPMENT_RESPONSE_START = ENVELOPE_START + b"<is:CreateShipmentResponse>" + VERSION
+CREATE_SHIPMENT_RESPONSE_END = b"</is:CreateShipmentResponse>" + ENVELOPE_END
+
+
+def build_create_shipment_response(status_code, status_name, creation_states):
+    parts = ["<status>", text_element("StatusCode", status_code), text_element("StatusMessage", status_name),
+             "</status>"]
+
+    for state in creation_states:
+        shipment_number = state["shipment_number"]
+        parts.append("<CreationState>")
+        parts.append(text_element("StatusCode", state["status_code"]))
+        for status_message in state["status_messages"]:
+            parts.append(text_element("StatusMessage", status_message))
+        parts.append(text_element("SequenceNumber", state["sequence_number"]))
+        parts.append("<ShipmentNumber>")
+        parts.append(text_element("cis:shipmentNumber", shipment_number))
+        parts.append("</ShipmentNumber><PieceInformation><PieceNumber>")
+        parts.append(text_element("cis:licensePlate", shipment_number))
+        parts.append("</PieceNumber></PieceInformation>")
+        if state["label_url"]:
+            parts.append(text_element(state["label_element"], state["label_url"]))
+        if state["xml_label"]:
+            # Inline-Label (base64), wie bei LabelResponseType XML vorgesehen
+            parts.append(text_element(state["xml_label_element"], state["xml_label"]))
+        parts.append("</CreationState>")
+
+    return CREATE_SHIPMENT_RESPONSE_START + "".join(parts).encode("utf-8") + CREATE_SHIPMENT_RESPONSE_END
+
+
+def build_status(status_code, status_name, tag="status"):
+    return (f"<{tag}>" + text_element("StatusCode", status_code) + text_element("StatusMessage", status_name)
+            + f"</{tag}>")
+
+
+def build_shipment_states_response(response_tag, status_code, status_name, states, state_tag, status_tag="status"):
+    # Antworten von getLabelDD, deleteShipmentDD, doManifestDD und getExportDocDD: Gesamtstatus plus ein Element
+    # je ShipmentNumber mit eigenem Status (Statusinformation erlaubt nur eine StatusMessage)
+    parts = [f"<is:{response_tag}>", VERSION.decode("utf-8"), build_status(status_code, status_name, status_tag)]
+    for state in states:
+        parts.append(f"<{state_tag}><ShipmentNumber>")
+        parts.append(text_element("cis:shipmentNumber", state["shipment_number"]))
+        parts.append("</ShipmentNumber>")
+        parts.append(build_status(state["status_code"], "; ".join(filter(None, state["status_messages"])),
+                                  "Status"))
+        if state["label_url"]:
+            parts.append(text_element(state["label_element"], state["label_url"]))
+        if state["xml_label"]:
+            parts.append(text_element(state["xml_label_element"], state["xml_label"]))
+        parts.append(f"</{state_tag}>")
+    parts.append(f"</is:{response_tag}>")
+    return ENVELOPE_START + "".join(parts).encode("utf-8") + ENVELOPE_END
+
+
+def build_get_manifest_response(status_code, status_name, manifest_pdf_data=None):
+    parts = ["<is:GetManifestDDResponse>", VERSION.decode("utf-8"), build_status(status_code, status_name)]
+    if manifest_pdf_data:
+        parts.append(text_element("ManifestPDFData", manifest_pdf_data))
+    parts.append("</is:GetManifestDDResponse>")
+    return ENVELOPE_START + "".join(parts).encode("utf-8") + ENVELOPE_END
+
+
+GET_VERSION_RESPONSE = (ENVELOPE_START + b"<is:GetVersionResponse>" + VERSION + b"</is:GetVersionResponse>"
+                        + ENVELOPE_END)
+
+
+def build_soap_fault(fault_string, fault_code="soapenv:Server"):
+    # SOAP 1.1 Fault, z.B. wenn ein Carrier gerade nicht erreichbar ist und sofort abgelehnt wird
+    return (ENVELOPE_START + b"<soapenv:Fault>" + text_element("faultcode", fault_code).encode("utf-8")
+            + text_element("faultstring", fault_string).encode("utf-8") + b"</soapenv:Fault>" + ENVELOPE_END)
+
+
+def has_only_created_shipments(soap_response):
+    # Jeder CreationState mit StatusCode 0. Schlägt auch nur ein Auftrag fehl (z.B. GLS kurz nicht erreichbar),
+    # darf die Antwort nicht in den Idempotenz-Cache - sonst bekäme die Wiederholung den Fehler bis zum Ablauf der TTL
+    states = soap_response.count(b"<CreationState>")
+    return states > 0 and soap_response.count(b"<CreationState><StatusCode>0</StatusCode>") == states
+
+
+_SHIPMENT_NUMBER = re.compile(rb"<cis:shipmentNumber>([^<]+)</cis:shipmentNumber>")
+
+
+def find_shipment_numbers(soap_response):
+    # ShipmentNumbers einer fertigen Antwort, z.B. damit ein Storno den Eintrag im Idempotenz-Cache findet
+    return [match.decode("utf-8") for match in _SHIPMENT_NUMBER.findall(soap_response)]
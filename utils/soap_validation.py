@@ -0,0 +1,145 @@
+import os
+import time
+import logging
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from utils.metrics import SCHEMA_VIOLATIONS
+from utils.soap_request import SoapRequest, read_soap_request
+
+
+# Optionale Prüfung eingehender Requests gegen die mitgelieferten Intraship XSDs (res/), SOAP_VALIDATION:
+#   off    - keine Prüfung, Parsing wie bisher über parse_soap_request (Standard)
+#   log    - prüfen und Fehler nur loggen, der Request läuft weiter
+#   reject - fehlerhafte Requests lokal mit einem SOAP Fault ablehnen, bevor sie den Carrier erreichen
+# Die Schemas werden einmal beim Start kompiliert. Geprüft wird nur die Operation im Body (CreateShipmentDDRequest
+# usw.) - Envelope und Header prüft process_soap_request wie bisher. Unbekannte Operationen bleiben ungeprüft und
+# enden dort als "Unsupported SOAP method".
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "res" / "intraship-1.0-is_base_de.xsd"
+XSD_NAMESPACE = "http://www.w3.org/2001/XMLSchema"
+SOAP_ENVELOPE_NAMESPACE = "http://schemas.xmlsoap.org/soap/envelope/"
+VALIDATION_MODES = ("off", "log", "reject")
+
+
+class SoapValidationError(Exception):
+
+    def __init__(self, method, errors):
+        self.method = method
+        self.errors = errors
+        super().__init__(self.detail)
+
+    @property
+    def detail(self):
+        return f"Invalid SOAP request: {self.method} does not match the schema: " + "; ".join(self.errors)
+
+
+class SoapValidator:
+
+    def __init__(self, schema_path=SCHEMA_PATH, reject=True, max_errors=5):
+        # lxml erst hier - ohne SOAP_VALIDATION bleibt es ungeladen (wie GLS bei ENABLED_CARRIERS=DHL)
+        from lxml import etree
+
+        start = time.perf_counter()
+        document = etree.parse(str(schema_path))
+        # cis_base.xsd kommt über xs:import mit relativem schemaLocation aus demselben Verzeichnis
+        self.schema = etree.XMLSchema(document)
+        self.operations = self._get_operations(etree, document)
+        self.reject = reject
+        self.max_errors = max_errors
+        # Kein Netzwerk, keine Entitäten auflösen - der Request kommt vom Client
+        self._parser = etree.XMLParser(resolve_entities=False, no_network=True)
+        self._fromstring = etree.fromstring
+        self._iterwalk = etree.iterwalk
+        self._element = etree.Element
+        self._syntax_error = etree.XMLSyntaxError
+        logging.info("SOAP schema %s compiled in %.1f ms", Path(schema_path).name, (time.perf_counter() - start) * 1000)
+
+    @staticmethod
+    def _get_operations(etree, document):
+        # Globale Elemente des Schemas und der importierten Schemas, als {Namespace}Name wie in element.tag
+        operations = set()
+        documents = [document]
+        seen = set()
+        while documents:
+            current = documents.pop()
+            root = current.getroot()
+            namespace = root.get("targetNamespace")
+            for child in root.iterchildren(f"{{{XSD_NAMESPACE}}}element"):
+                operations.add(f"{{{namespace}}}{child.get('name')}" if namespace else child.get("name"))
+            for schema_import in root.iterchildren(f"{{{XSD_NAMESPACE}}}import", f"{{{XSD_NAMESPACE}}}include"):
+                location = schema_import.get("schemaLocation")
+                if location:
+                    path = os.path.join(os.path.dirname(current.docinfo.URL), location)
+                    if path not in seen:
+                        seen.add(path)
+                        documents.append(etree.parse(path))
+        return operations
+
+    def parse(self, data: bytes):
+        # Ein Parse für beides: der Baum wird validiert und derselbe Baum liefert den SoapRequest
+        try:
+            document = self._fromstring(data, self._parser)
+        except self._syntax_error as e:
+            raise ET.ParseError(str(e)) from e
+        soap_request = read_soap_request(self._iterwalk(document, events=("start", "end"), tag=self._element))
+        return soap_request, document
+
+    def validate(self, document, soap_request: SoapRequest):
+        # Liefert die Fehler; im Modus reject wird stattdessen SoapValidationError ausgelöst
+        operation = self._get_operation(document)
+        if operation is None or operation.tag not in self.operations:
+            return []
+        if self.schema.validate(operation):
+            return []
+        SCHEMA_VIOLATIONS.inc(soap_request.method)
+        errors = [f"line {error.line}: {error.message}" for error in self.schema.error_log][:self.max_errors]
+        if self.reject:
+            raise SoapValidationError(soap_request.method, errors)
+        logging.warning("SOAP request %s does not match the schema: %s", soap_request.method, "; ".join(errors))
+        return errors
+
+    @staticmethod
+    def _get_operation(document):
+        if document.tag != f"{{{SOAP_ENVELOPE_NAMESPACE}}}Envelope":
+            return None
+        body = document.find(f"{{{SOAP_ENVELOPE_NAMESPACE}}}Body")
+        if body is None:
+            return None
+        for child in body:
+            if isinstance(child.tag, str):
+                return child
+        return None
+
+
+_validator = None
+_started = False
+
+
+def get_validation_mode():
+    mode = os.getenv("SOAP_VALIDATION", "off").strip().lower()
+    if mode not in VALIDATION_MODES:
+        logging.warning("Unknown SOAP_VALIDATION mode %s, validation disabled", mode)
+        return "off"
+    return mode
+
+
+def start_soap_validation():
+    # Von serve.py im Master vor dem fork (die Worker erben das kompilierte Schema), sonst aus dem Lifespan
+    global _validator, _started
+    if not _started:
+        _started = True
+        mode = get_validation_mode()
+        if mode != "off":
+            _validator = SoapValidator(os.getenv("SOAP_SCHEMA_PATH") or SCHEMA_PATH, reject=mode == "reject")
+    return _validator
+
+
+def get_soap_validator():
+    # None, wenn nicht validiert wird; Fallback, falls die App ohne Lifespan verwendet wird
+    return _validator if _started else start_soap_validation()
+
+
+def stop_soap_validation():
+    global _validator, _started
+    _validator = None
+    _started = False
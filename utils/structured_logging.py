@@ -0,0 +1,205 @@
+import os
+import re
+import copy
+import json
+import queue
+import atexit
+import logging
+import datetime
+from uuid import uuid4
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+
+# Korrelations-ID des aktuellen Requests - wird von der Middleware gesetzt und an jeden Log-Eintrag gehängt
+correlation_id: ContextVar[str | None] = ContextVar("correlation_id", default=None)
+
+# Zugangsdaten dürfen nie im Log landen: ns1:signature, Passwörter in Payloads und Basic Auth Header
+_REDACTIONS = (
+    (re.compile(r"(<(?:[\w-]+:)?signature>).*?(</(?:[\w-]+:)?signature>)", re.S), r"\1***\2"),
+    (re.compile(r"""(['"](?:signature|password|GKP_PASSWORD)['"]\s*:\s*)(['"]).*?\2"""), r"\1\2***\2"),
+    (re.compile(r"(Basic\s+)[A-Za-z0-9+/=]+"), r"\1***"),
+)
+
+# Attribute, die jeder LogRecord mitbringt - alles andere kommt über extra={...} und wird mitgeschrieben
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "correlation_id"}
+
+_listener = None
+
+
+def redact(text):
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class LazyPayload:
+    # Wird erst beim Schreiben (im Listener Thread) gerendert - und nur, wenn das Level überhaupt aktiv ist
+    __slots__ = ("render", "args")
+
+    def __init__(self, render, *args):
+        self.render = render
+        self.args = args
+
+    def __str__(self):
+        return str(self.render(*self.args))
+
+
+def _render_payload(data):
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data).decode("utf-8", errors="replace")
+    return json.dumps(data, default=str, ensure_ascii=False)
+
+
+def lazy_payload(data):
+    # Payloads (dict, bytes) als JSON bzw. Text - statt json.dumps/print auf dem Hot Path
+    return LazyPayload(_render_payload, data)
+
+
+class CorrelationIdFilter(logging.Filter):
+    # Läuft im aufrufenden Thread, dort ist die ContextVar des Requests noch sichtbar
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": redact(record.getMessage()),
+        }
+        if getattr(record, "correlation_id", None):
+            event["correlation_id"] = record.correlation_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                event[key] = value
+        if record.exc_info:
+            event["exc"] = redact(self.formatException(record.exc_info))
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - [%(correlation_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = None
+        return redact(super().format(record))
+
+
+class DeferredQueueHandler(QueueHandler):
+    # Die Standard-Implementierung rendert die Nachricht noch im aufrufenden Thread (Event Loop).
+    # Hier bleiben msg/args unverändert, Rendering, Redaction und Datei-I/O passieren im Listener Thread.
+    # Übergebene Objekte dürfen nach dem Loggen daher nicht mehr verändert werden.
+    def prepare(self, record):
+        return copy.copy(record)
+
+
+class SizeAndTimeRotatingFileHandler(TimedRotatingFileHandler):
+    # Rotiert zeitbasiert (when/interval) und zusätzlich, sobald die Datei max_bytes überschreitet
+
+    def __init__(self, filename, max_bytes=0, when="midnight", backup_count=14, encoding="utf-8"):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding=encoding, delay=True)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+    def rotation_filename(self, default_name):
+        # Mehrere größenbedingte Rotationen im selben Intervall dürfen sich nicht gegenseitig überschreiben
+        name, index = default_name, 0
+        while os.path.exists(name):
+            index += 1
+            name = f"{default_name}.{index}"
+        return name
+
+
+def create_file_handler():
+    log_file = os.getenv("LOG_FILE", "logs/my_app.log")
+    directory = os.path.dirname(log_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = SizeAndTimeRotatingFileHandler(
+        log_file,
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024)),
+        when=os.getenv("LOG_ROTATE_WHEN", "midnight"),
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", 14)),
+    )
+    handler.setFormatter(JsonFormatter() if os.getenv("LOG_FORMAT", "json") == "json" else TextFormatter())
+    return handler
+
+
+def setup_logging(level=None, handlers=None):
+    # Root Logger -> Queue -> Listener Thread -> Datei. Der Event Loop schreibt nie selbst auf die Platte.
+    global _listener
+    stop_logging()
+    level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+    handlers = handlers if handlers is not None else [create_file_handler()]
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    # Leert die Queue und schließt die Dateien
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+class CorrelationIdMiddleware:
+    # Reines ASGI: übernimmt X-Request-ID vom Client (oder erzeugt eine) und gibt sie in der Antwort zurück
+    header_name = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == self.header_name:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid4().hex
+        token = correlation_id.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (self.header_name, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            correlation_id.reset(token)
@@ -0,0 +1,163 @@
+import os
+import time
+import gzip
+import json
+import queue
+import random
+import logging
+import threading
+from contextvars import ContextVar
+
+from utils.structured_logging import redact
+
+
+# Opt-in Mitschnitt des Verkehrs für Regressions- und Lasttests (benchmarks/replay.py): je SOAP Request eine
+# JSON Zeile mit eingehendem Body, Upstream Calls (REST Payload bzw. GLS SOAP Envelope samt Antwort) und der
+# fertigen SOAP Antwort. Zugangsdaten werden vor dem Schreiben entfernt. Geschrieben wird von einem eigenen
+# Thread; jeder Batch wird als eigenes gzip Member angehängt, ein Absturz kostet also höchstens den letzten Batch.
+
+_current_capture: ContextVar["CapturedExchange | None"] = ContextVar("traffic_capture", default=None)
+
+_STOP = object()
+
+
+class CapturedExchange:
+    __slots__ = ("data", "start", "token")
+
+    def __init__(self, data):
+        self.data = data
+        self.start = time.perf_counter()
+        self.token = None
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode("utf-8", errors="replace")
+    return str(value)
+
+
+class TrafficCapture:
+
+    def __init__(self, path, sample_rate=1.0, max_bytes=0, flush_interval=1.0, batch_size=100):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.enabled = True
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name="traffic-capture", daemon=True)
+        self._writer.start()
+
+    def begin(self, path, sandbox, inline_labels) -> CapturedExchange | None:
+        if not self.enabled or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return None
+        return CapturedExchange({"ts": time.time(), "path": path, "sandbox": sandbox, "inline_labels": inline_labels,
+                                 "upstream": []})
+
+    def submit(self, exchange: CapturedExchange):
+        self._queue.put(exchange.data)
+
+    def _write_loop(self):
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                running = False
+                batch = [entry for entry in batch if entry is not _STOP]
+            if batch and self.enabled:
+                try:
+                    self._write_batch(batch)
+                except (OSError, TypeError, ValueError) as e:
+                    logging.error("Traffic capture write of %d entries failed: %s", len(batch), e)
+
+    def _write_batch(self, batch):
+        # Serialisieren und Schwärzen erst hier im Writer Thread, nicht auf dem Event Loop
+        lines = "".join(redact(json.dumps(data, default=_encode, ensure_ascii=False, separators=(",", ":"))) + "\n"
+                        for data in batch)
+        with open(self.path, "ab") as file:
+            file.write(gzip.compress(lines.encode("utf-8"), compresslevel=6))
+            size = file.tell()
+        if self.max_bytes and size >= self.max_bytes:
+            self.enabled = False
+            logging.warning("Traffic capture stopped: %s reached %d bytes", self.path, size)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join(timeout=10)
+
+
+def begin_capture(path, sandbox=False, inline_labels=False) -> CapturedExchange | None:
+    traffic_capture = get_traffic_capture()
+    if traffic_capture is None:
+        return None
+    exchange = traffic_capture.begin(path, sandbox, inline_labels)
+    if exchange is not None:
+        # Upstream Calls des Requests (auch in gather Tasks und im GLS Executor) finden den Mitschnitt hierüber
+        exchange.token = _current_capture.set(exchange)
+    return exchange
+
+
+def end_capture(exchange: CapturedExchange, request_body, status, response_body):
+    exchange.data.update(request=request_body, status=status, response=response_body,
+                         duration_ms=round((time.perf_counter() - exchange.start) * 1000, 2))
+    if exchange.token is not None:
+        _current_capture.reset(exchange.token)
+    traffic_capture = get_traffic_capture()
+    if traffic_capture is not None:
+        traffic_capture.submit(exchange)
+
+
+def capture_upstream(carrier, **fields) -> dict | None:
+    # Ohne aktiven Mitschnitt nur ein ContextVar Lookup
+    exchange = _current_capture.get()
+    if exchange is None:
+        return None
+    entry = {"carrier": carrier, **fields}
+    exchange.data["upstream"].append(entry)
+    return entry
+
+
+def read_capture(path):
+    # Liest auch Dateien aus mehreren angehängten gzip Members; ein abgeschnittenes letztes Member wird ignoriert
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile) as e:
+            logging.warning("Traffic capture %s is truncated: %s", path, e)
+
+
+_traffic_capture = None
+
+
+def get_traffic_capture() -> TrafficCapture | None:
+    # Nur aktiv, wenn TRAFFIC_CAPTURE_PATH gesetzt ist. {pid} im Pfad trennt die Dateien mehrerer Worker.
+    global _traffic_capture
+    if _traffic_capture is None:
+        path = os.getenv("TRAFFIC_CAPTURE_PATH")
+        if not path:
+            return None
+        _traffic_capture = TrafficCapture(
+            path.format(pid=os.getpid()),
+            sample_rate=float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", 1.0)),
+            max_bytes=int(os.getenv("TRAFFIC_CAPTURE_MAX_BYTES", 1024 * 1024 * 1024)),
+        )
+    return _traffic_capture
+
+
+def close_traffic_capture():
+    global _traffic_capture
+    if _traffic_capture is not None:
+        _traffic_capture.close()
+        _traffic_capture = None
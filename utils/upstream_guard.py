@@ -0,0 +1,272 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+
+from utils.metrics import REGISTRY, Counter, Gauge
+
+
+# Schutz der Upstream Carrier (je Carrier und Umgebung): Circuit Breaker, adaptives Concurrency Limit (AIMD)
+# und begrenzte Retries mit Jitter. Alles läuft auf dem Event Loop, daher ohne Locks.
+
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "proxy_upstream_circuit_state",
+    "Zustand des Circuit Breakers (0 = closed, 1 = half_open, 2 = open)",
+    ("upstream",),
+))
+CONCURRENCY_LIMIT = REGISTRY.register(Gauge(
+    "proxy_upstream_concurrency_limit",
+    "Aktuelles adaptives Concurrency Limit je Upstream",
+    ("upstream",),
+))
+UPSTREAM_REJECTED = REGISTRY.register(Counter(
+    "proxy_upstream_rejected_total",
+    "Sofort abgelehnte Calls (circuit_open, overloaded)",
+    ("upstream", "reason"),
+))
+UPSTREAM_RETRIES = REGISTRY.register(Counter(
+    "proxy_upstream_retries_total",
+    "Wiederholte Upstream Calls",
+    ("upstream",),
+))
+
+_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class UpstreamUnavailableError(Exception):
+    # Wird als SOAP Fault beantwortet (bzw. als CreationState mit Fehler, wenn andere Carrier im Batch durchliefen)
+    def __init__(self, upstream, reason, retry_after=None):
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+        self.detail = f"{upstream} temporarily unavailable ({reason})"
+        super().__init__(self.detail)
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def allow(self):
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self.probe_in_flight:
+            # Genau ein Probe-Call, bis dessen Ergebnis feststeht
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def cancel_probe(self):
+        self.probe_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.probe_in_flight = False
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def retry_after(self):
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+class AimdLimiter:
+    # Additive Increase (+1 je Limit erfolgreicher Calls), Multiplicative Decrease, sobald die Latenz deutlich über
+    # der Baseline liegt oder ein Call fehlschlägt. Wer über dem Limit liegt, wartet höchstens queue_timeout.
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=100, latency_tolerance=2.0, backoff=0.75,
+                 queue_timeout=1.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.baseline = None
+        self.last_decrease = 0.0
+        self._waiters = deque()
+
+    async def acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+        if self.queue_timeout <= 0:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # Der Platz wird in release() direkt übergeben (in_flight bereits erhöht)
+            return await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # Platz schon übergeben, aber der Aufrufer wurde abgebrochen - zurückgeben
+            if waiter.done() and not waiter.cancelled():
+                self.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, latency, failed=False):
+        self.in_flight -= 1
+        now = time.monotonic()
+        if self.baseline is None:
+            self.baseline = latency
+        elif latency < self.baseline:
+            self.baseline += 0.2 * (latency - self.baseline)
+        else:
+            self.baseline += 0.01 * (latency - self.baseline)
+
+        if failed or latency > self.baseline * self.latency_tolerance:
+            # Höchstens einmal je Round-Trip verkleinern, sonst bricht das Limit bei einem Burst sofort ein
+            if now - self.last_decrease >= latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    def cancel(self):
+        # Platz ohne Messung zurückgeben: ein abgebrochener Call sagt nichts über Latenz oder Zustand des Upstreams
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(True)
+
+
+class UpstreamGuard:
+    def __init__(self, name, breaker: CircuitBreaker, limiter: AimdLimiter, max_retries=2, retry_base_delay=0.1,
+                 retry_max_delay=2.0):
+        self.name = name
+        self.breaker = breaker
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._publish()
+
+    def _publish(self):
+        CIRCUIT_STATE.set(_STATE_VALUES[self.breaker.state], self.name)
+        CONCURRENCY_LIMIT.set(round(self.limiter.limit, 2), self.name)
+
+    def get_state(self):
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retry_after": round(self.breaker.retry_after(), 1) if self.breaker.state != CircuitBreaker.CLOSED else 0,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "queued": len(self.limiter._waiters),
+            "baseline_latency_ms": round(self.limiter.baseline * 1000, 1) if self.limiter.baseline else None,
+        }
+
+    async def call(self, func, idempotent=False, is_failure_result=None, is_failure_error=None,
+                   is_retry_safe_error=None):
+        # func: Coroutine-Funktion mit dem eigentlichen Upstream Call.
+        # Wiederholt wird nur bei idempotenten Operationen - oder wenn der Request den Carrier nachweislich nie
+        # erreicht hat (is_retry_safe_error, z.B. Verbindungsaufbau fehlgeschlagen).
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                UPSTREAM_REJECTED.inc(self.name, "circuit_open")
+                raise UpstreamUnavailableError(self.name, "circuit open", retry_after=self.breaker.retry_after())
+            if not await self.limiter.acquire():
+                self.breaker.cancel_probe()
+                UPSTREAM_REJECTED.inc(self.name, "overloaded")
+                raise UpstreamUnavailableError(self.name, "concurrency limit reached", retry_after=1)
+
+            start = time.perf_counter()
+            error, result, failed = None, None, None
+            try:
+                result = await func()
+                failed = bool(is_failure_result and is_failure_result(result))
+            except Exception as e:
+                error = e
+                failed = bool(is_failure_error(e)) if is_failure_error else True
+            finally:
+                if failed is None:
+                    # Abgebrochen (CancelledError: Client getrennt, Timeout) - Platz und Probe müssen trotzdem
+                    # zurück, sonst fehlt der Platz für immer und ein Half-Open Circuit lässt nie wieder einen Call durch
+                    self.limiter.cancel()
+                    self.breaker.cancel_probe()
+                    self._publish()
+            self.limiter.release(time.perf_counter() - start, failed)
+            if failed:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            self._publish()
+
+            retry_safe = idempotent or (error is not None and is_retry_safe_error and is_retry_safe_error(error))
+            if failed and retry_safe and attempt < self.max_retries and self.breaker.state != CircuitBreaker.OPEN:
+                attempt += 1
+                UPSTREAM_RETRIES.inc(self.name)
+                # Full Jitter: zufällige Wartezeit bis zum exponentiell wachsenden Maximum
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                logging.warning("Retrying %s call (attempt %d) in %.2f s", self.name, attempt + 1, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            if error is not None:
+                raise error
+            return result
+
+
+_guards = {}
+
+
+def get_guard_setting(carrier, name, default):
+    # DHL_CIRCUIT_FAILURE_THRESHOLD überschreibt UPSTREAM_CIRCUIT_FAILURE_THRESHOLD usw.
+    value = os.getenv(f"{carrier}_{name}") or os.getenv(f"UPSTREAM_{name}")
+    return type(default)(value) if value else default
+
+
+def get_upstream_guard(carrier, sandbox=False) -> UpstreamGuard:
+    key = (carrier, sandbox)
+    guard = _guards.get(key)
+    if guard is None:
+        name = f"{carrier.lower()}_{'sandbox' if sandbox else 'production'}"
+        breaker = CircuitBreaker(
+            failure_threshold=get_guard_setting(carrier, "CIRCUIT_FAILURE_THRESHOLD", 5),
+            reset_timeout=get_guard_setting(carrier, "CIRCUIT_RESET_TIMEOUT", 30.0),
+        )
+        limiter = AimdLimiter(
+            initial_limit=get_guard_setting(carrier, "CONCURRENCY_INITIAL", 20),
+            min_limit=get_guard_setting(carrier, "CONCURRENCY_MIN", 1),
+            max_limit=get_guard_setting(carrier, "CONCURRENCY_MAX", 100),
+            latency_tolerance=get_guard_setting(carrier, "LATENCY_TOLERANCE", 2.0),
+            queue_timeout=get_guard_setting(carrier, "QUEUE_TIMEOUT", 1.0),
+        )
+        guard = _guards[key] = UpstreamGuard(
+            name, breaker, limiter,
+            max_retries=get_guard_setting(carrier, "MAX_RETRIES", 2),
+            retry_base_delay=get_guard_setting(carrier, "RETRY_BASE_DELAY", 0.1),
+        )
+    return guard
+
+
+def get_upstream_states():
+    return {guard.name: guard.get_state() for guard in _guards.values()}
@@ -1,9 +1,10 @@
-import pycountry
+from utils.country_codes import ISO2_TO_ISO3
 
 
 def get_iso3_from_iso2(country_iso2_code):
-    country = pycountry.countries.get(alpha_2=country_iso2_code)
-    if country:
-        return country.alpha_3
+    # Vorberechnete Tabelle (utils/country_codes.py) statt pycountry - kein Laden der Länder-Datenbank zur Laufzeit
+    country_iso3_code = ISO2_TO_ISO3.get((country_iso2_code or "").upper())
+    if country_iso3_code:
+        return country_iso3_code
     else:
         raise ValueError("Invalid country ISO2 code.")